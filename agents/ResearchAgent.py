@@ -1,42 +1,60 @@
-import os
-from typing import List
+from dataclasses import dataclass
+from typing import Callable, List, Optional
 
-from pydantic_ai import Agent
+from pydantic_ai import Agent, ModelRetry, RunContext
 from pydantic_ai.tools import Tool
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
 from pydantic_ai.settings import ModelSettings
 
 from tools.WebSearchTool import WebSearchTool, SubQuery
+from tools.ResearchPipeline import ResearchPipeline
 from models.ResearchModel import ResearchSection, StructuredResearchOutput
 from models.QueryModels import SubQuery, UserQuery
 from utils.logger import agent_logger, tool_logger
+from utils.http_fetcher import HttpFetcher
+from utils.shared_store import SharedStore
+from utils.lazy_crawler import LazyCrawler
+from utils.llm_backends import backend_pool, pooled_provider
+from utils.llm_scheduler import ScheduledModel, llm_scheduler
+from utils.metrics import record_usage, stage_timer
+from utils.search_cache import normalize_sub_prompt
 from config.config import app_settings
 
+@dataclass
+class ResearchDeps:
+    # Per-run state handed to the tools, so concurrent runs never share outputs
+    pipeline: ResearchPipeline
+
+
 class ResearchAgent:
-    def __init__(self):
-        self.s_tool = WebSearchTool()
-        self.logged_outputs: List[ResearchSection] = []
-
-        # Wrap the tool function to capture outputs
-        async def wrapped_web_search(query: SubQuery):
-            try:
-                result = await self.s_tool.web_search(query)
-                self.logged_outputs.append(result)
-                return result
-            except Exception as e:
-                tool_logger.warning(f"Search failed for subquery: {query.sub_prompt} - {e}")
-                return None
-
-
-        model = OpenAIModel(
-            model_name='llama3.1:8b',
-            provider=OpenAIProvider(base_url=f'http://{os.getenv("OLLAMA_HOST")}/v1')
+    def __init__(
+        self,
+        crawler: LazyCrawler,
+        http_fetcher: Optional[HttpFetcher] = None,
+        shared_store: Optional[SharedStore] = None
+    ):
+        self.s_tool = WebSearchTool(crawler, http_fetcher, shared_store)
+
+        # Wrap the tool function to hand the query to the run's research pipeline
+        # The search and crawl happen in the background, so the agent gets a short acknowledgement
+        # instead of waiting for (and re-reading) every crawled page
+        async def wrapped_web_search(ctx: RunContext[ResearchDeps], query: SubQuery):
+            await ctx.deps.pipeline.submit(query)
+            return f"Searching the web for: {query.sub_prompt}"
+
+
+        model = ScheduledModel(
+            OpenAIModel(
+                model_name=app_settings.RESEARCH_AGENT.MODEL,
+                provider=pooled_provider(backend_pool)
+            ),
+            llm_scheduler
         )
 
         web_search_tool = Tool(
             function=wrapped_web_search,
-            name="web_search"
+            name="web_search",
+            takes_ctx=True
         )
 
         model_settings = ModelSettings(parallel_tool_calls=True)
@@ -44,6 +62,7 @@ class ResearchAgent:
         self.agent = Agent(
             model=model,
             model_settings=model_settings,
+            deps_type=ResearchDeps,
             system_prompt=f"""
             You are the top researcher with access to a tool to search the web called `web_search`. Your task is to research the user's query and provide comprehensive, factual information.
 
@@ -65,13 +84,73 @@ class ResearchAgent:
             tools=[web_search_tool]
         )
 
-    async def run(self, user_prompt: str, original_query: UserQuery):
+        # RESEARCH_AGENT__MODE="plan": one structured call for the sub-questions, no tools
+        self.planner = Agent(
+            model=model,
+            system_prompt=f"""
+            You are the top researcher planning the web research for the user's topic.
+
+            TASK:
+            Break the topic down into exactly **{app_settings.RESEARCH_AGENT.NUM_SUB_QUESTIONS}** logical sub-questions that together cover it.
+
+            IMPORTANT RULES:
+            - Each sub-question must be a short, self-contained web search query (it is searched on its own, without the topic).
+            - Do NOT repeat a sub-question or ask the same thing twice in different words.
+            - Only output the sub-questions, each as an object with a "sub_prompt" string.
+            """,
+            output_type=List[SubQuery]
+        )
+
+        @self.planner.output_validator
+        def validate_plan(sub_queries: List[SubQuery]) -> List[SubQuery]:
+            # drops empty and repeated sub-questions, keeps at most NUM_SUB_QUESTIONS
+            unique = {}
+            for query in sub_queries:
+                key = normalize_sub_prompt(query.sub_prompt)
+                if key and key not in unique:
+                    unique[key] = query
+            if not unique:
+                raise ModelRetry("Return at least one non-empty sub-question.")
+            return list(unique.values())[:int(app_settings.RESEARCH_AGENT.NUM_SUB_QUESTIONS)]
+
+    async def plan(self, original_query: UserQuery) -> List[SubQuery]:
+        async with stage_timer("research_plan"):
+            result = await self.planner.run(f"Topic: {original_query.prompt}")
+        record_usage("research", result.usage())
+        agent_logger.info(f"Research plan: {[query.sub_prompt for query in result.output]}")
+        return result.output
+
+    async def run(
+        self,
+        user_prompt: str,
+        original_query: UserQuery,
+        on_section: Optional[Callable[[ResearchSection], None]] = None
+    ):
+        # `on_section` gets each ResearchSection as soon as its pages are crawled
+        # `user_prompt` is only used by the agent mode (and its fallback)
         agent_logger.info("Research agent called")
-        self.logged_outputs.clear()  # Reset for each run
 
-        await self.agent.run(user_prompt)
-        
-        valid_sections = [output for output in self.logged_outputs if output is not None]
+        async with stage_timer("research"):
+            sub_queries = None
+            if app_settings.RESEARCH_AGENT.MODE == "plan":
+                try:
+                    sub_queries = await self.plan(original_query)
+                except Exception as e:
+                    if not app_settings.RESEARCH_AGENT.FALLBACK_TO_AGENT:
+                        raise
+                    agent_logger.warning(f"Research planning failed: {e}. Falling back to the agent mode.")
+
+            async with ResearchPipeline(self.s_tool, on_section) as pipeline:
+                if sub_queries is not None:
+                    # searched directly, the results never go back through the model
+                    for query in sub_queries:
+                        await pipeline.submit(query)
+                else:
+                    deps = ResearchDeps(pipeline=pipeline)  # fresh for each run
+                    result = await self.agent.run(user_prompt, deps=deps)
+                    record_usage("research", result.usage())
+
+                valid_sections = await pipeline.finish()
 
         if not valid_sections:
             raise RuntimeError("All subqueries failed. No research could be gathered.")
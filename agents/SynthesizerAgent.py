@@ -1,21 +1,74 @@
-import os
+import re
+import json
+import time
+import asyncio
+from typing import Callable, List, Optional
+
+from pydantic_core import from_json
 
 from utils.logger import agent_logger
+from utils.llm_backends import backend_pool, pooled_provider
+from utils.llm_scheduler import ScheduledModel, llm_scheduler
+from utils.metrics import STAGE_SECONDS, record_usage, stage_timer
 
-from pydantic_ai import Agent
+from pydantic_ai import Agent, ModelRetry
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
 from pydantic_ai.models.openai import OpenAIModel
-from pydantic_ai.providers.openai import OpenAIProvider
 
-from models.ReportModel import Report
+from models.ReportModel import Report, ReportSection, ReportSummary, ReferencesSection, URL_PATTERN
 
 from config.config import app_settings
 
+# How often (seconds) partial reports are pushed while streaming
+STREAM_DEBOUNCE = 0.5
+
+
+def partial_report_from_response(response: ModelResponse, complete: bool) -> Optional[dict]:
+    # Parses the (possibly truncated) JSON of a streamed response into a partial report.
+    # While streaming, only sections that are finished are kept.
+    for part in response.parts:
+        if isinstance(part, ToolCallPart):
+            raw = part.args
+        elif isinstance(part, TextPart):
+            raw = part.content
+        else:
+            continue
+
+        if not raw:
+            continue
+        if isinstance(raw, dict):
+            partial = raw
+        else:
+            try:
+                partial = from_json(raw, allow_partial=True)
+            except ValueError:
+                continue
+        if not isinstance(partial, dict):
+            continue
+
+        report = {key: partial[key] for key in ("title", "abstract") if isinstance(partial.get(key), str)}
+
+        sections = partial.get("sections")
+        if isinstance(sections, list):
+            # the last section is still being written until the model moves on to the references
+            if not complete and "references" not in partial:
+                sections = sections[:-1]
+            report["sections"] = [
+                section for section in sections
+                if isinstance(section, dict) and "header" in section and "content" in section
+            ]
+        return report
+    return None
+
 
 class SynthesizerAgent:
     def __init__(self):
-        model = OpenAIModel(
-            model_name='qwen3:14b',
-            provider=OpenAIProvider(base_url=f'http://{os.getenv("OLLAMA_HOST")}/v1')
+        model = ScheduledModel(
+            OpenAIModel(
+                model_name=app_settings.SYNTH_AGENT.MODEL,
+                provider=pooled_provider(backend_pool)
+            ),
+            llm_scheduler
         )
 
         self.agent = Agent(
@@ -71,8 +124,142 @@ class SynthesizerAgent:
             output_type=Report
         )
 
+        @self.agent.output_validator
+        def validate_references(report: Report) -> Report:
+            # Report.references is optional for sectioned reports only
+            if report.references is None:
+                raise ModelRetry("The report MUST have a 'references' object listing the source URLs.")
+            return report
+
+        # SYNTHESIS_MODE="sectioned": one call per section, then the title and abstract
+        self.section_agent = Agent(
+            model=model,
+            system_prompt="""
+            You are a professional report writer. Your task is to write ONE section of a research report
+            from the provided research notes on a single sub-question.
+
+            WRITING TASK:
+            1. Write a clear header for the section (do not repeat the sub-question verbatim).
+            2. Write the section content in paragraphs, based *only* on the provided sources.
+            3. Use formal academic language with NO bold, italic, underlining, or any other formatting for emphasis.
+            4. Do not write an introduction or conclusion for the whole report, other sections cover the rest of the topic.
+
+            Your output MUST be a valid JSON object with a "header" and a "content" string.
+            """,
+            output_type=ReportSection
+        )
+
+        self.summary_agent = Agent(
+            model=model,
+            system_prompt="""
+            You are a professional report writer. You are given the sections of a finished research report.
+            Write its title and a short abstract (one paragraph) summarizing the report, based *only* on the sections.
+
+            Your output MUST be a valid JSON object with a "title" and an "abstract" string.
+            """,
+            output_type=ReportSummary
+        )
+
     async def run(self, research_prompt: str):
         agent_logger.info("Synthesizer agent called")
-        result = await self.agent.run(research_prompt)
+        async with stage_timer("synthesis"):
+            result = await self.agent.run(research_prompt)
+        record_usage("synthesizer", result.usage())
 
         return result
+
+    async def run_stream(self, research_prompt: str, on_partial: Callable[[dict], None]) -> Report:
+        # Streams the report, calling `on_partial` with each new partial report (title, abstract,
+        # then finished sections). Returns the final output validated against Report.
+        agent_logger.info("Synthesizer agent called (streaming)")
+        last_partial = None
+        start = time.perf_counter()
+
+        async with stage_timer("synthesis"):
+            async with self.agent.run_stream(research_prompt) as result:
+                async for response, is_last in result.stream_responses(debounce_by=STREAM_DEBOUNCE):
+                    partial = partial_report_from_response(response, complete=is_last)
+                    if partial and partial != last_partial:
+                        if last_partial is None:
+                            STAGE_SECONDS.labels(stage="synthesis_first_partial").observe(time.perf_counter() - start)
+                        last_partial = partial
+                        on_partial(partial)
+
+                output = await result.get_output()
+        record_usage("synthesizer", result.usage())
+
+        return output
+
+
+    async def write_section(self, topic: str, section: dict, target_words: int) -> Optional[ReportSection]:
+        prompt = f"""
+            The report is on the topic: '{topic}'.
+            Write the section answering: '{section["subquestion"]}'.
+            The section content MUST contain at least {target_words} words.
+
+            Use the following JSON as your sole source of information:
+            ---
+            {json.dumps(section["sources"], ensure_ascii=False, separators=(",", ":"))}
+            ---
+            """
+        try:
+            async with stage_timer("synthesis_section"):
+                result = await self.section_agent.run(prompt)
+        except Exception as e:
+            agent_logger.warning(f"Failed to write section for '{section['subquestion']}': {e}. Leaving it out.")
+            return None
+        record_usage("synthesizer", result.usage())
+        return result.output
+
+
+    async def run_sectioned(
+        self,
+        topic: str,
+        sections: List[dict],
+        reference_urls: List[str],
+        on_partial: Optional[Callable[[dict], None]] = None
+    ) -> Report:
+        # Writes every context section (see utils.context_builder) concurrently, then the title and
+        # abstract from the finished sections. References are the research urls, not model output.
+        # `on_partial` gets the finished sections (in report order) as each one completes.
+        agent_logger.info(f"Synthesizer agent called (sectioned, {len(sections)} sections)")
+        target_words = max(100, int(app_settings.SYNTH_AGENT.WORD_COUNT_REQ) // max(len(sections), 1))
+        written: List[Optional[ReportSection]] = [None] * len(sections)
+        start = time.perf_counter()
+
+        async def write(idx: int, section: dict):
+            written[idx] = await self.write_section(topic, section, target_words)
+            if on_partial and written[idx] is not None:
+                if sum(1 for w in written if w is not None) == 1:
+                    STAGE_SECONDS.labels(stage="synthesis_first_partial").observe(time.perf_counter() - start)
+                on_partial({"sections": [w.model_dump() for w in written if w is not None]})
+
+        async with stage_timer("synthesis", mode="sectioned", sections=len(sections)):
+            await asyncio.gather(*(write(idx, section) for idx, section in enumerate(sections)))
+            report_sections = [section for section in written if section is not None]
+            if not report_sections:
+                raise RuntimeError("No report section could be written.")
+
+            sections_text = "\n\n".join(f"{section.header}\n{section.content}" for section in report_sections)
+            async with stage_timer("synthesis_summary"):
+                result = await self.summary_agent.run(f"""
+                    The report is on the topic: '{topic}'.
+                    REPORT SECTIONS:
+                    ---
+                    {sections_text}
+                    ---
+                    """)
+            record_usage("synthesizer", result.usage())
+
+        # ReferencesSection needs at least one url, the section is left out rather than
+        # failing a report whose sections are already written
+        sources = [url for url in reference_urls if re.match(URL_PATTERN, url)]
+        if not sources:
+            agent_logger.warning("No valid reference URL in the research, the report has no references section")
+
+        return Report(
+            title=result.output.title,
+            abstract=result.output.abstract,
+            sections=report_sections,
+            references=ReferencesSection(sources=sources) if sources else None
+        )
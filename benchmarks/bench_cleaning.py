@@ -0,0 +1,141 @@
+# benchmarks/bench_cleaning.py
+# Microbenchmark of the per-page cleaning and research model path on large fixture pages.
+# "baseline" is the previous path: one link regex per page, Pydantic models with a validator
+# walking every source and an indent=2 dump. "current" is utils.text_normalizer plus the slotted
+# research dataclasses dumped through their TypeAdapter.
+#
+# Usage (from the project root):
+#   python -m benchmarks.bench_cleaning --sizes 50,200,1000 --pages 20
+import re
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+from typing import Callable, List
+
+from pydantic import BaseModel, Field, model_validator
+
+from benchmarks.fixture_site import WORDS
+from models.ResearchModel import RESEARCH_ADAPTER, ResearchSection, SourceSection, StructuredResearchOutput
+from utils.text_normalizer import normalize_page
+from config.config import app_settings
+
+BASELINE_LINK_PATTERN = r'\[([^\]]+)\]\((https?://[^\)]+)\)'
+
+
+class BaselineSource(BaseModel):
+    title: str
+    content: str
+    url: str = Field(exclude=True)
+
+
+class BaselineSection(BaseModel):
+    subquestion: str
+    sources: List[BaselineSource]
+
+
+class BaselineOutput(BaseModel):
+    original_query: str
+    sections: List[BaselineSection]
+    all_urls: List[str] = []
+
+    @model_validator(mode='after')
+    def populate_all_source_urls(self) -> 'BaselineOutput':
+        all_urls = set()
+        if self.sections:
+            for section in self.sections:
+                if section and section.sources:
+                    for source in section.sources:
+                        if source and source.url:
+                            all_urls.add(source.url)
+        self.all_urls = sorted(list(all_urls))
+        return self
+
+
+def make_markdown(page_id: int, size_kb: int) -> str:
+    # crawl4ai-like markdown: nav links, paragraphs full of inline links, a table, boilerplate
+    rng = random.Random(page_id)
+    parts = [
+        "Skip to content",
+        " ".join(f"[{word.title()}](https://fixture.test/{word})" for word in rng.sample(WORDS, 6)),
+        f"# {' '.join(rng.choice(WORDS) for _ in range(5)).title()}",
+    ]
+    while sum(len(part) for part in parts) < size_kb * 1024:
+        words = [rng.choice(WORDS) for _ in range(rng.randint(40, 120))]
+        for i in range(0, len(words), 15):
+            words[i] = f"[{words[i]}](https://fixture.test/{page_id}/{i}?ref=body)"
+        parts.append("   ".join(words[:3]) + " " + " ".join(words[3:]) + ".")
+        if rng.random() < 0.1:
+            parts.append("| Metric   | Value   | Change |\n|:---------|--------:|-------:|\n" + "\n".join(
+                f"| {rng.choice(WORDS)}   | {rng.randint(1, 999)}   | {rng.randint(-9, 9)}% |" for _ in range(6)
+            ))
+        if rng.random() < 0.05:
+            parts.append("Share on Twitter\n\nAdvertisement\n\n![banner](https://fixture.test/ad.png)")
+    parts.append("© 2024 Fixture Site. All rights reserved.\n\nWe use cookies to improve your experience.")
+    return "\n\n\n".join(parts)
+
+
+def baseline(pages: List[str]) -> int:
+    sources = [
+        BaselineSource(title=f"Page {i}", content=re.sub(BASELINE_LINK_PATTERN, r'\1', page), url=f"https://fixture.test/{i}")
+        for i, page in enumerate(pages)
+    ]
+    output = BaselineOutput(
+        original_query="benchmark",
+        sections=[BaselineSection(subquestion=f"Question {n}", sources=sources[n::5]) for n in range(5)]
+    )
+    return len(output.model_dump_json(indent=2))
+
+
+def current(pages: List[str]) -> int:
+    max_chars = app_settings.WEB_SEARCH_TOOL.MAX_PAGE_CHARS
+    sources = [
+        SourceSection(title=f"Page {i}", content=normalize_page(page, max_chars), url=f"https://fixture.test/{i}")
+        for i, page in enumerate(pages)
+    ]
+    output = StructuredResearchOutput(
+        original_query="benchmark",
+        sections=[ResearchSection(subquestion=f"Question {n}", sources=sources[n::5]) for n in range(5)]
+    )
+    return len(RESEARCH_ADAPTER.dump_json(output))
+
+
+def measure(fn: Callable[[List[str]], int], pages: List[str], repeat: int) -> dict:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output_chars = fn(pages)
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(pages)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"best_ms": min(times) * 1000, "peak_alloc_mb": peak / 2**20, "output_kb": output_chars / 1024}
+
+
+def main(args):
+    print(f"{'page KB':>8} {'pages':>6} {'path':>9} {'best ms':>9} {'peak MB':>8} {'output KB':>10}")
+    for size_kb in args.sizes:
+        pages = [make_markdown(page_id, size_kb) for page_id in range(args.pages)]
+        for name, fn in (("baseline", baseline), ("current", current)):
+            result = measure(fn, pages, args.repeat)
+            print(
+                f"{size_kb:>8} {args.pages:>6} {name:>9} {result['best_ms']:>9.1f} "
+                f"{result['peak_alloc_mb']:>8.1f} {result['output_kb']:>10.0f}",
+                file=sys.stdout
+            )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Microbenchmark of page cleaning and research model serialization")
+    parser.add_argument("--sizes", type=lambda s: [int(c) for c in s.split(",")], default=[50, 200, 1000], help="page sizes in KB")
+    parser.add_argument("--pages", type=int, default=20, help="pages per report")
+    parser.add_argument("--repeat", type=int, default=5)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,28 @@
+# benchmarks/fake_search.py
+# Stand-in for ddg_browser/google_browser: returns fixture site pages instead of hitting the web.
+import time
+import zlib
+from typing import List
+
+from models.QueryModels import SubQuery
+from models.ResearchModel import NormalizedSearchResult
+
+
+def install_fake_search(site_url: str, latency: float, num_pages: int = 1000):
+    # Patches WebSearchTool so both engines return the requested number of fixture pages,
+    # picked deterministically from the sub-prompt, after `latency` seconds
+    from tools.WebSearchTool import WebSearchTool
+
+    def fake_browser(self, query: SubQuery) -> List[NormalizedSearchResult]:
+        time.sleep(latency)  # runs on the search thread pool like the real clients
+        seed = zlib.crc32(query.sub_prompt.encode("utf-8"))
+        return [
+            NormalizedSearchResult(
+                title=f"Fixture page {(seed + i) % num_pages}",
+                url=f"{site_url}/page/{(seed + i) % num_pages}"
+            )
+            for i in range(self.num_search_results())
+        ]
+
+    WebSearchTool.ddg_browser = fake_browser
+    WebSearchTool.google_browser = fake_browser
@@ -0,0 +1,58 @@
+# benchmarks/fixture_site.py
+# Local static site for AsyncWebCrawler to crawl during benchmarks.
+# /page/<n> serves a deterministic article page with nav/footer boilerplate around the content.
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "research energy market policy data growth model system network impact analysis "
+    "technology climate economy labor health security cloud battery solar grid demand "
+    "supply regulation study results survey adoption cost efficiency risk future trend"
+).split()
+
+
+def make_page(page_id: int, paragraphs: int = 12) -> str:
+    rng = random.Random(page_id)
+    title = " ".join(rng.choice(WORDS) for _ in range(5)).title()
+    body = "\n".join(
+        "<p>" + " ".join(rng.choice(WORDS) for _ in range(rng.randint(40, 120))) + ".</p>"
+        for _ in range(paragraphs)
+    )
+    links = "".join(f'<li><a href="/page/{rng.randint(0, 999)}">Related {i}</a></li>' for i in range(8))
+    return f"""<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body>
+<nav><ul><li><a href="/">Home</a></li><li><a href="/about">About</a></li><li><a href="/contact">Contact</a></li></ul></nav>
+<article><h1>{title}</h1>
+{body}
+</article>
+<aside><h3>Related</h3><ul>{links}</ul></aside>
+<footer><p>Copyright Fixture Site. All rights reserved. Privacy. Terms. Cookies.</p></footer>
+</body></html>"""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    paragraphs = 12
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "page" and parts[1].isdigit():
+            content = make_page(int(parts[1]), self.paragraphs).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.send_error(404)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_site(port: int, paragraphs: int = 12) -> ThreadingHTTPServer:
+    FixtureHandler.paragraphs = paragraphs
+    server = ThreadingHTTPServer(("127.0.0.1", port), FixtureHandler)
+    threading.Thread(target=server.serve_forever, name="fixture-site", daemon=True).start()
+    return server
@@ -0,0 +1,242 @@
+# benchmarks/mock_llm.py
+# OpenAI-compatible mock of the Ollama server for benchmarks.
+# - function tools (e.g. web_search) are called N times on the first turn, then it answers in text
+# - output tools (final_result) are called with JSON generated from the tool's schema,
+#   e.g. a Report whose references are the URLs found in the prompt
+# - streaming is supported, latency is a fixed time-to-first-token plus a tokens/second rate
+# - like Ollama, only one model is resident: requests for another model pay `load_time` first
+#   (/api/ps and /api/generate preloads are supported)
+import re
+import json
+import time
+import uuid
+import zlib
+import asyncio
+import threading
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+URL_PATTERN = re.compile(r"https?://[^\s'\",\]]+")
+NUM_CALLS_PATTERN = re.compile(r"exactly \*\*(\d+)\*\*")
+
+FILLER = (
+    "The evidence gathered from the sources indicates a consistent pattern across markets, "
+    "with adoption accelerating as costs decline and policy frameworks mature. "
+)
+
+
+class MockLLMConfig:
+    def __init__(self, ttft: float, tokens_per_second: float, load_time: float = 0.0, embedding_dim: int = 64):
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self.load_time = load_time
+        self.embedding_dim = embedding_dim
+
+
+def resolve(schema: dict, defs: dict) -> dict:
+    if "$ref" in schema:
+        return defs[schema["$ref"].split("/")[-1]]
+    return schema
+
+
+def example_from_schema(schema: dict, defs: dict, name: str, topic: str, urls: List[str], i: int = 0) -> Any:
+    # builds a value matching the schema, with long text for content-like fields
+    schema = resolve(schema, defs)
+    for key in ("anyOf", "oneOf"):
+        if key in schema:
+            options = [s for s in schema[key] if s.get("type") != "null"]
+            return example_from_schema(options[0], defs, name, topic, urls, i)
+
+    match schema.get("type"):
+        case "object":
+            return {
+                prop: example_from_schema(prop_schema, defs, prop, topic, urls, i)
+                for prop, prop_schema in schema.get("properties", {}).items()
+            }
+        case "array":
+            if name == "sources" and resolve(schema.get("items", {}), defs).get("type") == "string":
+                return urls or ["http://example.com/source"]
+            count = max(schema.get("minItems", 1), 4 if name == "sections" else 3)
+            return [example_from_schema(schema.get("items", {}), defs, name, topic, urls, n) for n in range(count)]
+        case "integer":
+            return i
+        case "number":
+            return float(i)
+        case "boolean":
+            return True
+        case _:
+            if name in ("content", "abstract"):
+                return FILLER * (12 if name == "content" else 3)
+            if name == "header" and schema.get("default"):
+                return schema["default"]
+            return f"{topic} - {name} {i + 1}"
+
+
+def message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return content
+
+
+def plan_response(body: dict) -> Dict[str, Any]:
+    # decides what the "model" answers: tool calls or plain text
+    messages = body.get("messages", [])
+    tools = [tool["function"] for tool in body.get("tools", []) if tool.get("type") == "function"]
+    output_tools = [tool for tool in tools if tool["name"].startswith("final_result")]
+    function_tools = [tool for tool in tools if not tool["name"].startswith("final_result")]
+    has_tool_results = any(message.get("role") == "tool" for message in messages)
+
+    system = " ".join(message_text(m) for m in messages if m.get("role") == "system")
+    user = " ".join(message_text(m) for m in messages if m.get("role") == "user")
+    topic = " ".join(user.split())[:60] or "topic"
+    urls = list(dict.fromkeys(URL_PATTERN.findall(user)))
+
+    if function_tools and not has_tool_results:
+        match = NUM_CALLS_PATTERN.search(system)
+        num_calls = int(match.group(1)) if match else 5
+        tool = function_tools[0]
+        calls = [
+            (tool["name"], example_from_schema(tool["parameters"], tool["parameters"].get("$defs", {}), "", f"{topic} q{n}", urls, n))
+            for n in range(num_calls)
+        ]
+        return {"tool_calls": calls}
+
+    if output_tools:
+        tool = output_tools[0]
+        params = tool["parameters"]
+        return {"tool_calls": [(tool["name"], example_from_schema(params, params.get("$defs", {}), "", topic, urls))]}
+
+    return {"content": "Research complete."}
+
+
+def create_mock_llm_app(config: MockLLMConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    state = {"loaded": None}
+    load_lock = asyncio.Lock()
+
+    async def load(model: str):
+        async with load_lock:
+            if state["loaded"] != model:
+                await asyncio.sleep(config.load_time)
+                state["loaded"] = model
+
+    def generation_delay(text: str) -> float:
+        return config.ttft + (len(text) / 4) / config.tokens_per_second
+
+    def usage(body: dict, text: str) -> dict:
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        completion_tokens = len(text) // 4
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        plan = plan_response(body)
+        model = body.get("model", "mock")
+        await load(model)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+
+        tool_calls = [
+            {"id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+             "function": {"name": name, "arguments": json.dumps(args)}}
+            for name, args in plan.get("tool_calls", [])
+        ]
+        content = plan.get("content")
+        generated = content or "".join(call["function"]["arguments"] for call in tool_calls)
+        finish_reason = "tool_calls" if tool_calls else "stop"
+
+        if not body.get("stream"):
+            await asyncio.sleep(generation_delay(generated))
+            message = {"role": "assistant", "content": content}
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+                "usage": usage(body, generated)
+            })
+
+        async def stream():
+            def chunk(delta: dict, finish=None, usage_data=None) -> str:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}] if delta is not None else []
+                }
+                if usage_data:
+                    data["usage"] = usage_data
+                return f"data: {json.dumps(data)}\n\n"
+
+            await asyncio.sleep(config.ttft)
+            piece_chars = 64
+            piece_delay = (piece_chars / 4) / config.tokens_per_second
+
+            if content:
+                yield chunk({"role": "assistant", "content": ""})
+                for start in range(0, len(content), piece_chars):
+                    yield chunk({"content": content[start:start + piece_chars]})
+                    await asyncio.sleep(piece_delay)
+            for index, call in enumerate(tool_calls):
+                yield chunk({"role": "assistant", "tool_calls": [{
+                    "index": index, "id": call["id"], "type": "function",
+                    "function": {"name": call["function"]["name"], "arguments": ""}
+                }]})
+                arguments = call["function"]["arguments"]
+                for start in range(0, len(arguments), piece_chars):
+                    yield chunk({"tool_calls": [{"index": index, "function": {"arguments": arguments[start:start + piece_chars]}}]})
+                    await asyncio.sleep(piece_delay)
+
+            yield chunk({}, finish=finish_reason)
+            if body.get("stream_options", {}).get("include_usage"):
+                yield chunk(None, usage_data=usage(body, generated))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    @app.get("/api/ps")
+    async def ps():
+        models = [state["loaded"]] if state["loaded"] else []
+        return {"models": [{"name": model, "model": model} for model in models]}
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        # empty-prompt preload, as sent with keep_alive by the LLM scheduler
+        body = await request.json()
+        await load(body["model"])
+        return {"model": body["model"], "response": "", "done": True}
+
+    @app.post("/api/embed")
+    async def embed(request: Request):
+        # deterministic bag-of-words vectors, so similar texts get similar embeddings
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        embeddings = []
+        for text in inputs:
+            vector = [0.0] * config.embedding_dim
+            for word in re.findall(r"\w+", text.lower()):
+                vector[zlib.crc32(word.encode("utf-8")) % config.embedding_dim] += 1.0
+            embeddings.append(vector)
+        return {"model": body.get("model"), "embeddings": embeddings}
+
+    return app
+
+
+def start_mock_llm(port: int, config: MockLLMConfig) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(create_mock_llm_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, name="mock-llm", daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
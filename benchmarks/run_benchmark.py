@@ -0,0 +1,251 @@
+# benchmarks/run_benchmark.py
+# Offline end-to-end benchmark of /generate-report.
+# Runs the app in-process against a fake search backend, a local fixture site (crawled by the
+# real AsyncWebCrawler) and a mock OpenAI-compatible LLM server, then reports latency
+# percentiles, throughput and per-stage CPU/memory for several concurrency levels.
+#
+# Usage (from the project root):
+#   python -m benchmarks.run_benchmark --concurrency 1,2,4 --requests 8
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+import httpx
+import psutil
+import uvicorn
+
+from benchmarks.fixture_site import start_fixture_site
+from benchmarks.mock_llm import MockLLMConfig, start_mock_llm
+
+TOPICS = [
+    "impact of AI on jobs",
+    "grid scale battery storage",
+    "history of the printing press",
+    "microplastics in drinking water",
+    "quantum error correction",
+    "urban heat islands",
+    "remote work and productivity",
+    "antibiotic resistance",
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * pct / 100
+    low, high = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (k - low)
+
+
+class StageProfiler:
+    # records wall time, process CPU time and RSS change for every stage_timer span
+    def __init__(self):
+        self.process = psutil.Process()
+        self.samples: Dict[str, List[dict]] = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def install(self):
+        # must run before the app modules import stage_timer
+        import utils.metrics as metrics
+        original = metrics.stage_timer
+        profiler = self
+
+        @asynccontextmanager
+        async def profiled_stage_timer(stage: str, **details):
+            start_wall = time.perf_counter()
+            start_cpu = time.process_time()
+            start_rss = profiler.process.memory_info().rss
+            try:
+                async with original(stage, **details):
+                    yield
+            finally:
+                sample = {
+                    "wall_s": time.perf_counter() - start_wall,
+                    "cpu_s": time.process_time() - start_cpu,
+                    "rss_delta_mb": (profiler.process.memory_info().rss - start_rss) / 2**20
+                }
+                with profiler._lock:
+                    profiler.samples[stage].append(sample)
+
+        metrics.stage_timer = profiled_stage_timer
+
+    def take(self) -> Dict[str, dict]:
+        with self._lock:
+            samples, self.samples = self.samples, defaultdict(list)
+        summary = {}
+        for stage, stage_samples in samples.items():
+            summary[stage] = {"count": len(stage_samples)}
+            for key in ("wall_s", "cpu_s", "rss_delta_mb"):
+                values = [sample[key] for sample in stage_samples]
+                summary[stage][f"{key}_mean"] = statistics.fmean(values)
+                summary[stage][f"{key}_p95"] = percentile(values, 95)
+        return summary
+
+
+class ResourceSampler:
+    # samples process RSS in the background to get the peak while a level runs
+    def __init__(self, interval: float = 0.2):
+        self.process = psutil.Process()
+        self.interval = interval
+        self.peak_rss = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self.peak_rss = self.process.memory_info().rss
+        self.start_cpu = self.process.cpu_times()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        end_cpu = self.process.cpu_times()
+        self.cpu_seconds = (end_cpu.user - self.start_cpu.user) + (end_cpu.system - self.start_cpu.system)
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, num_requests: int, level_idx: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    async def one(i: int):
+        # unique prompts per level so caches don't turn the run into cache hits
+        prompt = f"{TOPICS[i % len(TOPICS)]} (run {level_idx}-{i})"
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.post("/generate-report", json={"prompt": prompt})
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    start = time.perf_counter()
+    with ResourceSampler() as sampler:
+        await asyncio.gather(*(one(i) for i in range(num_requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": num_requests,
+        "succeeded": len(latencies),
+        "failed": len(errors),
+        "errors": errors[:5],
+        "wall_s": wall,
+        "latency_p50_s": percentile(latencies, 50),
+        "latency_p95_s": percentile(latencies, 95),
+        "latency_mean_s": statistics.fmean(latencies) if latencies else float("nan"),
+        "reports_per_minute": len(latencies) / wall * 60 if wall else 0.0,
+        "process_cpu_s": sampler.cpu_seconds,
+        "peak_rss_mb": sampler.peak_rss / 2**20,
+    }
+
+
+async def main(args):
+    site = start_fixture_site(args.site_port, paragraphs=args.paragraphs)
+    mock_llm = start_mock_llm(args.llm_port, MockLLMConfig(
+        ttft=args.llm_ttft,
+        tokens_per_second=args.llm_tps,
+        load_time=args.llm_load_time
+    ))
+
+    # configure the app before it is imported (settings are read at import time)
+    os.environ["OLLAMA_HOST"] = f"127.0.0.1:{args.llm_port}"
+    if not args.keep_caches:
+        os.environ["WEB_SEARCH_TOOL__PAGE_CACHE_ON"] = "false"
+        os.environ["WEB_SEARCH_TOOL__SEARCH_CACHE_ON"] = "false"
+    # every fixture page (and fake search) is on one local host, the per-domain limits would
+    # measure nothing but the rate limiter
+    if not args.keep_rate_limits:
+        os.environ["WEB_SEARCH_TOOL__DOMAIN_RATE"] = "100000"
+        os.environ["WEB_SEARCH_TOOL__DOMAIN_BURST"] = "100000"
+        os.environ["WEB_SEARCH_TOOL__DOMAIN_RATE_LIMITS"] = "{}"
+    if args.browser_only:
+        os.environ["WEB_SEARCH_TOOL__HTTP_FETCH_ON"] = "false"
+
+    profiler = StageProfiler()
+    profiler.install()
+
+    from benchmarks.fake_search import install_fake_search
+    install_fake_search(f"http://127.0.0.1:{args.site_port}", latency=args.search_latency)
+
+    import main as app_main
+    from config.config import app_settings
+
+    app_server = uvicorn.Server(uvicorn.Config(app_main.app, host="127.0.0.1", port=args.app_port, log_level="warning"))
+    app_task = asyncio.create_task(app_server.serve())
+    while not app_server.started:
+        await asyncio.sleep(0.05)
+
+    results = {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            **{key: value for key, value in vars(args).items() if key != "output"},
+            "settings": json.loads(app_settings.model_dump_json(exclude={"OLLAMA_HOST"})),
+        },
+        "levels": []
+    }
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.app_port}", timeout=None) as client:
+        # the startup warm-up (if on) is not part of the measured requests
+        while (await client.get("/ready")).status_code != 200:
+            await asyncio.sleep(0.1)
+
+        for level_idx, concurrency in enumerate(args.concurrency):
+            print(f"[BENCH] concurrency={concurrency} requests={args.requests}", file=sys.stderr)
+            profiler.take()  # drop spans from previous levels
+            level = await run_level(client, concurrency, args.requests, level_idx)
+            level["stages"] = profiler.take()
+            results["levels"].append(level)
+            print(
+                f"[BENCH]   p50={level['latency_p50_s']:.2f}s p95={level['latency_p95_s']:.2f}s "
+                f"reports/min={level['reports_per_minute']:.2f} failed={level['failed']}",
+                file=sys.stderr
+            )
+
+    app_server.should_exit = True
+    await app_task
+    mock_llm.should_exit = True
+    site.shutdown()
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] Results written to {args.output}", file=sys.stderr)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark for /generate-report")
+    parser.add_argument("--concurrency", type=lambda s: [int(c) for c in s.split(",")], default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=8, help="requests per concurrency level")
+    parser.add_argument("--llm-ttft", type=float, default=0.5, help="mock LLM time to first token (s)")
+    parser.add_argument("--llm-tps", type=float, default=200.0, help="mock LLM tokens per second")
+    parser.add_argument("--llm-load-time", type=float, default=2.0, help="mock LLM model swap time (s)")
+    parser.add_argument("--search-latency", type=float, default=0.3, help="fake search latency (s)")
+    parser.add_argument("--paragraphs", type=int, default=12, help="paragraphs per fixture page")
+    parser.add_argument("--keep-caches", action="store_true", help="leave the page/search caches on")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="leave the per-domain rate limits on")
+    parser.add_argument("--browser-only", action="store_true", help="crawl every page with the browser (no HTTP fast path)")
+    parser.add_argument("--app-port", type=int, default=8100)
+    parser.add_argument("--llm-port", type=int, default=8101)
+    parser.add_argument("--site-port", type=int, default=8102)
+    parser.add_argument("--output", default=f"benchmarks/results/bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
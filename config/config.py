@@ -1,8 +1,8 @@
 # config.py
 
 from pydantic_settings import BaseSettings
-from pydantic import BaseModel, Field
-from typing import List, Literal
+from pydantic import BaseModel, Field, PositiveFloat
+from typing import Dict, List, Literal, Optional
 
 
 class WebSearchToolSettings(BaseModel):
@@ -25,16 +25,442 @@ class WebSearchToolSettings(BaseModel):
     # Whether to filter out the blacklist
     BLACKLIST_ON: bool = True
 
+    # SEARCH_WORKERS=4
+    # Threads running the (blocking) search clients, so searches don't block the event loop
+    SEARCH_WORKERS: int = 4
+
+    # MAX_CONCURRENT_CRAWLS=4
+    # Max number of pages crawled at once for one report (across all of its sub-questions)
+    MAX_CONCURRENT_CRAWLS: int = 4
+
+    # MAX_BROWSER_PAGES=8
+    # Max number of browser pages open at once in the whole app (across all reports),
+    # handed out round-robin between reports
+    MAX_BROWSER_PAGES: int = 8
+
+    # DOMAIN_RATE=1.0
+    # Requests per second to a single domain (searches, HTTP fetches and browser crawls),
+    # across all reports, must be > 0
+    DOMAIN_RATE: float = Field(default=1.0, gt=0)
+
+    # DOMAIN_BURST=4
+    # Requests a domain can take at once before DOMAIN_RATE applies
+    DOMAIN_BURST: int = Field(default=4, ge=1)
+
+    # WEB_SEARCH_TOOL__DOMAIN_RATE_LIMITS='{"google.com": 0.2}' (json object string)
+    # Per-domain overrides of DOMAIN_RATE (> 0), search engines are limited as google.com / duckduckgo.com
+    DOMAIN_RATE_LIMITS: Dict[str, PositiveFloat] = {"google.com": 0.2, "duckduckgo.com": 0.5}
+
+    # CRAWL_TIMEOUT=30
+    # Seconds before a single page crawl is abandoned
+    CRAWL_TIMEOUT: float = 30.0
+
+    # HTTP_FETCH_ON=True
+    # Try a plain HTTP fetch before the headless browser, the browser is only used for pages
+    # that need JavaScript (and for domains where the HTTP fetch didn't work)
+    HTTP_FETCH_ON: bool = True
+
+    # HTTP_FETCH_TIMEOUT=10
+    # Seconds before an HTTP fetch is abandoned (and the browser is tried)
+    HTTP_FETCH_TIMEOUT: float = 10.0
+
+    # HTTP_MAX_CONNECTIONS=32
+    # Pooled keep-alive connections of the HTTP client
+    HTTP_MAX_CONNECTIONS: int = 32
+
+    # HTTP_MIN_TEXT_CHARS=500
+    # Pages with less visible text than this (outside scripts/styles) go to the browser
+    HTTP_MIN_TEXT_CHARS: int = 500
+
+    # HTTP_MIN_TEXT_RATIO=0.02
+    # Pages whose visible text is less than this fraction of the html go to the browser
+    HTTP_MIN_TEXT_RATIO: float = 0.02
+
+    # HTTP_TIER_TTL=3600
+    # Seconds the tier that worked for a domain (http/browser) is remembered
+    HTTP_TIER_TTL: float = 3600.0
+
+    # MAX_PAGE_CHARS=20000
+    # Crawled pages are cut (at a line break or sentence end) past this many characters, 0 for no cap
+    MAX_PAGE_CHARS: int = 20000
+
+    # NEAR_DUPLICATE_ON=True
+    # Replace crawled pages whose content is a near-duplicate (SimHash) of another page of the
+    # same report, e.g. syndicated copies of an article
+    NEAR_DUPLICATE_ON: bool = True
+
+    # NEAR_DUPLICATE_DISTANCE=3
+    # Max differing bits (out of 64) between two pages' SimHash fingerprints to count as duplicates
+    NEAR_DUPLICATE_DISTANCE: int = 3
+
+    # PAGE_CACHE_ON=True
+    # Cache crawled page content on disk so repeated URLs skip the browser
+    PAGE_CACHE_ON: bool = True
+
+    # PAGE_CACHE_PATH="page_cache.sqlite3"
+    PAGE_CACHE_PATH: str = "page_cache.sqlite3"
+
+    # PAGE_CACHE_TTL=86400
+    # Seconds a cached page stays valid
+    PAGE_CACHE_TTL: float = 86400.0
+
+    # PAGE_CACHE_MAX_MB=256
+    # Size cap of the cache, least recently used pages are evicted past this
+    PAGE_CACHE_MAX_MB: int = 256
+
+    # SEARCH_CACHE_ON=True
+    # Cache search results and share in-flight searches for the same sub-prompt
+    SEARCH_CACHE_ON: bool = True
+
+    # SEARCH_CACHE_TTL=3600
+    # Seconds cached search results stay valid
+    SEARCH_CACHE_TTL: float = 3600.0
+
+    # SEARCH_CACHE_MAX_ENTRIES=1000
+    SEARCH_CACHE_MAX_ENTRIES: int = 1000
+
+    # HEDGE_ON=False
+    # Hedged crawling: search HEDGE_EXTRA_RESULTS more results than NUM_SEARCH_RESULTS, crawl them all
+    # at once and finish a sub-question as soon as NUM_SEARCH_RESULTS pages have content
+    # The remaining (straggler) crawls are cancelled
+    HEDGE_ON: bool = False
+
+    # HEDGE_EXTRA_RESULTS=2
+    HEDGE_EXTRA_RESULTS: int = 2
+
+    # HEDGE_DEADLINE=20
+    # With HEDGE_ON, seconds after its search returns that a sub-question is finished with the
+    # pages crawled so far (0 for no deadline)
+    HEDGE_DEADLINE: float = 20.0
+
+    # PIPELINE_QUEUE_SIZE=16
+    # Size of the queues between the search, crawl and clean stages of a report's research
+    # A full queue makes the stage before it wait (backpressure)
+    PIPELINE_QUEUE_SIZE: int = 16
+
 
 class ResearchAgentSettings(BaseModel):
     # Number of questions/topics the research agent has to generate
     NUM_SUB_QUESTIONS: str = "5"
 
+    # RESEARCH_AGENT__MODE="plan"
+    # MUST be one of the Literal values
+    # plan - one structured-output call returns the sub-questions, the searches are then run
+    #        directly and their results never go back through the model
+    # agent - the model calls the `web_search` tool once per sub-question (tool-calling loop)
+    MODE: Literal["plan", "agent"] = "plan"
+
+    # RESEARCH_AGENT__FALLBACK_TO_AGENT=True
+    # In plan mode, fall back to the agent mode when the planning call fails
+    FALLBACK_TO_AGENT: bool = True
+
+    # RESEARCH_AGENT__MODEL="llama3.1:8b"
+    # Model used by the research agent, must be served by one of the LLM backends
+    MODEL: str = "llama3.1:8b"
+
 
 class SynthAgentSettings(BaseModel):
     # The number of words the report should contain excluding sources
     WORD_COUNT_REQ: str = "800"
 
+    # SYNTH_AGENT__MODEL="qwen3:14b"
+    # Model used by the synthesizer agent, must be served by one of the LLM backends
+    MODEL: str = "qwen3:14b"
+
+    # In .env file, put "SYNTH_AGENT__" before each variable
+
+    # CONTEXT_MODE="ranked"
+    # MUST be one of the Literal values
+    # full - the full research JSON goes in the prompt
+    # ranked - dedup, rank (BM25) and trim the research to CONTEXT_TOKEN_BUDGET
+    # retrieval - index the research in the vector index and use the top chunks per sub-question
+    CONTEXT_MODE: Literal["full", "ranked", "retrieval"] = "ranked"
+
+    # SYNTHESIS_MODE="single"
+    # MUST be one of the Literal values
+    # single - the whole report is written by one LLM call
+    # sectioned - each research section is written by its own (concurrent) LLM call with only its
+    #             own sources, then one short call writes the title and abstract
+    #             References are filled in from the research urls instead of by the model
+    SYNTHESIS_MODE: Literal["single", "sectioned"] = "single"
+
+    # CONTEXT_TOKEN_BUDGET=12000
+    # Max (estimated) tokens of research context given to the synthesizer
+    CONTEXT_TOKEN_BUDGET: int = 12000
+
+    # CHARS_PER_TOKEN=4.0
+    # Used to estimate tokens from text length
+    CHARS_PER_TOKEN: float = 4.0
+
+    # MIN_PARAGRAPH_CHARS=40
+    # Chunks shorter than this (menus, captions, etc) are dropped
+    MIN_PARAGRAPH_CHARS: int = 40
+
+    # MAX_CHUNK_CHARS=1000
+    # Sources are ranked in chunks of consecutive lines up to this long, longer lines are split
+    # at sentence ends
+    MAX_CHUNK_CHARS: int = Field(default=1000, gt=0)
+
+    # DEDUP_THRESHOLD=0.8
+    # Paragraphs this similar (Jaccard over word 3-grams) to an earlier one are dropped
+    DEDUP_THRESHOLD: float = 0.8
+
+    # BM25_K1=1.5, BM25_B=0.75
+    # BM25 parameters for ranking paragraphs against their sub-question
+    BM25_K1: float = 1.5
+    BM25_B: float = 0.75
+
+
+class VectorIndexSettings(BaseModel):
+    # In .env file, put "VECTOR_INDEX__" before each variable
+    # Only used when SYNTH_AGENT__CONTEXT_MODE="retrieval"
+
+    # INDEX_DIR="vector_index"
+    # Directory holding the memory-mapped vectors and the chunk store
+    INDEX_DIR: str = "vector_index"
+
+    # EMBEDDING_MODEL="nomic-embed-text"
+    # Ollama embedding model, served by OLLAMA_HOST (also used by the report cache)
+    EMBEDDING_MODEL: str = "nomic-embed-text"
+
+    # CHUNK_CHARS=1200
+    # Max size of an indexed chunk, longer paragraphs are split at sentence ends
+    CHUNK_CHARS: int = Field(default=1200, gt=0)
+
+    # CHUNK_OVERLAP=200
+    # Characters (whole sentences) a split paragraph's chunk repeats from the previous one
+    CHUNK_OVERLAP: int = Field(default=200, ge=0)
+
+    # TOP_K=6
+    # Chunks retrieved for each sub-question
+    TOP_K: int = 6
+
+    # SEARCH_ALL_SOURCES=False
+    # If True, chunks crawled for earlier reports can be used (and referenced) too
+    SEARCH_ALL_SOURCES: bool = False
+
+
+class ReportCacheSettings(BaseModel):
+    # In .env file, put "REPORT_CACHE__" before each variable
+    # Prompts are embedded with VECTOR_INDEX__EMBEDDING_MODEL
+
+    # ON=False
+    # Reuse finished reports for (almost) the same prompt
+    ON: bool = False
+
+    # PATH="report_cache.sqlite3"
+    PATH: str = "report_cache.sqlite3"
+
+    # SIMILARITY_THRESHOLD=0.92
+    # Min cosine similarity between two prompts' embeddings for them to share a report
+    SIMILARITY_THRESHOLD: float = 0.92
+
+    # TTL=86400
+    # Seconds a cached report can be served
+    TTL: float = 86400.0
+
+    # MAX_ENTRIES=500
+    # Least recently used reports are evicted past this
+    MAX_ENTRIES: int = 500
+
+    # BACKGROUND_REFRESH=False
+    # Regenerate a cached report in the background when it is served after REFRESH_AFTER seconds
+    BACKGROUND_REFRESH: bool = False
+
+    # REFRESH_AFTER=21600
+    REFRESH_AFTER: float = 21600.0
+
+
+class LLMSchedulerSettings(BaseModel):
+    # In .env file, put "LLM_SCHEDULER__" before each variable
+
+    # MAX_CONCURRENT_PER_MODEL=2
+    # Requests sent to the same model at once, the rest queue (round-robin across reports)
+    MAX_CONCURRENT_PER_MODEL: int = 2
+
+    # MAX_LOADED_MODELS=1
+    # How many models an Ollama server keeps in memory at once (OLLAMA_MAX_LOADED_MODELS)
+    # Requests that would swap a busy model out wait until it goes idle
+    # Can be set per backend in LLM_BACKENDS
+    MAX_LOADED_MODELS: int = 1
+
+    # KEEP_ALIVE="10m"
+    # keep_alive sent to Ollama when a model is loaded
+    KEEP_ALIVE: str = "10m"
+
+    # PS_CACHE_SECONDS=2
+    # How long the list of loaded models (/api/ps) is reused before asking again
+    PS_CACHE_SECONDS: float = 2.0
+
+    # LOAD_TIMEOUT=300
+    # Seconds to wait for Ollama to load a model
+    LOAD_TIMEOUT: float = 300.0
+
+    # REQUEST_TIMEOUT=600
+    # Seconds before an LLM request times out (and fails over to another backend)
+    REQUEST_TIMEOUT: float = 600.0
+
+    # BACKEND_COOLDOWN=30
+    # Seconds a backend is skipped after a timeout or connection error
+    BACKEND_COOLDOWN: float = 30.0
+
+    # MAX_CONNECTIONS_PER_BACKEND=16
+    # Size of the pooled keep-alive connection pool to each backend
+    MAX_CONNECTIONS_PER_BACKEND: int = 16
+
+
+class LLMBackendSettings(BaseModel):
+    # One Ollama host, see LLM_BACKENDS
+    HOST: str
+    # Models served by this host, empty means every model
+    MODELS: List[str] = []
+    # Overrides LLM_SCHEDULER__MAX_LOADED_MODELS for this host
+    MAX_LOADED_MODELS: Optional[int] = None
+
+
+class JobQueueSettings(BaseModel):
+    # In .env file, put "JOB_QUEUE__" before each variable
+
+    # NUM_WORKERS=2
+    # Number of reports generated at the same time
+    NUM_WORKERS: int = 2
+
+    # MAX_QUEUE_SIZE=50
+    # Jobs waiting for a worker, new submissions are rejected past this
+    MAX_QUEUE_SIZE: int = 50
+
+    # JOB_TTL=3600
+    # Seconds a finished job (and its report) is kept around for polling
+    JOB_TTL: float = 3600.0
+
+
+class StartupSettings(BaseModel):
+    # In .env file, put "STARTUP__" before each variable
+    # Warm-up runs in the background once the app is up, /ready answers 503 until it is done
+
+    # PREWARM_BROWSER=False
+    # Launch the headless browser at startup instead of on the first crawl
+    PREWARM_BROWSER: bool = False
+
+    # PREWARM_MODELS=False
+    # Load the research and synthesizer models on the LLM backends at startup
+    PREWARM_MODELS: bool = False
+
+    # WARMUP_TIMEOUT=300
+    # Seconds after which the app is marked ready even if the warm-up isn't done
+    WARMUP_TIMEOUT: float = 300.0
+
+
+class LoggingSettings(BaseModel):
+    # In .env file, put "LOGGING__" before each variable
+    # Records are handed to a background thread, so logging never blocks the event loop
+
+    # LEVEL="INFO"
+    LEVEL: str = "INFO"
+
+    # FILE="app.log"
+    # With SERVER__WORKERS > 1, every process writes its own file with its pid (app.<pid>.log)
+    FILE: str = "app.log"
+
+    # FILE_FORMAT="json"
+    # json - one json object per line (time, level, logger, trace_id, message)
+    # text - same format as the console
+    FILE_FORMAT: Literal["json", "text"] = "json"
+
+    # MAX_MB=50
+    # The log file is rotated past this size
+    MAX_MB: int = 50
+
+    # BACKUP_COUNT=5
+    # Rotated log files kept (app.log.1 ... app.log.5)
+    BACKUP_COUNT: int = 5
+
+
+class ArtifactSettings(BaseModel):
+    # In .env file, put "ARTIFACTS__" before each variable
+    # Report prompts and final reports saved for debugging, written by a background thread
+
+    # ON=True
+    ON: bool = True
+
+    # BACKEND="files"
+    # files - one gzip file per artifact, in DIR/<date>/<trace_id>-<kind>.txt.gz
+    # sqlite - gzipped rows in the SQLite database at PATH
+    BACKEND: Literal["files", "sqlite"] = "files"
+
+    # DIR="artifacts"
+    DIR: str = "artifacts"
+
+    # PATH="artifacts.sqlite3"
+    PATH: str = "artifacts.sqlite3"
+
+    # SAMPLE_RATE=1.0
+    # Fraction of requests whose artifacts are saved (decided per trace id, so a saved
+    # request keeps both its prompt and its report)
+    SAMPLE_RATE: float = 1.0
+
+    # COMPRESSION_LEVEL=6
+    # gzip level, 1 (fastest) - 9 (smallest)
+    COMPRESSION_LEVEL: int = 6
+
+    # RETENTION=604800
+    # Seconds artifacts are kept
+    RETENTION: float = 604800.0
+
+    # MAX_MB=512
+    # Size cap of the stored artifacts, the oldest are deleted past this
+    MAX_MB: int = 512
+
+    # QUEUE_SIZE=256
+    # Artifacts waiting to be written, new ones are dropped (with a warning) past this
+    QUEUE_SIZE: int = 256
+
+
+class ServerSettings(BaseModel):
+    # In .env file, put "SERVER__" before each variable
+    # Used when the app is started with `python main.py`
+
+    # HOST="0.0.0.0"
+    HOST: str = "0.0.0.0"
+
+    # PORT=8000
+    PORT: int = 8000
+
+    # WORKERS=1
+    # Worker processes serving requests, set SHARED_STORE__ON=True with more than 1
+    WORKERS: int = 1
+
+
+class SharedStoreSettings(BaseModel):
+    # In .env file, put "SHARED_STORE__" before each variable
+    # Store shared by the worker processes (SERVER__WORKERS > 1): search results, finished
+    # reports and job status are visible to every worker, and identical /generate-report
+    # prompts in flight at the same time are only worked on by one worker, the others wait
+    # The page cache (PAGE_CACHE_PATH) and report cache are SQLite files, shared as they are
+
+    # ON=False
+    ON: bool = False
+
+    # BACKEND="sqlite"
+    # sqlite - one SQLite database in WAL mode at PATH
+    BACKEND: Literal["sqlite"] = "sqlite"
+
+    # PATH="shared_store.sqlite3"
+    PATH: str = "shared_store.sqlite3"
+
+    # REPORT_TTL=300
+    # Seconds a finished report is handed to identical prompts
+    REPORT_TTL: float = 300.0
+
+    # LEASE=60
+    # Seconds a worker's claim on a prompt lasts without being renewed (it is renewed while
+    # the report is generated), a waiting worker takes the prompt over once it expires
+    LEASE: float = 60.0
+
+    # POLL_INTERVAL=0.5
+    # Seconds between checks for the result of a prompt another worker is working on
+    POLL_INTERVAL: float = 0.5
+
 
 class Settings(BaseSettings):
     # FIX: Use Field(default_factory=...) for nested models
@@ -42,10 +468,24 @@ class Settings(BaseSettings):
     WEB_SEARCH_TOOL: WebSearchToolSettings = Field(default_factory=WebSearchToolSettings)
     RESEARCH_AGENT: ResearchAgentSettings = Field(default_factory=ResearchAgentSettings)
     SYNTH_AGENT: SynthAgentSettings = Field(default_factory=SynthAgentSettings)
+    VECTOR_INDEX: VectorIndexSettings = Field(default_factory=VectorIndexSettings)
+    REPORT_CACHE: ReportCacheSettings = Field(default_factory=ReportCacheSettings)
+    LLM_SCHEDULER: LLMSchedulerSettings = Field(default_factory=LLMSchedulerSettings)
+    JOB_QUEUE: JobQueueSettings = Field(default_factory=JobQueueSettings)
+    STARTUP: StartupSettings = Field(default_factory=StartupSettings)
+    LOGGING: LoggingSettings = Field(default_factory=LoggingSettings)
+    ARTIFACTS: ArtifactSettings = Field(default_factory=ArtifactSettings)
+    SERVER: ServerSettings = Field(default_factory=ServerSettings)
+    SHARED_STORE: SharedStoreSettings = Field(default_factory=SharedStoreSettings)
 
     # App-level secrets (ensure these are in your .env file)
     OLLAMA_HOST: str
 
+    # LLM_BACKENDS='[{"HOST": "gpu1:11434", "MODELS": ["llama3.1:8b"]}, {"HOST": "gpu2:11434"}]'
+    # Ollama hosts requests are load balanced across (json array string)
+    # If empty, OLLAMA_HOST serves every model
+    LLM_BACKENDS: List[LLMBackendSettings] = []
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
@@ -1,22 +1,40 @@
 import requests
 import uvicorn
+import json
+import time
+import hashlib
 import asyncio
+import psutil
+from typing import Callable, List, Optional, Tuple
 
 from fastapi import FastAPI, HTTPException
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from contextlib import asynccontextmanager
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from pydantic import BaseModel
-from models.ResearchModel import StructuredResearchOutput
+from models.ResearchModel import RESEARCH_ADAPTER, SECTIONS_ADAPTER, ResearchSection, StructuredResearchOutput
 from models.ReportModel import Report
 from models.QueryModels import UserQuery
+from models.JobModels import JobInfo, JobSubmission
 
 from agents.ResearchAgent import ResearchAgent
 from agents.SynthesizerAgent import SynthesizerAgent
 
-from utils.save_to_file import save_to_output_file
 from utils.logger import logger
+from utils.metrics import REPORTS, STAGE_SECONDS, stage_timer
+from utils.trace import new_trace_id
+from utils.llm_backends import backend_pool
+from utils.http_fetcher import HttpFetcher
+from utils.lazy_crawler import LazyCrawler
+from utils.context_builder import build_context, build_retrieval_context, index_sections, rank_sections, retrieve_sections
+from utils.embeddings import EmbeddingClient
+from utils.vector_index import VectorIndex
+from utils.report_cache import ReportCache
+from utils.artifact_store import create_artifact_store
+from utils.shared_store import SharedStore, create_shared_store, run_once
+from utils.job_queue import JobQueue, QueueFullError
 
 from config.config import app_settings
 
@@ -27,22 +45,143 @@ app_state = {}
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     
+    # One headless browser for the whole app, shared by every crawl
+    # launched on the first crawl, or by the warm-up (STARTUP__PREWARM_BROWSER)
+    crawler = LazyCrawler()
+
+    # Pooled HTTP client tried before the browser for static pages
+    http_fetcher = None
+    if app_settings.WEB_SEARCH_TOOL.HTTP_FETCH_ON:
+        http_fetcher = HttpFetcher(
+            timeout=app_settings.WEB_SEARCH_TOOL.HTTP_FETCH_TIMEOUT,
+            max_connections=app_settings.WEB_SEARCH_TOOL.HTTP_MAX_CONNECTIONS,
+            min_text_chars=app_settings.WEB_SEARCH_TOOL.HTTP_MIN_TEXT_CHARS,
+            min_text_ratio=app_settings.WEB_SEARCH_TOOL.HTTP_MIN_TEXT_RATIO,
+            tier_ttl=app_settings.WEB_SEARCH_TOOL.HTTP_TIER_TTL
+        )
+
+    # Store shared with the other worker processes (if on)
+    shared_store = create_shared_store(app_settings.SHARED_STORE)
+    if shared_store:
+        app_state["shared_store"] = shared_store
 
     # Initialize agents
-    research_agent = ResearchAgent()
+    research_agent = ResearchAgent(crawler, http_fetcher, shared_store)
     synthesizer_agent = SynthesizerAgent()
 
     # Register to app state
     app_state["research_agent"] = research_agent
     app_state["synthesizer_agent"] = synthesizer_agent
+
+    # Persistent chunk index for retrieval-based context
+    if app_settings.SYNTH_AGENT.CONTEXT_MODE == "retrieval" or app_settings.REPORT_CACHE.ON:
+        app_state["embedder"] = EmbeddingClient(
+            host=app_settings.OLLAMA_HOST,
+            model=app_settings.VECTOR_INDEX.EMBEDDING_MODEL
+        )
+    if app_settings.SYNTH_AGENT.CONTEXT_MODE == "retrieval":
+        app_state["vector_index"] = VectorIndex(app_settings.VECTOR_INDEX.INDEX_DIR)
+
+    # Finished reports, reused for similar prompts
+    if app_settings.REPORT_CACHE.ON:
+        app_state["report_cache"] = ReportCache(
+            path=app_settings.REPORT_CACHE.PATH,
+            embedder=app_state["embedder"],
+            threshold=app_settings.REPORT_CACHE.SIMILARITY_THRESHOLD,
+            ttl=app_settings.REPORT_CACHE.TTL,
+            max_entries=app_settings.REPORT_CACHE.MAX_ENTRIES,
+            refresh_after=app_settings.REPORT_CACHE.REFRESH_AFTER if app_settings.REPORT_CACHE.BACKGROUND_REFRESH else None
+        )
+
+    # Debug copies of the report prompts and reports (if on)
+    artifact_store = create_artifact_store(app_settings.ARTIFACTS)
+    if artifact_store:
+        app_state["artifact_store"] = artifact_store
+
+    # Background workers for submitted report jobs
+    job_queue = JobQueue(
+        handler=generate_report,
+        num_workers=app_settings.JOB_QUEUE.NUM_WORKERS,
+        max_queue_size=app_settings.JOB_QUEUE.MAX_QUEUE_SIZE,
+        job_ttl=app_settings.JOB_QUEUE.JOB_TTL,
+        store=shared_store,
+        poll_interval=app_settings.SHARED_STORE.POLL_INTERVAL
+    )
+    job_queue.start()
+    app_state["job_queue"] = job_queue
     logger.info("App is live")
 
+    app_state["live_at"] = time.time()
+    startup_seconds = app_state["live_at"] - psutil.Process().create_time()
+    STAGE_SECONDS.labels(stage="startup").observe(startup_seconds)
+    logger.info(f"[STARTUP] App is live {startup_seconds:.2f}s after the process started")
+
+    # /ready answers 503 until this is done
+    app_state["ready"] = False
+    warmup = asyncio.create_task(warm_up(crawler, research_agent))
+
     yield
 
     print("--- Shutting down ---")
+    warmup.cancel()
+    await asyncio.gather(warmup, return_exceptions=True)
+    await job_queue.stop()
+    if "report_cache" in app_state:
+        await app_state["report_cache"].close()
+    await crawler.close()
+    if http_fetcher:
+        await http_fetcher.close()
+    await backend_pool.close()
+    if "vector_index" in app_state:
+        app_state["vector_index"].close()
+    if "embedder" in app_state:
+        await app_state["embedder"].close()
+    if artifact_store:
+        await asyncio.to_thread(artifact_store.close)
+    if shared_store:
+        shared_store.close()
     app_state.clear()
 
 
+async def warm_up(crawler: LazyCrawler, research_agent: ResearchAgent):
+    # launches the browser and loads the models before the first request needs them (if on)
+    steps = []
+    if app_settings.STARTUP.PREWARM_BROWSER:
+        steps += [crawler.start(), research_agent.s_tool.get_crawler_config()]
+    if app_settings.STARTUP.PREWARM_MODELS:
+        # the research model runs first in a report, so it is loaded last
+        models = list(dict.fromkeys([app_settings.SYNTH_AGENT.MODEL, app_settings.RESEARCH_AGENT.MODEL]))
+        steps.append(backend_pool.warm_up(models))
+
+    if steps:
+        start = time.perf_counter()
+        try:
+            results = await asyncio.wait_for(
+                asyncio.gather(*steps, return_exceptions=True),
+                timeout=app_settings.STARTUP.WARMUP_TIMEOUT
+            )
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"[STARTUP] Warm-up step failed: {result}")
+        except asyncio.TimeoutError:
+            logger.warning(f"[STARTUP] Warm-up not done after {app_settings.STARTUP.WARMUP_TIMEOUT}s, marking the app ready")
+        STAGE_SECONDS.labels(stage="warmup").observe(time.perf_counter() - start)
+        logger.info(f"[STARTUP] Warm-up took {time.perf_counter() - start:.2f}s")
+
+    app_state["ready"] = True
+    logger.info("App is ready")
+
+
+def log_first_report(started: float):
+    # latency of the first report this process serves (cold browser, models and caches)
+    if app_state.get("first_report_done"):
+        return
+    app_state["first_report_done"] = True
+    seconds = time.perf_counter() - started
+    STAGE_SECONDS.labels(stage="first_report").observe(seconds)
+    logger.info(f"[STARTUP] First report served in {seconds:.2f}s ({time.time() - app_state['live_at']:.0f}s after the app went live)")
+
+
 app = FastAPI(
     title="Autonomous Report Builder",
     lifespan=lifespan
@@ -50,25 +189,23 @@ app = FastAPI(
 app.mount("/app", StaticFiles(directory="static", html=True), name="static")
 
 
-@app.post("/generate-report", response_model=Report)
-async def generate_text(query: UserQuery):
+async def build_report_prompt(query: UserQuery, research_context: StructuredResearchOutput) -> str:
+    match app_settings.SYNTH_AGENT.CONTEXT_MODE:
+        case "ranked":
+            research_json, reference_urls = build_context(research_context, app_settings.SYNTH_AGENT)
+        case "retrieval":
+            research_json, reference_urls = await build_retrieval_context(
+                research_context,
+                app_state["vector_index"],
+                app_state["embedder"],
+                app_settings.SYNTH_AGENT,
+                app_settings.VECTOR_INDEX
+            )
+        case _:
+            research_json = RESEARCH_ADAPTER.dump_json(research_context).decode("utf-8")
+            reference_urls = research_context.all_urls
 
-    try:
-        logger.info(f"[REQUEST] Request recieved. User wants to research: {query.prompt}")
-        
-        # research agent
-        user_prompt = f"""
-            Research the topic {query.prompt} by generating {app_settings.RESEARCH_AGENT.NUM_SUB_QUESTIONS} subquestions and using the tools available to answer them.
-        """
-
-        research_context: StructuredResearchOutput = await app_state["research_agent"].run(user_prompt, query)
-
-        research_json = research_context.model_dump_json(indent=2)
-        reference_urls = research_context.all_urls
-
-        # synthesizer (report writer) agent
-        logger.info("Research complete.")
-        report_prompt = f"""
+    return f"""
         Generate a professional report on the topic: '{query.prompt}'.
         
         Use the following JSON as context as your sole source of information:
@@ -92,24 +229,292 @@ async def generate_text(query: UserQuery):
         ---
         
         """
-        save_to_output_file(report_prompt, "Report Prompt")
 
-        await asyncio.sleep(10)
 
-        final_report = await app_state["synthesizer_agent"].run(report_prompt)
+async def build_context_sections(research_context: StructuredResearchOutput) -> Tuple[List[dict], List[str]]:
+    # the research context split per sub-question, for SYNTHESIS_MODE="sectioned"
+    match app_settings.SYNTH_AGENT.CONTEXT_MODE:
+        case "ranked":
+            return rank_sections(research_context, app_settings.SYNTH_AGENT)
+        case "retrieval":
+            return await retrieve_sections(
+                research_context,
+                app_state["vector_index"],
+                app_state["embedder"],
+                app_settings.SYNTH_AGENT,
+                app_settings.VECTOR_INDEX
+            )
+        case _:
+            return SECTIONS_ADAPTER.dump_python(research_context.sections), research_context.all_urls
+
+
+async def run_research(query: UserQuery) -> StructuredResearchOutput:
+    # research agent
+    user_prompt = f"""
+        Research the topic {query.prompt} by generating {app_settings.RESEARCH_AGENT.NUM_SUB_QUESTIONS} subquestions and using the tools available to answer them.
+    """
+
+    # in retrieval mode, each section is embedded into the index as soon as it is crawled,
+    # while the other sub-questions are still being researched
+    indexing: List[asyncio.Task] = []
+    on_section = None
+    if app_settings.SYNTH_AGENT.CONTEXT_MODE == "retrieval":
+        def on_section(section: ResearchSection):
+            indexing.append(asyncio.create_task(index_sections(
+                [section],
+                app_state["vector_index"],
+                app_state["embedder"],
+                app_settings.SYNTH_AGENT,
+                app_settings.VECTOR_INDEX
+            )))
+
+    try:
+        research_context: StructuredResearchOutput = await app_state["research_agent"].run(user_prompt, query, on_section)
+    finally:
+        # failed early indexing is retried when the context is built
+        await asyncio.gather(*indexing, return_exceptions=True)
+    logger.info("Research complete.")
+    return research_context
+
+
+async def generate_report(query: UserQuery, on_partial: Optional[Callable[[dict], None]] = None) -> Report:
+    # full research -> synthesis pipeline, shared by the endpoints and the job workers
+    # when `on_partial` is given the report is streamed and partial reports are passed to it
+    # reports for similar prompts are served from the report cache (if on)
+    started = time.perf_counter()
+    trace_id = new_trace_id()
+    report_cache: Optional[ReportCache] = app_state.get("report_cache")
+    prompt_vector = None
+
+    if report_cache:
+        try:
+            cached, prompt_vector = await report_cache.get(query.prompt)
+        except Exception as e:
+            logger.warning(f"Report cache lookup failed: {e}. Generating the report.")
+            cached = None
+
+        if cached is not None:
+            if report_cache.needs_refresh(cached):
+                report_cache.refresh(cached, lambda: refresh_report(cached.prompt))
+            REPORTS.labels(outcome="cache_hit").inc()
+            cached.report.trace_id = trace_id
+            logger.info("Report served from cache")
+            log_first_report(started)
+            return cached.report
+
+    shared = False
+    shared_store: Optional[SharedStore] = app_state.get("shared_store")
+    if shared_store:
+        final_report, shared = await run_report_once(shared_store, query, on_partial)
+    else:
+        final_report = await run_report_pipeline(query, on_partial)
+    final_report.trace_id = trace_id
+
+    # a shared report was cached by the request that generated it
+    if report_cache and prompt_vector is not None and not shared:
+        try:
+            await report_cache.put(query.prompt, prompt_vector, final_report)
+        except Exception as e:
+            logger.warning(f"Failed to cache the report: {e}")
+
+    log_first_report(started)
+    return final_report
+
+
+async def run_report_once(
+    store: SharedStore,
+    query: UserQuery,
+    on_partial: Optional[Callable[[dict], None]] = None
+) -> Tuple[Report, bool]:
+    # identical prompts in flight in any worker process are only generated once, the other
+    # requests wait for that report (without partial reports when streamed)
+    # returns (report, shared), `shared` is True when another request generated it
+    key = hashlib.sha256(" ".join(query.prompt.lower().split()).encode("utf-8")).hexdigest()
+
+    async def produce() -> str:
+        report = await run_report_pipeline(query, on_partial)
+        return report.model_dump_json(exclude={"trace_id"})
+
+    report_json, shared = await run_once(
+        store,
+        "report",
+        key,
+        produce,
+        lease=app_settings.SHARED_STORE.LEASE,
+        poll_interval=app_settings.SHARED_STORE.POLL_INTERVAL,
+        result_ttl=app_settings.SHARED_STORE.REPORT_TTL
+    )
+    if shared:
+        REPORTS.labels(outcome="deduplicated").inc()
+        logger.info("Report shared by an identical request")
+    return Report.model_validate_json(report_json), shared
 
-        save_to_output_file(str(final_report.output), "Final Report")
-        logger.info("Report done")
 
-        return final_report.output
+async def refresh_report(prompt: str) -> Report:
+    # background regeneration of a cached report, under its own trace id
+    new_trace_id()
+    return await run_report_pipeline(UserQuery(prompt=prompt))
+
+
+def save_artifact(kind: str, text: str):
+    # queued for the artifact store's writer thread, never blocks the request
+    if "artifact_store" in app_state:
+        app_state["artifact_store"].save(kind, text)
+
+
+async def run_report_pipeline(query: UserQuery, on_partial: Optional[Callable[[dict], None]] = None) -> Report:
+    try:
+        async with stage_timer("report", prompt=query.prompt):
+            research_context = await run_research(query)
+
+            # synthesizer (report writer) agent
+            if app_settings.SYNTH_AGENT.SYNTHESIS_MODE == "sectioned":
+                async with stage_timer("context_build", mode=app_settings.SYNTH_AGENT.CONTEXT_MODE):
+                    context_sections, reference_urls = await build_context_sections(research_context)
+                final_report = await app_state["synthesizer_agent"].run_sectioned(
+                    query.prompt,
+                    context_sections,
+                    reference_urls,
+                    on_partial
+                )
+            else:
+                async with stage_timer("context_build", mode=app_settings.SYNTH_AGENT.CONTEXT_MODE):
+                    report_prompt = await build_report_prompt(query, research_context)
+                save_artifact("report_prompt", report_prompt)
+
+                if on_partial is None:
+                    final_report = (await app_state["synthesizer_agent"].run(report_prompt)).output
+                else:
+                    final_report = await app_state["synthesizer_agent"].run_stream(report_prompt, on_partial)
+    except BaseException:
+        REPORTS.labels(outcome="failed").inc()
+        raise
+
+    REPORTS.labels(outcome="done").inc()
+
+    save_artifact("report", final_report.model_dump_json(indent=2))
+    logger.info("Report done")
+
+    return final_report
+
+
+@app.post("/generate-report", response_model=Report)
+async def generate_text(query: UserQuery):
+
+    try:
+        logger.info(f"[REQUEST] Request recieved. User wants to research: {query.prompt}")
+        return await generate_report(query)
 
     except requests.RequestException as e:
         logger.error(f"Ollama communication error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Ollama communication error: {str(e)}")
 
+
+@app.post("/generate-report/stream")
+async def generate_text_stream(query: UserQuery):
+    # Server-sent events: "partial" events with the report as it is written,
+    # then one "report" event with the validated Report (or an "error" event)
+    logger.info(f"[REQUEST] Streaming request recieved. User wants to research: {query.prompt}")
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        try:
+            report = await generate_report(
+                query,
+                on_partial=lambda partial: events.put_nowait(("partial", json.dumps(partial)))
+            )
+            events.put_nowait(("report", report.model_dump_json()))
+        except Exception as e:
+            logger.error(f"Streaming report failed: {e}")
+            events.put_nowait(("error", json.dumps({"detail": str(e)})))
+
+    async def event_stream():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event, data = await events.get()
+                yield f"event: {event}\ndata: {data}\n\n"
+                if event in ("report", "error"):
+                    break
+        finally:
+            producer.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+@app.post("/jobs", response_model=JobSubmission, status_code=202)
+async def submit_job(query: UserQuery):
+    logger.info(f"[REQUEST] Job submitted. User wants to research: {query.prompt}")
+    try:
+        job = app_state["job_queue"].submit(query)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    return JobSubmission(
+        job_id=job.info.job_id,
+        status=job.info.status,
+        queue_position=app_state["job_queue"].queue.qsize()
+    )
+
+
+async def get_job_or_404(job_id: str) -> JobInfo:
+    # jobs submitted to another worker process are found in the shared store (if on)
+    info = await app_state["job_queue"].get_info(job_id)
+    if info is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return info
+
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    return await get_job_or_404(job_id)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(job_id: str):
+    await get_job_or_404(job_id)
+
+    async def event_stream():
+        # server-sent events: one "status" event per change, ends when the job finishes
+        async for info in app_state["job_queue"].stream(job_id):
+            yield f"event: status\ndata: {info.model_dump_json()}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+@app.get("/ready")
+async def ready():
+    # readiness probe: 503 until the startup warm-up is done
+    if not app_state.get("ready"):
+        return JSONResponse(status_code=503, content={"ready": False})
+    return {"ready": True}
+
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape endpoint
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/")
 async def root():
     return RedirectResponse(url="/app")
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    settings = app_settings.SERVER
+    if settings.WORKERS > 1:
+        if not app_settings.SHARED_STORE.ON:
+            logger.warning("Running several workers without SHARED_STORE__ON: searches, jobs and in-flight reports are not shared")
+        if app_settings.SYNTH_AGENT.CONTEXT_MODE == "retrieval":
+            logger.warning("The vector index of CONTEXT_MODE=retrieval is not safe to share between workers")
+        # each worker process imports the app itself
+        uvicorn.run("main:app", host=settings.HOST, port=settings.PORT, workers=settings.WORKERS)
+    else:
+        uvicorn.run(app, host=settings.HOST, port=settings.PORT)
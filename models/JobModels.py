@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+
+from models.ReportModel import Report
+
+
+JobStatus = Literal["queued", "running", "done", "failed"]
+
+
+class JobSubmission(BaseModel):
+    job_id: str
+    status: JobStatus
+    queue_position: int
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    prompt: str
+    status: JobStatus
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[str] = None
+    # report as it is being written (title, abstract, finished sections)
+    partial_report: Optional[dict] = None
+    result: Optional[Report] = None
@@ -1,8 +1,9 @@
 import re
 import json
 
-from pydantic import BaseModel, Field, field_validator, AliasChoices
-from typing import List
+from pydantic import BaseModel, ConfigDict, Field, field_validator, AliasChoices
+from pydantic.json_schema import SkipJsonSchema
+from typing import List, Optional
 
 URL_PATTERN = r"^https?://"
 
@@ -12,6 +13,12 @@ class ReportSection(BaseModel):
     content: str
 
 
+class ReportSummary(BaseModel):
+    # title and abstract, written last when the sections are synthesized separately
+    title: str
+    abstract: str
+
+
 class ReferencesSection(BaseModel):
     header: str = "References"
     sources: List[str] = Field(
@@ -27,16 +34,28 @@ class ReferencesSection(BaseModel):
         return urls
 
 
+def require_references(schema: dict):
+    # references stay required in the schema the LLM gets, see Report.references
+    schema.setdefault("required", []).append("references")
+
+
 class Report(BaseModel):
+    model_config = ConfigDict(json_schema_extra=require_references)
+
     title: str
     abstract: str
     sections: List[ReportSection] = Field(
         min_length=1    # must have at least 1 section
     )
-    references: ReferencesSection = Field(
+    # None only for sectioned reports whose research has no valid url, the synthesizer
+    # agent retries reports without references
+    references: Optional[ReferencesSection] = Field(
+        default=None,
         validation_alias=AliasChoices("references", "References"),
         description="The final section of the report containing all source URLs. This field is REQUIRED"
     )
+    # id of the request that produced the report, set by the app (hidden from the LLM's schema)
+    trace_id: SkipJsonSchema[Optional[str]] = None
 
     @field_validator('sections', mode='before')
     def sections_must_be_list(cls, v):
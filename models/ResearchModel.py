@@ -1,54 +1,54 @@
-from pydantic import BaseModel, Field, model_validator
-from typing import List
+from dataclasses import dataclass, field
+from typing import Annotated, List
 
+from pydantic import Field, TypeAdapter
 
-class NormalizedSearchResult(BaseModel):
+# The research models are internal (never validated from LLM output), so they are plain
+# slotted dataclasses instead of BaseModels: one is built per crawled page and a report can
+# carry many large pages. They are serialized through the TypeAdapters below.
+
+
+@dataclass(slots=True)
+class NormalizedSearchResult:
     title: str
     url: str
 
 
-class SourceSection(BaseModel):
+@dataclass(slots=True)
+class SourceSection:
     title: str
     content: str
-    url: str
+    # kept on the object (e.g. for indexing) but left out of dumps,
+    # urls only appear at the end of the final output (StructuredResearchOutput.all_urls)
+    url: Annotated[str, Field(exclude=True)]
 
 
-class ResearchSection(BaseModel):
+@dataclass(slots=True)
+class ResearchSection:
     subquestion: str
     sources: List[SourceSection]
 
 
-class StructuredResearchOutput(BaseModel):
+@dataclass(slots=True)
+class StructuredResearchOutput:
     original_query: str
-    sections: List[ResearchSection] = Field(
-        description="A list of sections. Each secction relates to a subtopic."
-    )
-    all_urls: List[str] = Field(
-        default=[],
-        description="A list of all source URLs from all sections to be used as references"
-    )
-
-    @model_validator(mode='after')
-    def populate_all_source_urls(self) -> 'StructuredResearchOutput':
-        all_urls = set()
+    # A list of sections. Each secction relates to a subtopic.
+    sections: List[ResearchSection]
+    # A list of all source URLs from all sections to be used as references (filled in from the sections)
+    all_urls: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
         # get all the urls and put them in all_urls field
-        if self.sections:
-            for section in self.sections:
-                if section and section.sources:
-                    for source in section.sources:
-                        if source and source.url:
-                            all_urls.add(source.url)
-        
-        self.all_urls = sorted(list(all_urls))
-
-        # delete url from each source, urls only appear at the end of the final output
-        if self.sections:
-            for section in self.sections:
-                if section and section.sources:
-                    for source in section.sources:
-                        if hasattr(source, 'url'):
-                            delattr(source, 'url')
-        return self
+        self.all_urls = sorted({
+            source.url
+            for section in self.sections
+            for source in section.sources
+            if source.url
+        })
+
+
+RESEARCH_ADAPTER = TypeAdapter(StructuredResearchOutput)
+SECTIONS_ADAPTER = TypeAdapter(List[ResearchSection])
 
 
 """
@@ -61,5 +61,6 @@ sections: a list of subquestions each with:
     sources: a list of sources that answer the subquestion, each with:
         title: title of the source
         content: the content of the web page
-        url: URL of the web page
-"""
\ No newline at end of file
+        url: URL of the web page (not serialized, see all_urls)
+all_urls: every source URL, sorted
+"""
@@ -0,0 +1,10 @@
+import os
+import sys
+import tempfile
+
+# the settings need OLLAMA_HOST, and the app log goes to a temporary file instead of ./app.log
+os.environ.setdefault("OLLAMA_HOST", "localhost:11434")
+os.environ.setdefault("LOGGING__FILE", os.path.join(tempfile.gettempdir(), "report-builder-tests.log"))
+os.environ.setdefault("ARTIFACTS__ON", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
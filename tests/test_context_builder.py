@@ -0,0 +1,117 @@
+import json
+import random
+
+from config.config import SynthAgentSettings
+from models.ResearchModel import ResearchSection, SourceSection, StructuredResearchOutput
+from utils.context_builder import build_context, split_blocks, split_index_chunks
+
+WORDS = (
+    "battery grid storage solar wind power demand peak price lithium iron cell inverter plant "
+    "utility market evening charge discharge capacity megawatt hour cost cycle heat pump cold "
+    "climate winter efficiency home install air ground water policy subsidy tax region operator"
+).split()
+
+
+def page(seed: int, chars: int = 20000) -> str:
+    # crawl4ai-style markdown: one paragraph per line, no blank lines
+    rng = random.Random(seed)
+    paragraphs = []
+    length = 0
+    while length < chars:
+        sentences = [" ".join(rng.choice(WORDS) for _ in range(12)).capitalize() + "." for _ in range(4)]
+        paragraphs.append(" ".join(sentences))
+        length += len(paragraphs[-1]) + 1
+    return "\n".join(paragraphs)[:chars]
+
+
+def research(n_sections: int, n_pages: int, chars: int = 20000) -> StructuredResearchOutput:
+    return StructuredResearchOutput(
+        original_query="How do grid batteries and heat pumps work?",
+        sections=[
+            ResearchSection(
+                subquestion=f"Sub-question {s} about battery storage",
+                sources=[
+                    SourceSection(
+                        title=f"Page {s}.{p}",
+                        content=page(s * 100 + p, chars),
+                        url=f"https://example.com/{s}/{p}"
+                    )
+                    for p in range(n_pages)
+                ]
+            )
+            for s in range(n_sections)
+        ]
+    )
+
+
+def test_single_newline_markdown_is_split_into_blocks():
+    content = page(0, 5000)
+    blocks = split_blocks(content, 1000)
+
+    assert len(blocks) > 5
+    assert all(len(block) <= 1000 for block in blocks)
+    assert "\n".join(blocks) == content
+
+
+def test_headings_start_a_block_and_long_lines_are_split_at_sentence_ends():
+    long_line = " ".join(f"Sentence {i} is about grid storage." for i in range(60))
+    blocks = split_blocks(f"intro line\n# Heading\nfirst line\n{long_line}\nlast line", 300)
+
+    assert blocks[0] == "intro line"
+    assert blocks[1] == "# Heading\nfirst line"
+    assert all(len(block) <= 300 and block.endswith("storage.") for block in blocks[2:-1])
+    assert " ".join(blocks[2:-1]) == long_line
+    assert blocks[-1] == "last line"
+
+
+def seen_urls(research_output: StructuredResearchOutput, context: dict) -> list:
+    urls = {source.title: source.url for section in research_output.sections for source in section.sources}
+    return sorted(urls[source["title"]] for section in context["sections"] for source in section["sources"])
+
+
+def test_every_section_of_full_pages_gets_into_the_context():
+    settings = SynthAgentSettings()
+    research_output = research(5, 4)
+    context_json, reference_urls = build_context(research_output, settings)
+    context = json.loads(context_json)
+
+    assert len(context["sections"]) == 5
+    assert len(context_json) / settings.CHARS_PER_TOKEN <= settings.CONTEXT_TOKEN_BUDGET * 1.1
+    assert reference_urls == seen_urls(research_output, context)
+    assert context["all_urls"] == reference_urls
+
+
+def test_best_chunk_is_truncated_when_it_does_not_fit_the_share():
+    settings = SynthAgentSettings(CONTEXT_TOKEN_BUDGET=300, MAX_CHUNK_CHARS=4000)
+    research_output = research(3, 2, 4000)
+    context_json, reference_urls = build_context(research_output, settings)
+    context = json.loads(context_json)
+
+    assert len(context["sections"]) == 3
+    for section in context["sections"]:
+        assert len(section["sources"]) == 1
+        assert 0 < len(section["sources"][0]["content"]) <= 100 * settings.CHARS_PER_TOKEN
+    # pages left out of the context are not cited
+    assert len(reference_urls) == 3
+    assert reference_urls == seen_urls(research_output, context)
+
+
+def test_index_chunks_of_single_newline_markdown_respect_chunk_chars():
+    content = page(1)
+    chunks = split_index_chunks(content, chunk_chars=1200, min_chars=40, overlap=200)
+
+    assert len(chunks) >= len(content) // 1200
+    assert all(len(chunk) <= 1200 for chunk in chunks)
+    assert "\n".join(chunks) == content
+
+
+def test_long_paragraph_is_indexed_in_overlapping_windows():
+    paragraph = " ".join(f"Sentence {i} says how grid batteries store solar power." for i in range(100))
+    chunks = split_index_chunks(paragraph, chunk_chars=1200, min_chars=40, overlap=200)
+
+    assert len(chunks) > len(paragraph) // 1200
+    assert all(len(chunk) <= 1200 for chunk in chunks)
+    for previous, chunk in zip(chunks, chunks[1:]):
+        first_sentence = chunk[:chunk.index(".") + 1]
+        assert first_sentence in previous[-200:]
+    assert chunks[-1].endswith("Sentence 99 says how grid batteries store solar power.")
@@ -0,0 +1,80 @@
+import asyncio
+
+from utils.fair_limiter import FairLimiter
+
+
+async def acquire_in_order(limiter: FairLimiter, keys, order):
+    # queues one waiter per key (in the given order) behind a held slot, records who gets it
+    async def waiter(key):
+        async with limiter.slot(key):
+            order.append(key)
+            await asyncio.sleep(0)
+
+    tasks = []
+    for key in keys:
+        tasks.append(asyncio.create_task(waiter(key)))
+        await asyncio.sleep(0)  # queued in this order
+    return tasks
+
+
+def test_slots_are_handed_out_round_robin_across_keys():
+    async def run():
+        limiter = FairLimiter(1)
+        order = []
+        await limiter.acquire("holder")
+        # report "a" queues three calls before report "b" queues one
+        tasks = await acquire_in_order(limiter, ["a", "a", "a", "b", "c"], order)
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order, limiter
+
+    order, limiter = asyncio.run(run())
+    assert order == ["a", "b", "c", "a", "a"]
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+
+def test_free_slots_are_taken_without_waiting():
+    async def run():
+        limiter = FairLimiter(2)
+        await limiter.acquire("a")
+        await limiter.acquire("a")
+        return limiter.active, limiter.waiting
+
+    assert asyncio.run(run()) == (2, 0)
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    async def run():
+        limiter = FairLimiter(1)
+        order = []
+        await limiter.acquire("holder")
+        tasks = await acquire_in_order(limiter, ["a", "b"], order)
+        tasks[0].cancel()
+        await asyncio.sleep(0)
+        limiter.release()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        return order, results, limiter
+
+    order, results, limiter = asyncio.run(run())
+    assert order == ["b"]
+    assert isinstance(results[0], asyncio.CancelledError)
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_is_passed_on():
+    async def run():
+        limiter = FairLimiter(1)
+        order = []
+        await limiter.acquire("holder")
+        tasks = await acquire_in_order(limiter, ["a", "b"], order)
+        # "a" gets the slot and is cancelled before it runs
+        limiter.release()
+        tasks[0].cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return order, limiter
+
+    order, limiter = asyncio.run(run())
+    assert order == ["b"]
+    assert limiter.active == 0
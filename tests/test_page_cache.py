@@ -0,0 +1,36 @@
+import pytest
+
+from utils.page_cache import canonical_url, normalize_url
+
+
+def test_normalize_url_drops_fragment_default_port_and_trailing_slash():
+    assert normalize_url("HTTP://Example.com:80/a/b/?b=2&a=1#frag") == "http://example.com/a/b?a=1&b=2"
+    assert normalize_url("https://example.com:443") == "https://example.com/"
+
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/article",
+    "http://example.com/article",
+    "https://www.example.com/article/",
+    "https://m.example.com/article",
+    "https://mobile.example.com/article",
+    "https://amp.example.com/article",
+    "https://example.com/article/amp",
+    "https://example.com/article.amp",
+    "https://example.com/article?utm_source=feed&utm_medium=rss",
+    "https://example.com/article?fbclid=abc&gclid=def&ref=home",
+    "https://example.com/article?_hsenc=x&pk_campaign=y#comments",
+])
+def test_canonical_url_maps_variants_of_a_page_to_one_key(url):
+    assert canonical_url(url) == "https://example.com/article"
+
+
+def test_canonical_url_keeps_params_that_select_content():
+    assert canonical_url("https://example.com/search?q=amp&page=2&utm_source=x") == "https://example.com/search?page=2&q=amp"
+    assert canonical_url("https://example.com/?id=5&gclid=2") == "https://example.com/?id=5"
+
+
+def test_canonical_url_keeps_hosts_that_only_look_like_prefixes():
+    # "m." / "www." are only stripped from hosts that have a domain left after them
+    assert canonical_url("https://m.com/page") == "https://m.com/page"
+    assert canonical_url("https://mail.example.com/page") == "https://mail.example.com/page"
@@ -0,0 +1,179 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import pytest
+
+from config.config import app_settings
+from models.QueryModels import SubQuery
+from models.ResearchModel import NormalizedSearchResult
+from tools.ResearchPipeline import ResearchPipeline
+from tools.WebSearchTool import WebSearchTool
+
+
+class FakeTool:
+    # search results per sub-prompt, page contents and crawl delays per url
+    def __init__(
+        self,
+        results: Dict[str, List[str]],
+        delays: Optional[Dict[str, float]] = None,
+        contents: Optional[Dict[str, str]] = None
+    ):
+        self.results = results
+        self.delays = delays or {}
+        self.contents = contents or {}
+        self.fetched: List[str] = []
+        self.cancelled: List[str] = []
+
+    async def search(self, query: SubQuery) -> List[NormalizedSearchResult]:
+        return [NormalizedSearchResult(title=url, url=url) for url in self.results[query.sub_prompt]]
+
+    async def fetch_page(self, result: NormalizedSearchResult):
+        self.fetched.append(result.url)
+        try:
+            await asyncio.sleep(self.delays.get(result.url, 0))
+        except asyncio.CancelledError:
+            self.cancelled.append(result.url)
+            raise
+        # cached content is already cleaned, so the clean stage is skipped
+        return self.contents.get(result.url, f"content of {result.url}"), True
+
+    build_section = WebSearchTool.build_section
+
+
+@pytest.fixture(autouse=True)
+def plain_pipeline(monkeypatch):
+    # no hedging or near-duplicate detection unless a test turns it on
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "HEDGE_ON", False)
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "NEAR_DUPLICATE_ON", False)
+
+
+async def research(tool: FakeTool, sub_prompts: List[str], on_section=None):
+    async with ResearchPipeline(tool, on_section) as pipeline:
+        for sub_prompt in sub_prompts:
+            await pipeline.submit(SubQuery(sub_prompt=sub_prompt))
+        return await pipeline.finish()
+
+
+def urls(section) -> List[str]:
+    return [source.url for source in section.sources]
+
+
+def test_sections_come_back_in_submission_order():
+    tool = FakeTool(
+        {"slow": ["https://a.com/1", "https://a.com/2"], "fast": ["https://b.com/1"]},
+        delays={"https://a.com/1": 0.05, "https://a.com/2": 0.05}
+    )
+    finished = []
+    sections = asyncio.run(research(tool, ["slow", "fast"], finished.append))
+
+    assert [urls(section) for section in sections] == [["https://a.com/1", "https://a.com/2"], ["https://b.com/1"]]
+    # on_section gets each section as soon as it is done
+    assert [urls(section) for section in finished] == [["https://b.com/1"], ["https://a.com/1", "https://a.com/2"]]
+
+
+def test_sub_question_without_results_or_content_is_left_out():
+    tool = FakeTool(
+        {"empty": [], "blank": ["https://a.com/blank"], "ok": ["https://a.com/ok"]},
+        contents={"https://a.com/blank": None}
+    )
+    sections = asyncio.run(research(tool, ["empty", "blank", "ok"]))
+
+    assert [urls(section) for section in sections] == [["https://a.com/ok"]]
+
+
+def test_leaving_the_pipeline_cancels_running_crawls():
+    tool = FakeTool({"slow": ["https://a.com/slow"]}, delays={"https://a.com/slow": 10})
+
+    async def run():
+        async with ResearchPipeline(tool) as pipeline:
+            await pipeline.submit(SubQuery(sub_prompt="slow"))
+            await asyncio.sleep(0.05)
+        return pipeline
+
+    pipeline = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert tool.cancelled == ["https://a.com/slow"]
+    assert all(worker.done() for worker in pipeline.workers)
+
+
+def test_page_found_by_several_sub_questions_is_crawled_once():
+    tool = FakeTool({
+        "one": ["https://a.com/shared", "https://a.com/1"],
+        "two": ["https://www.a.com/shared/?utm_source=feed", "https://a.com/2"],
+    })
+    sections = asyncio.run(research(tool, ["one", "two"]))
+
+    assert sorted(tool.fetched) == ["https://a.com/1", "https://a.com/2", "https://a.com/shared"]
+    assert sections[0].sources[0] is sections[1].sources[0]
+
+
+def test_syndicated_copy_is_replaced_by_the_page_it_copies(monkeypatch):
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "NEAR_DUPLICATE_ON", True)
+    article = " ".join(f"paragraph {i} on how heat pumps move heat out of cold outdoor air" for i in range(20))
+    tool = FakeTool(
+        {"one": ["https://news.com/heat-pumps"], "two": ["https://copy.com/heat-pumps", "https://other.com/x"]},
+        delays={"https://copy.com/heat-pumps": 0.05},
+        contents={
+            "https://news.com/heat-pumps": article,
+            "https://copy.com/heat-pumps": article + " Republished with permission.",
+        }
+    )
+    sections = asyncio.run(research(tool, ["one", "two"]))
+
+    assert urls(sections[0]) == ["https://news.com/heat-pumps"]
+    assert urls(sections[1]) == ["https://news.com/heat-pumps", "https://other.com/x"]
+    assert sections[1].sources[0] is sections[0].sources[0]
+
+
+def test_copy_of_a_page_the_sub_question_already_has_is_dropped(monkeypatch):
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "NEAR_DUPLICATE_ON", True)
+    article = " ".join(f"paragraph {i} on how heat pumps move heat out of cold outdoor air" for i in range(20))
+    tool = FakeTool(
+        {"one": ["https://news.com/heat-pumps", "https://copy.com/heat-pumps"]},
+        delays={"https://copy.com/heat-pumps": 0.05},
+        contents={"https://news.com/heat-pumps": article, "https://copy.com/heat-pumps": article}
+    )
+    sections = asyncio.run(research(tool, ["one"]))
+
+    assert urls(sections[0]) == ["https://news.com/heat-pumps"]
+
+
+@pytest.fixture
+def hedged(monkeypatch):
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "HEDGE_ON", True)
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "NUM_SEARCH_RESULTS", 2)
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "HEDGE_DEADLINE", 0)
+
+
+def test_hedged_sub_question_cancels_its_straggler(hedged):
+    tool = FakeTool(
+        {"one": ["https://a.com/slow", "https://a.com/1", "https://a.com/2"]},
+        delays={"https://a.com/slow": 10}
+    )
+    sections = asyncio.run(asyncio.wait_for(research(tool, ["one"]), timeout=5))
+
+    assert urls(sections[0]) == ["https://a.com/1", "https://a.com/2"]
+    assert tool.cancelled == ["https://a.com/slow"]
+
+
+def test_hedging_deadline_goes_ahead_with_the_pages_it_has(hedged, monkeypatch):
+    monkeypatch.setattr(app_settings.WEB_SEARCH_TOOL, "HEDGE_DEADLINE", 0.1)
+    tool = FakeTool(
+        {"one": ["https://a.com/1", "https://a.com/slow", "https://a.com/slower"]},
+        delays={"https://a.com/slow": 10, "https://a.com/slower": 10}
+    )
+    sections = asyncio.run(asyncio.wait_for(research(tool, ["one"]), timeout=5))
+
+    assert urls(sections[0]) == ["https://a.com/1"]
+    assert sorted(tool.cancelled) == ["https://a.com/slow", "https://a.com/slower"]
+
+
+def test_straggler_another_sub_question_waits_for_is_not_cancelled(hedged):
+    tool = FakeTool(
+        {"one": ["https://a.com/1", "https://a.com/2", "https://a.com/shared"], "two": ["https://a.com/shared"]},
+        delays={"https://a.com/shared": 0.1}
+    )
+    sections = asyncio.run(asyncio.wait_for(research(tool, ["one", "two"]), timeout=5))
+
+    assert urls(sections[0]) == ["https://a.com/1", "https://a.com/2"]
+    assert urls(sections[1]) == ["https://a.com/shared"]
+    assert tool.cancelled == []
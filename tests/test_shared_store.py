@@ -0,0 +1,152 @@
+import asyncio
+import os
+
+import pytest
+
+from config.config import app_settings
+from models.ReportModel import ReferencesSection, Report, ReportSection
+from models.QueryModels import UserQuery
+from utils.shared_store import SqliteSharedStore, run_once
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SqliteSharedStore(str(tmp_path / "shared.sqlite3"))
+    yield store
+    store.close()
+
+
+def test_values_are_namespaced_and_expire(store):
+    store.put("search", "k", "results", ttl=60)
+    store.put("report", "old", "report", ttl=-1)
+
+    assert store.get("search", "k") == "results"
+    assert store.get("report", "k") is None
+    assert store.get("report", "old") is None
+
+
+def test_lease_is_held_by_one_owner_until_released_or_expired(store):
+    assert store.claim("report:k", "a", lease=60)
+    assert store.claim("report:k", "a", lease=60)
+    assert not store.claim("report:k", "b", lease=60)
+    assert not store.renew("report:k", "b", lease=60)
+    assert store.renew("report:k", "a", lease=60)
+
+    store.release("report:k", "b")
+    assert not store.claim("report:k", "b", lease=60)
+    store.release("report:k", "a")
+    assert store.claim("report:k", "b", lease=-1)
+    # an expired lease is free for anyone
+    assert store.claim("report:k", "c", lease=60)
+
+
+def test_identical_calls_in_two_workers_are_produced_once(tmp_path):
+    calls = []
+
+    async def produce() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "report"
+
+    async def run():
+        # one store per worker, on the same database
+        workers = [SqliteSharedStore(str(tmp_path / "shared.sqlite3")) for _ in range(2)]
+        try:
+            return await asyncio.gather(*(
+                run_once(worker, "report", "k", produce, lease=60, poll_interval=0.01, result_ttl=60)
+                for worker in workers
+            ))
+        finally:
+            for worker in workers:
+                worker.close()
+
+    results = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert sorted(results) == [("report", False), ("report", True)]
+    assert len(calls) == 1
+
+
+def test_waiting_call_takes_over_when_the_producer_fails(store):
+    async def fail() -> str:
+        await asyncio.sleep(0.05)
+        raise RuntimeError("model unavailable")
+
+    async def succeed() -> str:
+        return "report"
+
+    async def run():
+        first = asyncio.create_task(run_once(store, "report", "k", fail, lease=60, poll_interval=0.01, result_ttl=60))
+        await asyncio.sleep(0.01)
+        second = run_once(store, "report", "k", succeed, lease=60, poll_interval=0.01, result_ttl=60)
+        return await asyncio.gather(first, second, return_exceptions=True)
+
+    first, second = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert isinstance(first, RuntimeError)
+    assert second == ("report", False)
+
+
+class LosingStore(SqliteSharedStore):
+    # another worker takes the lease (and then stores its result) at the first renewal
+    def renew(self, key: str, owner: str, lease: float) -> bool:
+        self.release(key, owner)
+        self.claim(key, "other-worker", lease)
+        self.put("report", "k", "other report", ttl=60)
+        return False
+
+
+def test_lost_lease_stops_production_and_returns_the_new_holders_result(tmp_path):
+    cancelled = []
+
+    async def produce() -> str:
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+        return "report"
+
+    async def run():
+        store = LosingStore(str(tmp_path / "shared.sqlite3"))
+        try:
+            return await run_once(store, "report", "k", produce, lease=0.15, poll_interval=0.01, result_ttl=60)
+        finally:
+            store.close()
+
+    assert asyncio.run(asyncio.wait_for(run(), timeout=5)) == ("other report", True)
+    assert cancelled == [1]
+
+
+def test_identical_prompts_share_one_report(store, monkeypatch):
+    # main mounts ./static when imported
+    monkeypatch.chdir(REPO_ROOT)
+    import main
+
+    calls = []
+
+    async def fake_pipeline(query: UserQuery, on_partial=None) -> Report:
+        calls.append(query.prompt)
+        await asyncio.sleep(0.1)
+        return Report(
+            title="Grid batteries",
+            abstract="How grid batteries work.",
+            sections=[ReportSection(header="Storage", content="Batteries store solar power.")],
+            references=ReferencesSection(sources=["https://example.com/batteries"])
+        )
+
+    monkeypatch.setattr(main, "run_report_pipeline", fake_pipeline)
+    monkeypatch.setattr(main, "app_state", {"shared_store": store, "first_report_done": True})
+    monkeypatch.setattr(app_settings.SHARED_STORE, "POLL_INTERVAL", 0.01)
+
+    async def run():
+        return await asyncio.gather(
+            main.generate_report(UserQuery(prompt="How do grid batteries work?")),
+            main.generate_report(UserQuery(prompt="  how do GRID batteries   work? "))
+        )
+
+    first, second = asyncio.run(asyncio.wait_for(run(), timeout=5))
+    assert len(calls) == 1
+    assert first.model_dump(exclude={"trace_id"}) == second.model_dump(exclude={"trace_id"})
+    # each request sets its own trace id on the shared report
+    assert first.trace_id and second.trace_id
+    assert first.trace_id != second.trace_id
@@ -0,0 +1,34 @@
+from utils.simhash import SimHashIndex, hamming_distance, simhash
+
+ARTICLE = " ".join(
+    f"paragraph {i} of the article explains how grid scale batteries store solar power for the evening peak"
+    for i in range(20)
+)
+
+
+def test_simhash_is_stable_and_needs_a_few_words():
+    assert simhash(ARTICLE) == simhash(ARTICLE)
+    assert simhash("too short") is None
+
+
+def test_small_edits_stay_close_and_other_texts_do_not():
+    edited = ARTICLE.replace("paragraph 3 of", "section 3 of") + " Copyright 2024 Example News."
+    other = " ".join(f"recipe step {i} says to fold the egg whites into the batter gently" for i in range(30))
+
+    assert hamming_distance(simhash(ARTICLE), simhash(edited)) <= 3
+    assert hamming_distance(simhash(ARTICLE), simhash(other)) > 3
+
+
+def test_index_returns_the_first_item_for_near_duplicates():
+    index = SimHashIndex(max_distance=3)
+    assert index.find_or_add(ARTICLE, "original") is None
+    assert index.find_or_add(ARTICLE + " Shared from Example News.", "copy") == "original"
+    assert len(index.entries) == 1
+
+
+def test_index_ignores_short_texts():
+    index = SimHashIndex(max_distance=3, min_terms=50)
+    short = "a short blurb that appears on many pages of the same site"
+    assert index.find_or_add(short, "first") is None
+    assert index.find_or_add(short, "second") is None
+    assert index.entries == []
@@ -0,0 +1,43 @@
+from utils.text_normalizer import cap_length, normalize_page
+
+# crawl4ai's fit_markdown separates paragraphs with a single newline
+PARAGRAPHS = [
+    f"Paragraph {i} explains how grid scale batteries store solar power. It ends with a full stop."
+    for i in range(10)
+]
+PAGE = "\n".join(PARAGRAPHS)
+
+
+def test_cap_length_cuts_single_newline_markdown_at_a_line_break():
+    capped = cap_length(PAGE, 400)
+
+    assert len(capped) <= 400
+    assert capped == "\n".join(PARAGRAPHS[:len(capped.split("\n"))])
+
+
+def test_cap_length_cuts_a_long_line_at_a_sentence_end():
+    text = " ".join(PARAGRAPHS)
+    capped = cap_length(text, 300)
+
+    assert len(capped) <= 300
+    assert capped.endswith("full stop.")
+    assert text.startswith(capped)
+
+
+def test_cap_length_cuts_text_without_sentences_at_a_space():
+    text = "word " * 100
+    capped = cap_length(text, 102)
+
+    assert capped == ("word " * 20).strip()
+    assert cap_length("x" * 100, 50) == "x" * 50
+    assert cap_length(PAGE, 0) == PAGE
+
+
+def test_normalize_page_caps_single_newline_markdown_at_a_line_break():
+    markdown = "\n".join(["Skip to content", "[Home](/) | [Blog](/blog)"] + PARAGRAPHS + ["© 2024 Example News"])
+    normalized = normalize_page(markdown, 500)
+
+    assert len(normalized) <= 500
+    lines = normalized.split("\n")
+    assert lines[0] == "Home | Blog"
+    assert lines[1:] == PARAGRAPHS[:len(lines) - 1]
@@ -0,0 +1,303 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tools.WebSearchTool import WebSearchTool
+from models.ResearchModel import NormalizedSearchResult, ResearchSection, SourceSection
+from models.QueryModels import SubQuery
+from utils.logger import tool_logger
+from utils.metrics import CRAWLS, stage_timer
+from utils.page_cache import canonical_url
+from utils.simhash import SimHashIndex
+from config.config import app_settings
+
+
+@dataclass
+class QueryState:
+    # one submitted sub-question: its search results fill `sources` (in search order)
+    # it is done once every page is, or (hedged) once `needed` pages have content
+    index: int
+    query: SubQuery
+    pending: int = 0
+    needed: int = 0
+    usable: int = 0
+    sources: List[Optional[SourceSection]] = field(default_factory=list)
+    entries: List["PageEntry"] = field(default_factory=list)
+    deadline: Optional[asyncio.TimerHandle] = None
+    done: bool = False
+    section: Optional[ResearchSection] = None
+
+
+@dataclass
+class PageEntry:
+    # one page of the report (by canonical url), crawled once and shared by every
+    # sub-question that found it: `subscribers` are (sub-question, position in its sources)
+    key: str
+    result: NormalizedSearchResult
+    subscribers: List[Tuple[QueryState, int]] = field(default_factory=list)
+    content: Optional[str] = None
+    cleaned: bool = False
+    done: bool = False
+    source: Optional[SourceSection] = None
+    # the running fetch, and whether it was cancelled because no sub-question needs it anymore
+    task: Optional[asyncio.Task] = None
+    cancelled: bool = False
+
+
+class ResearchPipeline:
+    """
+    Search -> crawl -> clean for one report, as concurrent stages joined by bounded queues.
+    - submit() queues a sub-question and returns right away, so the agent's tool calls don't
+      wait on the web
+    - each page of a sub-question is crawled as soon as its search returns, while other
+      sub-questions are still being searched
+    - urls are canonicalized across the whole report, so a page found by several sub-questions
+      is crawled once and shared, and syndicated copies (near-duplicate content under another
+      url, by SimHash) are replaced by the page they copy
+    - each ResearchSection is passed to `on_section` as soon as all of its pages are done
+    - with HEDGE_ON, a sub-question is done as soon as NUM_SEARCH_RESULTS of its (over-fetched)
+      pages have content or at HEDGE_DEADLINE, and crawls no other sub-question waits for are cancelled
+
+    async with ResearchPipeline(tool, on_section) as pipeline:
+        await pipeline.submit(query)
+        sections = await pipeline.finish()
+    """
+
+    def __init__(self, tool: WebSearchTool, on_section: Optional[Callable[[ResearchSection], None]] = None):
+        self.tool = tool
+        self.on_section = on_section
+
+        queue_size = app_settings.WEB_SEARCH_TOOL.PIPELINE_QUEUE_SIZE
+        self.search_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.crawl_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.clean_queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+
+        self.states: List[QueryState] = []
+        self.pages: Dict[str, PageEntry] = {}
+        self.workers: List[asyncio.Task] = []
+
+        self.near_duplicates: Optional[SimHashIndex[SourceSection]] = None
+        if app_settings.WEB_SEARCH_TOOL.NEAR_DUPLICATE_ON:
+            self.near_duplicates = SimHashIndex(app_settings.WEB_SEARCH_TOOL.NEAR_DUPLICATE_DISTANCE)
+
+
+    async def __aenter__(self) -> "ResearchPipeline":
+        settings = app_settings.WEB_SEARCH_TOOL
+        self.workers = [
+            *(asyncio.create_task(self.search_worker()) for _ in range(settings.SEARCH_WORKERS)),
+            *(asyncio.create_task(self.crawl_worker()) for _ in range(settings.MAX_CONCURRENT_CRAWLS)),
+            asyncio.create_task(self.clean_worker())
+        ]
+        return self
+
+
+    async def __aexit__(self, *exc):
+        for state in self.states:
+            if state.deadline:
+                state.deadline.cancel()
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+
+
+    async def submit(self, query: SubQuery):
+        state = QueryState(index=len(self.states), query=query)
+        self.states.append(state)
+        await self.search_queue.put(state)
+
+
+    async def finish(self) -> List[ResearchSection]:
+        # waits for every submitted sub-question, sections come back in submission order
+        # each stage marks an item done only after handing it on, so joining in order drains everything
+        await self.search_queue.join()
+        await self.crawl_queue.join()
+        await self.clean_queue.join()
+        return [state.section for state in self.states if state.section is not None]
+
+
+    def deliver(self, state: QueryState, position: int, source: Optional[SourceSection]):
+        if state.done:
+            return
+        # a sub-question only gets a (shared) source once
+        if source is not None and any(other is source for other in state.sources):
+            source = None
+        state.sources[position] = source
+        state.pending -= 1
+        if source is not None:
+            state.usable += 1
+        if state.pending == 0 or state.usable >= state.needed:
+            self.complete(state)
+
+
+    def expire(self, state: QueryState):
+        # hedging deadline: the sub-question goes ahead with the pages it has
+        if state.done:
+            return
+        late = sum(1 for entry in state.entries if not entry.done)
+        CRAWLS.labels(outcome="late").inc(late)
+        tool_logger.warning(
+            f"Hedging deadline hit for subprompt {state.query.sub_prompt}: "
+            f"{state.usable}/{state.needed} pages, {late} still crawling"
+        )
+        self.complete(state)
+
+
+    def release(self, state: QueryState):
+        # the sub-question is done: it stops waiting on its unfinished pages, and the crawls
+        # no other sub-question waits for are cancelled
+        cancelled = 0
+        for entry in state.entries:
+            if entry.done:
+                continue
+            entry.subscribers = [(other, position) for other, position in entry.subscribers if other is not state]
+            if not entry.subscribers and self.cancel(entry):
+                cancelled += 1
+        if cancelled:
+            CRAWLS.labels(outcome="cancelled").inc(cancelled)
+            tool_logger.info(f"Cancelled {cancelled} straggler crawls for subprompt {state.query.sub_prompt}")
+
+
+    def cancel(self, entry: PageEntry) -> bool:
+        # pages already fetched (being cleaned) are kept, they are cheap to finish and can be shared
+        if entry.task is not None and entry.task.done():
+            return False
+        entry.cancelled = True
+        if self.pages.get(entry.key) is entry:
+            del self.pages[entry.key]  # a later sub-question crawls it again
+        if entry.task is not None:
+            entry.task.cancel()
+        return True
+
+
+    def page_finished(self, entry: PageEntry, source: Optional[SourceSection]):
+        if source is not None and self.near_duplicates is not None:
+            original = self.near_duplicates.find_or_add(source.content, source)
+            if original is not None:
+                CRAWLS.labels(outcome="near_duplicate").inc()
+                tool_logger.info(f"{source.url} is a near-duplicate of {original.url}, using the original")
+                source = original
+
+        entry.done = True
+        entry.source = source
+        for state, position in entry.subscribers:
+            self.deliver(state, position, source)
+
+
+    def subscribe(self, state: QueryState, results: List[NormalizedSearchResult]) -> List[PageEntry]:
+        # maps the sub-question's results to the report's pages, returns the pages to crawl
+        new_pages = []
+        finished = []
+        for result in results:
+            key = canonical_url(result.url)
+            entry = self.pages.get(key)
+            if entry is None:
+                entry = self.pages[key] = PageEntry(key=key, result=result)
+                new_pages.append(entry)
+            elif any(other is state for other, _ in entry.subscribers):
+                continue  # same page twice in one search
+            else:
+                CRAWLS.labels(outcome="shared").inc()
+                if entry.done:
+                    finished.append(entry)
+
+            entry.subscribers.append((state, len(state.sources)))
+            state.sources.append(None)
+            state.entries.append(entry)
+
+        state.pending = len(state.sources)
+        state.needed = state.pending
+        settings = app_settings.WEB_SEARCH_TOOL
+        if settings.HEDGE_ON:
+            state.needed = min(state.pending, settings.NUM_SEARCH_RESULTS)
+            if settings.HEDGE_DEADLINE > 0:
+                state.deadline = asyncio.get_running_loop().call_later(settings.HEDGE_DEADLINE, self.expire, state)
+        # pages another sub-question already crawled
+        for entry in finished:
+            position = next(position for other, position in entry.subscribers if other is state)
+            self.deliver(state, position, entry.source)
+        return new_pages
+
+
+    def complete(self, state: QueryState):
+        if state.done:
+            return
+        state.done = True
+        if state.deadline:
+            state.deadline.cancel()
+        self.release(state)
+
+        state.section = self.tool.build_section(
+            state.query,
+            [source for source in state.sources if source is not None]
+        )
+        if state.section is not None and self.on_section:
+            try:
+                self.on_section(state.section)
+            except Exception as e:
+                tool_logger.error(f"Section callback failed for subprompt {state.query.sub_prompt}: {e}")
+
+
+    async def search_worker(self):
+        while True:
+            state: QueryState = await self.search_queue.get()
+            try:
+                async with stage_timer("web_search", sub_prompt=state.query.sub_prompt):
+                    results = await self.tool.search(state.query)
+            except Exception as e:
+                tool_logger.warning(f"Search failed for subquery: {state.query.sub_prompt} - {e}")
+                results = None
+
+            try:
+                if not results:
+                    self.complete(state)
+                    continue
+
+                for entry in self.subscribe(state, results):
+                    if not entry.cancelled:
+                        await self.crawl_queue.put(entry)
+            finally:
+                self.search_queue.task_done()
+
+
+    async def crawl_worker(self):
+        while True:
+            entry: PageEntry = await self.crawl_queue.get()
+            try:
+                if entry.cancelled:
+                    continue
+                entry.task = asyncio.create_task(self.tool.fetch_page(entry.result))
+                try:
+                    await asyncio.wait([entry.task])
+                except asyncio.CancelledError:
+                    entry.task.cancel()
+                    raise
+                if entry.task.cancelled():
+                    continue
+
+                entry.content, entry.cleaned = entry.task.result()
+                if entry.content is None:
+                    self.page_finished(entry, None)
+                elif entry.cleaned:
+                    self.page_finished(entry, SourceSection(
+                        title=entry.result.title,
+                        content=entry.content,
+                        url=entry.result.url
+                    ))
+                else:
+                    await self.clean_queue.put(entry)
+            finally:
+                self.crawl_queue.task_done()
+
+
+    async def clean_worker(self):
+        while True:
+            entry: PageEntry = await self.clean_queue.get()
+            source = None
+            try:
+                source = await self.tool.clean_page(entry.result, entry.content)
+            except Exception as e:
+                tool_logger.error(f"Failed to clean {entry.result.url}: {e}. Skipping source.")
+            finally:
+                entry.content = None  # the source holds the cleaned text
+                self.page_finished(entry, source)
+                self.clean_queue.task_done()
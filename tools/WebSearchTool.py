@@ -1,24 +1,74 @@
-import re
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
 from pydantic import BaseModel
-from duckduckgo_search import DDGS
-from googlesearch import search
-from typing import List
+from typing import TYPE_CHECKING, List, Optional, Tuple
 
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
-from crawl4ai.content_filter_strategy import PruningContentFilter
-from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+# crawl4ai and the search clients are slow to import, they are imported on first use
+# (the search clients on the search threads, crawl4ai in a thread too)
+if TYPE_CHECKING:
+    from crawl4ai import CrawlerRunConfig
 
 from utils.logger import tool_logger
+from utils.lazy_crawler import LazyCrawler
+from utils.page_cache import PageCache
+from utils.http_fetcher import HttpFetcher
+from utils.crawl_scheduler import crawl_scheduler
+from utils.search_cache import SearchCache
+from utils.shared_store import SharedStore
+from utils.text_normalizer import normalize_page
+from utils.metrics import CRAWLS, stage_timer
 from models.ResearchModel import SourceSection, ResearchSection, NormalizedSearchResult
 from models.QueryModels import SubQuery
 from config.config import app_settings
 
 
-
 class WebSearchTool:
 
+    def __init__(
+        self,
+        crawler: LazyCrawler,
+        http_fetcher: Optional[HttpFetcher] = None,
+        shared_store: Optional[SharedStore] = None
+    ):
+        # one long-lived crawler (closed by the app lifespan) shared by every crawl
+        self.crawler = crawler
+        # optional HTTP fast path tried before the browser (also owned by the lifespan)
+        self.http_fetcher = http_fetcher
+        self.crawler_config: Optional["CrawlerRunConfig"] = None
+        # per-domain rate limits and the browser page budget are shared by every tool (crawl_scheduler)
+
+        self.page_cache = None
+        if app_settings.WEB_SEARCH_TOOL.PAGE_CACHE_ON:
+            self.page_cache = PageCache(
+                path=app_settings.WEB_SEARCH_TOOL.PAGE_CACHE_PATH,
+                ttl=app_settings.WEB_SEARCH_TOOL.PAGE_CACHE_TTL,
+                max_bytes=app_settings.WEB_SEARCH_TOOL.PAGE_CACHE_MAX_MB * 1024 * 1024
+            )
+
+        # bounded pool for the blocking search clients
+        self.search_executor = ThreadPoolExecutor(
+            max_workers=app_settings.WEB_SEARCH_TOOL.SEARCH_WORKERS,
+            thread_name_prefix="web-search"
+        )
+
+        self.search_cache = None
+        if app_settings.WEB_SEARCH_TOOL.SEARCH_CACHE_ON:
+            self.search_cache = SearchCache(
+                ttl=app_settings.WEB_SEARCH_TOOL.SEARCH_CACHE_TTL,
+                max_entries=app_settings.WEB_SEARCH_TOOL.SEARCH_CACHE_MAX_ENTRIES,
+                # searches made by the other worker processes (SHARED_STORE__ON)
+                store=shared_store
+            )
+
+    def num_search_results(self) -> int:
+        # hedged crawling searches a few spare results, in case some pages are slow or empty
+        settings = app_settings.WEB_SEARCH_TOOL
+        return settings.NUM_SEARCH_RESULTS + (settings.HEDGE_EXTRA_RESULTS if settings.HEDGE_ON else 0)
+
     def filter_results(self, norm_results: List[NormalizedSearchResult]) -> List:
         # Filters out searched results based on the blacklist in config.py
         # Will not be used if there are NOT more than 3 results
@@ -35,19 +85,19 @@ class WebSearchTool:
             return norm_results
 
 
-    def print_search_results(self, final_results: List[NormalizedSearchResult]):
-        print(f"    Search results:")
-        for result in final_results:
-            print(f"    Title: {result.title}\n    URL: {result.url}\n")
+    def log_search_results(self, final_results: List[NormalizedSearchResult]):
+        results = "".join(f"\n    Title: {result.title}\n    URL: {result.url}" for result in final_results)
+        tool_logger.info(f"Search results:{results}")
 
 
     def ddg_browser(self, query: SubQuery) -> List[NormalizedSearchResult]:
         # rate limited
         tool_logger.info("Using DuckDuckGo search")
+        from duckduckgo_search import DDGS
         try:
             ddg_search_results = DDGS().text(
                 f"{query.sub_prompt}",
-                max_results=app_settings.WEB_SEARCH_TOOL.NUM_SEARCH_RESULTS
+                max_results=self.num_search_results()
                 )
             
             norm_results = [
@@ -57,7 +107,7 @@ class WebSearchTool:
             
             final_results = self.filter_results(norm_results)
             
-            print(final_results)
+            self.log_search_results(final_results)
 
             return final_results
         except Exception as e:
@@ -67,11 +117,12 @@ class WebSearchTool:
 
     def google_browser(self, query: SubQuery) -> List[NormalizedSearchResult]:
         tool_logger.info("Using Google search")
-        
+        from googlesearch import search
+
         try:
             google_search_results = list(search(
                 f"{query.sub_prompt}",
-                num_results=app_settings.WEB_SEARCH_TOOL.NUM_SEARCH_RESULTS,
+                num_results=self.num_search_results(),
                 sleep_interval=3,
                 advanced=True
                 ))
@@ -83,7 +134,7 @@ class WebSearchTool:
             
             final_results = self.filter_results(norm_results)
             
-            print(final_results)
+            self.log_search_results(final_results)
 
             return final_results
         except Exception as e:
@@ -91,8 +142,12 @@ class WebSearchTool:
             raise
 
 
-    async def crawl_sites(self, norm_list_results: List[NormalizedSearchResult], query: SubQuery):
+    def build_crawler_config(self) -> "CrawlerRunConfig":
         # CONFIG FOR CRAWLER
+        from crawl4ai import CrawlerRunConfig
+        from crawl4ai.content_filter_strategy import PruningContentFilter
+        from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+
         # pruning filter
         prune_filter = PruningContentFilter(
             # Lower → more content retained, higher → more content pruned
@@ -105,52 +160,88 @@ class WebSearchTool:
         md_generator = DefaultMarkdownGenerator(content_filter=prune_filter)
 
         # give it to the config
-        config = CrawlerRunConfig(
-            markdown_generator=md_generator
+        return CrawlerRunConfig(
+            markdown_generator=md_generator,
+            # crawl4ai expects milliseconds
+            page_timeout=int(app_settings.WEB_SEARCH_TOOL.CRAWL_TIMEOUT * 1000)
         )
 
-        # RUN CRAWLER
-        # run crawler for each result
-        cleaned_results = []
-
-        for result in norm_list_results:    
-            try:
-                title = result.title
-                url = result.url
-                
-                async with AsyncWebCrawler() as crawler:
-                    crawl_result = await crawler.arun(
-                        url=f"{url}",
-                        config=config
+
+    async def get_crawler_config(self) -> "CrawlerRunConfig":
+        # built on first use, in a thread since it imports crawl4ai
+        if self.crawler_config is None:
+            self.crawler_config = await asyncio.to_thread(self.build_crawler_config)
+        return self.crawler_config
+
+
+    async def fetch_page(self, result: NormalizedSearchResult) -> Tuple[Optional[str], bool]:
+        # fetches a single result over HTTP, or crawls it on the shared crawler (bounded by the page budget)
+        # returns (content, cleaned), cached content is already cleaned
+        url = result.url
+
+        try:
+            # cache hits skip the browser entirely
+            if self.page_cache:
+                cached_content = await self.page_cache.get(url)
+                if cached_content is not None:
+                    CRAWLS.labels(outcome="cache_hit").inc()
+                    return cached_content, True
+
+            # static pages don't need the browser
+            if self.http_fetcher and self.http_fetcher.tier(url) != "browser":
+                await crawl_scheduler.wait_for_url(url)
+                async with stage_timer("fetch_http", url=url):
+                    content = await self.http_fetcher.fetch(url, await self.get_crawler_config())
+                if content is not None:
+                    CRAWLS.labels(outcome="ok_http").inc()
+                    return content, False
+
+            async with crawl_scheduler.browser_page(url):
+                async with stage_timer("crawl_page", url=url):
+                    crawl_result = await asyncio.wait_for(
+                        self.crawler.arun(url=f"{url}", config=await self.get_crawler_config()),
+                        timeout=app_settings.WEB_SEARCH_TOOL.CRAWL_TIMEOUT
                     )
-                
-                tool_logger.info(f"Crawled {result.url}")
 
-                if not (crawl_result and crawl_result.markdown and crawl_result.markdown.fit_markdown):
-                    tool_logger.warning(f"Crawl for {url} resulted in empty content. Skipping.")
-                    continue
+            tool_logger.info(f"Crawled {url}")
 
-                page_markdown = crawl_result.markdown.fit_markdown
+            if not (crawl_result and crawl_result.markdown and crawl_result.markdown.fit_markdown):
+                CRAWLS.labels(outcome="empty").inc()
+                tool_logger.warning(f"Crawl for {url} resulted in empty content. Skipping.")
+                return None, False
 
-                # clean out all the links within a source's content
-                content = re.sub(r'\[([^\]]+)\]\((https?://[^\)]+)\)', r'\1', page_markdown)
+            CRAWLS.labels(outcome="ok").inc()
+            return crawl_result.markdown.fit_markdown, False
 
-                source = SourceSection(
-                    title=title,
-                    content=content,
-                    url=url
-                )
+        except asyncio.TimeoutError:
+            CRAWLS.labels(outcome="timeout").inc()
+            tool_logger.error(f"Crawl for {url} timed out after {app_settings.WEB_SEARCH_TOOL.CRAWL_TIMEOUT}s. Skipping source.")
+            return None, False
+        except Exception as e:
+            CRAWLS.labels(outcome="error").inc()
+            tool_logger.error(f"Failed to crawl or process {url}: {e}. Skipping source.")
+            return None, False
+
+
+    async def clean_page(self, result: NormalizedSearchResult, page_markdown: str) -> SourceSection:
+        # clean out links, boilerplate and extra whitespace, capped to MAX_PAGE_CHARS
+        content = normalize_page(page_markdown, app_settings.WEB_SEARCH_TOOL.MAX_PAGE_CHARS)
+
+        if self.page_cache:
+            await self.page_cache.put(result.url, content)
+
+        return SourceSection(
+            title=result.title,
+            content=content,
+            url=result.url
+        )
 
-                cleaned_results.append(source)
-            
-            except Exception as e:
-                tool_logger.error(f"Failed to crawl or process {result.url}: {e}. Skipping source.")
-                continue
 
-        if cleaned_results:
+    def build_section(self, query: SubQuery, sources: List[SourceSection]) -> Optional[ResearchSection]:
+        if sources:
             research_subsection = ResearchSection(
                 subquestion=f"Rsearch Question/Topic: {query.sub_prompt}",
-                sources=cleaned_results   
+                sources=sources
             )
 
             tool_logger.info(f"[✔] Research complete for subprompt {query.sub_prompt}")
@@ -159,32 +250,54 @@ class WebSearchTool:
             tool_logger.warning(f"All sources failed to crawl for subprompt: {query.sub_prompt}")
             return None
 
-            
-    async def web_search(self, query: SubQuery) -> SourceSection:
+
+    async def cached_search(self, engine: str, query: SubQuery) -> List[NormalizedSearchResult]:
+        # runs one of the browsers through the search cache (if on)
+        browser = self.ddg_browser if engine == "duckduckgo" else self.google_browser
+
+        async def fetch() -> List[NormalizedSearchResult]:
+            # the search clients are blocking (and google sleeps between requests),
+            # so they run on the search thread pool instead of the event loop
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()  # keeps the trace id in the worker thread's logs
+            async with crawl_scheduler.search(engine):
+                async with stage_timer("search", engine=engine, sub_prompt=query.sub_prompt):
+                    return await loop.run_in_executor(
+                        self.search_executor,
+                        functools.partial(context.run, browser, query)
+                    )
+
+        if not self.search_cache:
+            return await fetch()
+
+        key = self.search_cache.make_key(
+            query.sub_prompt,
+            engine,
+            self.num_search_results()
+        )
+        return await self.search_cache.get_or_fetch(key, fetch)
+
+
+    async def search(self, query: SubQuery) -> Optional[List[NormalizedSearchResult]]:
         tool_logger.info(f"Searching subprompt: {query.sub_prompt}")
+        search_results = None
 
         # uses app_settings to determine which browswer to use
         match app_settings.WEB_SEARCH_TOOL.WEB_BROWSER.lower():
             case "duckduckgo":
                 try:
-                    search_results = self.ddg_browser(query)
+                    search_results = await self.cached_search("duckduckgo", query)
                 except Exception as e:
                     tool_logger.warning(f"DuckDuckGo search failed: {e}. Attempting fallback with Google.")
                     try:
-                        search_results = self.google_browser(query)
+                        search_results = await self.cached_search("google", query)
                     except Exception as fallback_e:
                         tool_logger.error(f"Fallback search with Google also failed: {fallback_e}")
             
             case "google":
-                search_results = self.google_browser(query)
+                search_results = await self.cached_search("google", query)
             
             case _:
                 raise RuntimeError(f"{app_settings.WEB_SEARCH_TOOL.WEB_BROWSER} is an invalid browswer.")
 
-        if search_results:
-
-            research = await self.crawl_sites(search_results, query)
-
-            return research
-        return None
-        
\ No newline at end of file
+        return search_results
@@ -0,0 +1,222 @@
+# utils/artifact_store.py
+import os
+import gzip
+import time
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Optional
+
+from utils.logger import logger
+from utils.trace import get_trace_id
+from config.config import ArtifactSettings
+
+# how often old artifacts are deleted by the writer thread
+PURGE_INTERVAL = 600.0
+
+
+@dataclass
+class Artifact:
+    trace_id: str
+    kind: str
+    created_at: float
+    text: str
+
+
+class ArtifactStore(ABC):
+    """
+    Debug copies of the report prompts and final reports, written off the request path.
+    - save() only samples the request and queues the text, a background thread compresses and
+      writes it (a full queue drops the artifact instead of waiting)
+    - requests are sampled by trace id, so a saved request keeps all of its artifacts
+    - artifacts older than `retention` seconds are deleted, then the oldest past `max_bytes`
+    Subclasses implement write(), purge() and _close() for one storage backend.
+    """
+
+    def __init__(self, sample_rate: float, compression_level: int, retention: float, max_bytes: int, queue_size: int):
+        self.sample_rate = sample_rate
+        self.compression_level = compression_level
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.dropped = 0
+
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._writer = threading.Thread(target=self._run, name="artifact-writer", daemon=True)
+        self._writer.start()
+
+
+    def sampled(self, trace_id: str) -> bool:
+        if self.sample_rate >= 1:
+            return True
+        try:
+            # trace ids are random hex, so their prefix is a uniform sample
+            return int(trace_id[:8], 16) / 0xFFFFFFFF < self.sample_rate
+        except ValueError:
+            return False
+
+
+    def save(self, kind: str, text: str):
+        # never blocks, safe to call from the event loop
+        trace_id = get_trace_id()
+        if not self.sampled(trace_id):
+            return
+        try:
+            self._queue.put_nowait(Artifact(trace_id=trace_id, kind=kind, created_at=time.time(), text=text))
+        except queue.Full:
+            self.dropped += 1
+            logger.warning(f"[ARTIFACTS] Writer is behind, dropped {kind} (dropped={self.dropped})")
+
+
+    def _run(self):
+        last_purge = 0.0
+        while True:
+            artifact: Optional[Artifact] = self._queue.get()
+            if artifact is None:
+                break
+            try:
+                data = gzip.compress(artifact.text.encode("utf-8"), compresslevel=self.compression_level)
+                self.write(artifact, data)
+            except Exception as e:
+                logger.error(f"[ARTIFACTS] Failed to save {artifact.kind} of {artifact.trace_id}: {e}")
+
+            if time.time() - last_purge > PURGE_INTERVAL:
+                last_purge = time.time()
+                try:
+                    self.purge()
+                except Exception as e:
+                    logger.error(f"[ARTIFACTS] Failed to delete old artifacts: {e}")
+
+
+    @abstractmethod
+    def write(self, artifact: Artifact, data: bytes):
+        ...
+
+
+    @abstractmethod
+    def purge(self):
+        ...
+
+
+    def _close(self):
+        pass
+
+
+    def close(self):
+        # blocking: writes what is still queued, run it in a thread from async code
+        self._queue.put(None)
+        self._writer.join()
+        self._close()
+
+
+class FileArtifactStore(ArtifactStore):
+    # one gzip file per artifact: <directory>/<date>/<trace_id>-<kind>.txt.gz
+
+    def __init__(self, directory: str, **kwargs):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(**kwargs)
+
+
+    def write(self, artifact: Artifact, data: bytes):
+        day = time.strftime("%Y-%m-%d", time.localtime(artifact.created_at))
+        os.makedirs(os.path.join(self.directory, day), exist_ok=True)
+        path = os.path.join(self.directory, day, f"{artifact.trace_id}-{artifact.kind}.txt.gz")
+        with open(path, "ab") as f:
+            f.write(data)
+
+
+    def purge(self):
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        cutoff = time.time() - self.retention
+        total = sum(size for _, size, _ in files)
+        for mtime, size, path in files:
+            if mtime >= cutoff and total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+        # drop the day directories emptied above
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if os.path.isdir(path) and not os.listdir(path):
+                os.rmdir(path)
+
+
+class SqliteArtifactStore(ArtifactStore):
+    # gzipped artifacts as rows of a local SQLite database
+
+    def __init__(self, path: str, **kwargs):
+        # only used from the writer thread after this
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS artifacts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                trace_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS artifacts_trace ON artifacts (trace_id)")
+        self._conn.commit()
+        super().__init__(**kwargs)
+
+
+    def write(self, artifact: Artifact, data: bytes):
+        self._conn.execute(
+            "INSERT INTO artifacts (trace_id, kind, created_at, size, data) VALUES (?, ?, ?, ?, ?)",
+            (artifact.trace_id, artifact.kind, artifact.created_at, len(data), data)
+        )
+        self._conn.commit()
+
+
+    def purge(self):
+        self._conn.execute("DELETE FROM artifacts WHERE created_at < ?", (time.time() - self.retention,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM artifacts").fetchone()[0]
+        over = total - self.max_bytes
+        if over > 0:
+            # oldest rows whose sizes add up to the excess
+            self._conn.execute(
+                """
+                DELETE FROM artifacts WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, SUM(size) OVER (ORDER BY id) - size AS before FROM artifacts
+                    ) WHERE before < ?
+                )
+                """,
+                (over,)
+            )
+        self._conn.commit()
+
+
+    def _close(self):
+        self._conn.close()
+
+
+def create_artifact_store(settings: ArtifactSettings) -> Optional[ArtifactStore]:
+    if not settings.ON:
+        return None
+
+    options = dict(
+        sample_rate=settings.SAMPLE_RATE,
+        compression_level=settings.COMPRESSION_LEVEL,
+        retention=settings.RETENTION,
+        max_bytes=settings.MAX_MB * 1024 * 1024,
+        queue_size=settings.QUEUE_SIZE
+    )
+    if settings.BACKEND == "sqlite":
+        return SqliteArtifactStore(settings.PATH, **options)
+    return FileArtifactStore(settings.DIR, **options)
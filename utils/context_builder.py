@@ -0,0 +1,402 @@
+# utils/context_builder.py
+# Builds the synthesizer's research context, as compact JSON in the StructuredResearchOutput shape.
+# "ranked": splits sources into chunks of consecutive lines, drops near-duplicates across sources,
+#           ranks chunks per sub-question with BM25 and keeps the best ones within a token budget.
+# "retrieval": indexes source chunks in the persistent vector index (as each section's research
+#              finishes, see index_sections) and takes the top-k chunks per sub-question from it.
+import re
+import json
+import asyncio
+import math
+import hashlib
+from collections import Counter, defaultdict
+from dataclasses import dataclass, replace
+from typing import Dict, List, Set, Tuple
+
+from models.ResearchModel import ResearchSection, StructuredResearchOutput
+from config.config import SynthAgentSettings, VectorIndexSettings
+from utils.logger import agent_logger
+from utils.embeddings import EmbeddingClient
+from utils.vector_index import IndexedChunk, VectorIndex
+from utils.text_normalizer import SENTENCE_END_PATTERN, cap_length
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+SHINGLE_SIZE = 3
+
+
+@dataclass
+class Chunk:
+    section_idx: int
+    source_idx: int
+    position: int
+    text: str
+    terms: List[str]
+    tokens: int
+    score: float = 0.0
+
+
+def estimate_tokens(text: str, chars_per_token: float) -> int:
+    # rough estimate, no tokenizer for the served models is available here
+    return max(1, math.ceil(len(text) / chars_per_token))
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def shingles(terms: List[str]) -> Set[int]:
+    if len(terms) < SHINGLE_SIZE:
+        return {hash(" ".join(terms))}
+    return {
+        hash(" ".join(terms[i:i + SHINGLE_SIZE]))
+        for i in range(len(terms) - SHINGLE_SIZE + 1)
+    }
+
+
+def window_text(text: str, max_chars: int, overlap: int = 0) -> List[str]:
+    # splits text longer than max_chars at sentence ends (or spaces, see cap_length), each window
+    # repeating up to `overlap` characters (whole sentences or words) of the previous one
+    windows = []
+    while len(text) > max_chars:
+        window = cap_length(text, max_chars)
+        windows.append(window)
+        start = len(window)
+        if overlap:
+            tail = max(len(window) - overlap, len(window) // 2)
+            match = SENTENCE_END_PATTERN.search(window, tail)
+            space = window.find(" ", tail)
+            if match:
+                start = match.end()
+            elif space > 0:
+                start = space
+        text = text[start:].lstrip()
+    if text:
+        windows.append(text)
+    return windows
+
+
+def split_blocks(content: str, max_chars: int, overlap: int = 0) -> List[str]:
+    # crawl4ai's markdown separates paragraphs with a single newline, so consecutive lines are
+    # packed into blocks of up to max_chars; a blank line or a heading starts a new block and
+    # lines longer than max_chars are split into (overlapping) windows
+    blocks = []
+    current: List[str] = []
+    current_len = 0
+    for line in content.split("\n"):
+        line = line.strip()
+        if current and (not line or line[0] == "#" or len(line) > max_chars or current_len + len(line) > max_chars):
+            blocks.append("\n".join(current))
+            current, current_len = [], 0
+        if not line:
+            continue
+        if len(line) > max_chars:
+            blocks.extend(window_text(line, max_chars, overlap))
+            continue
+        current.append(line)
+        current_len += len(line) + 1
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def split_chunks(research: StructuredResearchOutput, settings: SynthAgentSettings) -> List[Chunk]:
+    chunks = []
+    for section_idx, section in enumerate(research.sections):
+        for source_idx, source in enumerate(section.sources):
+            for position, block in enumerate(split_blocks(source.content, settings.MAX_CHUNK_CHARS)):
+                if len(block) < settings.MIN_PARAGRAPH_CHARS:
+                    continue
+                chunks.append(Chunk(
+                    section_idx=section_idx,
+                    source_idx=source_idx,
+                    position=position,
+                    text=block,
+                    terms=tokenize(block),
+                    tokens=estimate_tokens(block, settings.CHARS_PER_TOKEN)
+                ))
+    return chunks
+
+
+def remove_near_duplicates(chunks: List[Chunk], threshold: float) -> List[Chunk]:
+    # keeps the first copy of every paragraph; later ones with shingle Jaccard >= threshold are dropped.
+    # candidates are found through an inverted index on shingles instead of comparing every pair.
+    kept: List[Chunk] = []
+    kept_shingles: List[Set[int]] = []
+    seen_exact: Set[str] = set()
+    index: Dict[int, List[int]] = defaultdict(list)
+
+    for chunk in chunks:
+        exact = hashlib.md5(" ".join(chunk.terms).encode("utf-8")).hexdigest()
+        if exact in seen_exact:
+            continue
+
+        chunk_shingles = shingles(chunk.terms)
+        overlaps = Counter(kept_id for s in chunk_shingles for kept_id in index.get(s, ()))
+        is_duplicate = False
+        for kept_id, shared in overlaps.items():
+            union = len(chunk_shingles) + len(kept_shingles[kept_id]) - shared
+            if union and shared / union >= threshold:
+                is_duplicate = True
+                break
+        if is_duplicate:
+            continue
+
+        seen_exact.add(exact)
+        kept_id = len(kept)
+        kept.append(chunk)
+        kept_shingles.append(chunk_shingles)
+        for s in chunk_shingles:
+            index[s].append(kept_id)
+
+    return kept
+
+
+def score_bm25(chunks: List[Chunk], queries: List[str], k1: float, b: float):
+    # each chunk is scored against its own section's sub-question, idf over all chunks
+    if not chunks:
+        return
+
+    doc_freq = Counter()
+    for chunk in chunks:
+        doc_freq.update(set(chunk.terms))
+
+    n_docs = len(chunks)
+    avg_len = sum(len(chunk.terms) for chunk in chunks) / n_docs
+    query_terms = [set(tokenize(query)) for query in queries]
+
+    for chunk in chunks:
+        term_freq = Counter(chunk.terms)
+        length_norm = k1 * (1 - b + b * len(chunk.terms) / avg_len)
+        score = 0.0
+        for term in query_terms[chunk.section_idx]:
+            tf = term_freq.get(term)
+            if not tf:
+                continue
+            idf = math.log(1 + (n_docs - doc_freq[term] + 0.5) / (doc_freq[term] + 0.5))
+            score += idf * tf * (k1 + 1) / (tf + length_norm)
+        chunk.score = score
+
+
+def truncate_chunk(chunk: Chunk, max_tokens: int, chars_per_token: float) -> Chunk:
+    text = cap_length(chunk.text, int(max(1, max_tokens) * chars_per_token))
+    return replace(chunk, text=text, terms=tokenize(text), tokens=estimate_tokens(text, chars_per_token))
+
+
+def select_within_budget(chunks: List[Chunk], n_sections: int, budget: int, chars_per_token: float) -> List[Chunk]:
+    # every section gets an equal share first (at least the beginning of its best chunk),
+    # unused budget then goes to the best remaining chunks
+    by_section: Dict[int, List[Chunk]] = defaultdict(list)
+    for chunk in chunks:
+        by_section[chunk.section_idx].append(chunk)
+    for section_chunks in by_section.values():
+        section_chunks.sort(key=lambda c: c.score, reverse=True)
+
+    share = budget // max(1, n_sections)
+    selected: List[Chunk] = []
+    leftovers: List[Chunk] = []
+    used = 0
+
+    for section_chunks in by_section.values():
+        section_used = 0
+        for chunk in section_chunks:
+            if section_used + chunk.tokens <= share:
+                selected.append(chunk)
+                section_used += chunk.tokens
+            else:
+                leftovers.append(chunk)
+        if not section_used:
+            # not even the best chunk fits the share, its beginning does
+            best = section_chunks[0]
+            leftovers.remove(best)
+            best = truncate_chunk(best, share, chars_per_token)
+            selected.append(best)
+            section_used = best.tokens
+        used += section_used
+
+    for chunk in sorted(leftovers, key=lambda c: c.score, reverse=True):
+        if used + chunk.tokens <= budget:
+            selected.append(chunk)
+            used += chunk.tokens
+
+    return selected
+
+
+def to_context_json(original_query: str, sections: List[dict], all_urls: List[str]) -> str:
+    return json.dumps(
+        {
+            "original_query": original_query,
+            "sections": sections,
+            "all_urls": all_urls
+        },
+        ensure_ascii=False,
+        separators=(",", ":")
+    )
+
+
+def build_context(research: StructuredResearchOutput, settings: SynthAgentSettings) -> Tuple[str, List[str]]:
+    # returns the context JSON and the reference urls
+    sections, reference_urls = rank_sections(research, settings)
+    return to_context_json(research.original_query, sections, reference_urls), reference_urls
+
+
+def rank_sections(research: StructuredResearchOutput, settings: SynthAgentSettings) -> Tuple[List[dict], List[str]]:
+    # returns the context sections ({"subquestion", "sources": [{"title", "content"}]}) and the urls
+    # of the sources that made it into them, to be used as the references
+    chunks = split_chunks(research, settings)
+    total_tokens = sum(chunk.tokens for chunk in chunks)
+
+    unique_chunks = remove_near_duplicates(chunks, settings.DEDUP_THRESHOLD)
+    score_bm25(
+        unique_chunks,
+        [section.subquestion for section in research.sections],
+        settings.BM25_K1,
+        settings.BM25_B
+    )
+    selected = select_within_budget(
+        unique_chunks,
+        len(research.sections),
+        settings.CONTEXT_TOKEN_BUDGET,
+        settings.CHARS_PER_TOKEN
+    )
+
+    # put the selected paragraphs back in reading order under their sources
+    selected.sort(key=lambda c: (c.section_idx, c.source_idx, c.position))
+    paragraphs: Dict[tuple, List[str]] = defaultdict(list)
+    for chunk in selected:
+        paragraphs[(chunk.section_idx, chunk.source_idx)].append(chunk.text)
+
+    sections = []
+    for section_idx, section in enumerate(research.sections):
+        sources = [
+            {"title": source.title, "content": "\n\n".join(paragraphs[(section_idx, source_idx)])}
+            for source_idx, source in enumerate(section.sources)
+            if (section_idx, source_idx) in paragraphs
+        ]
+        if sources:
+            sections.append({"subquestion": section.subquestion, "sources": sources})
+
+    # only the sources the synthesizer sees can be cited
+    reference_urls = sorted({
+        research.sections[section_idx].sources[source_idx].url
+        for section_idx, source_idx in paragraphs
+    })
+
+    agent_logger.info(
+        f"[CONTEXT] {len(chunks)} chunks (~{total_tokens} tokens) -> "
+        f"{len(unique_chunks)} after dedup -> {len(selected)} chunks "
+        f"(~{sum(chunk.tokens for chunk in selected)} tokens, budget {settings.CONTEXT_TOKEN_BUDGET}) "
+        f"from {len(reference_urls)}/{len(research.all_urls)} sources"
+    )
+
+    return sections, reference_urls
+
+
+def split_index_chunks(content: str, chunk_chars: int, min_chars: int, overlap: int) -> List[str]:
+    # chunks of up to chunk_chars for embedding, long paragraphs are split into overlapping windows
+    return [block for block in split_blocks(content, chunk_chars, overlap) if len(block) >= min_chars]
+
+
+async def index_sections(
+    sections: List[ResearchSection],
+    index: VectorIndex,
+    embedder: EmbeddingClient,
+    settings: SynthAgentSettings,
+    index_settings: VectorIndexSettings
+) -> int:
+    # embeds and stores the chunks of the sections' sources, chunks already in the index are not embedded again
+    items = []
+    for section in sections:
+        for source in section.sources:
+            for text in split_index_chunks(
+                source.content,
+                index_settings.CHUNK_CHARS,
+                settings.MIN_PARAGRAPH_CHARS,
+                index_settings.CHUNK_OVERLAP
+            ):
+                items.append((source.url, source.title, text))
+
+    titles = {(url, text): title for url, title, text in items}
+    missing = await asyncio.to_thread(index.missing, titles.keys())
+    if not missing:
+        return 0
+    vectors = await embedder.embed([text for _, text in missing])
+    return await index.add([(url, titles[(url, text)], text) for url, text in missing], vectors)
+
+
+async def build_retrieval_context(
+    research: StructuredResearchOutput,
+    index: VectorIndex,
+    embedder: EmbeddingClient,
+    settings: SynthAgentSettings,
+    index_settings: VectorIndexSettings
+) -> Tuple[str, List[str]]:
+    # returns the context JSON and the reference urls
+    sections, reference_urls = await retrieve_sections(research, index, embedder, settings, index_settings)
+    return to_context_json(research.original_query, sections, reference_urls), reference_urls
+
+
+async def retrieve_sections(
+    research: StructuredResearchOutput,
+    index: VectorIndex,
+    embedder: EmbeddingClient,
+    settings: SynthAgentSettings,
+    index_settings: VectorIndexSettings
+) -> Tuple[List[dict], List[str]]:
+    # returns the context sections and the urls of the retrieved chunks, to be used as the references
+
+    # index the new sources (sections indexed while research was running are skipped)
+    await index_sections(research.sections, index, embedder, settings, index_settings)
+
+    # up to top-k chunks per sub-question, each chunk used once
+    queries = await embedder.embed([section.subquestion for section in research.sections])
+    restrict_to = None if index_settings.SEARCH_ALL_SOURCES else research.all_urls
+    # enough candidates for every sub-question to get its share if they all want the same chunks
+    num_candidates = index_settings.TOP_K * len(research.sections)
+    candidates = []
+    for section, query in zip(research.sections, queries):
+        hits = await index.search(query, num_candidates, urls=restrict_to)
+        # the sub-question's own sources first, then the best scores
+        own_urls = {source.url for source in section.sources}
+        candidates.append(sorted(hits, key=lambda hit: (hit.url not in own_urls, -hit.score)))
+
+    # handed out round-robin, so an earlier sub-question can't use up the chunks of later ones
+    picked: List[List[IndexedChunk]] = [[] for _ in research.sections]
+    positions = [0] * len(research.sections)
+    used_rows = set()
+    while True:
+        progressed = False
+        for idx, hits in enumerate(candidates):
+            if len(picked[idx]) >= index_settings.TOP_K:
+                continue
+            while positions[idx] < len(hits) and hits[positions[idx]].row in used_rows:
+                positions[idx] += 1
+            if positions[idx] < len(hits):
+                hit = hits[positions[idx]]
+                used_rows.add(hit.row)
+                picked[idx].append(hit)
+                progressed = True
+        if not progressed:
+            break
+
+    reference_urls = set()
+    sections = []
+    for section, hits in zip(research.sections, picked):
+        if not hits:
+            agent_logger.warning(f"[CONTEXT] No chunks retrieved for sub-question '{section.subquestion}', it is left out of the context")
+            continue
+        by_url: Dict[str, dict] = {}
+        for hit in hits:
+            reference_urls.add(hit.url)
+            source = by_url.setdefault(hit.url, {"title": hit.title, "content": []})
+            source["content"].append(hit.text)
+        for source in by_url.values():
+            source["content"] = "\n\n".join(source["content"])
+        sections.append({"subquestion": section.subquestion, "sources": list(by_url.values())})
+
+    reference_urls = sorted(reference_urls)
+    agent_logger.info(
+        f"[CONTEXT] Retrieved {len(used_rows)} chunks from the index for {len(research.sections)} sub-questions "
+        f"({', '.join(str(len(hits)) for hits in picked)})"
+    )
+    return sections, reference_urls
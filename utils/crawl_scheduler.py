@@ -0,0 +1,119 @@
+# utils/crawl_scheduler.py
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from config.config import app_settings
+from utils.fair_limiter import FairLimiter
+from utils.http_fetcher import page_domain
+from utils.logger import tool_logger
+from utils.metrics import STAGE_SECONDS
+from utils.trace import get_trace_id
+
+# search engines are rate limited under these domains
+ENGINE_DOMAINS = {"google": "google.com", "duckduckgo": "duckduckgo.com"}
+
+# idle buckets are dropped past this many domains
+MAX_BUCKETS = 10000
+
+
+class TokenBucket:
+    # `rate` requests per second on average, bursts of up to `burst`
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def reserve(self) -> float:
+        # takes a token (going into debt if there is none), returns how long to wait for it
+        # debts queue callers in arrival order without a lock
+        self.refill()
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+    def refund(self):
+        self.tokens += 1
+
+
+    @property
+    def idle(self) -> bool:
+        self.refill()
+        return self.tokens >= self.burst
+
+
+class CrawlScheduler:
+    """
+    Shared gate in front of the web for every WebSearchTool (and so every report) in the process.
+    - per-domain token buckets for searches, HTTP fetches and browser crawls, so concurrent
+      reports don't hammer the same site or search engine
+    - a process-wide budget of open browser pages, handed out round-robin across reports
+    - search engine calls also go through a fair queue across reports
+    Waits are reported as the domain_wait, crawl_queue_wait and search_queue_wait stages.
+    """
+
+    def __init__(self):
+        settings = app_settings.WEB_SEARCH_TOOL
+        self.browser_pages = FairLimiter(settings.MAX_BROWSER_PAGES)
+        self.searches = FairLimiter(settings.SEARCH_WORKERS)
+        self._buckets: Dict[str, TokenBucket] = {}
+
+
+    def bucket(self, domain: str) -> TokenBucket:
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            if len(self._buckets) >= MAX_BUCKETS:
+                self._buckets = {key: value for key, value in self._buckets.items() if not value.idle}
+            settings = app_settings.WEB_SEARCH_TOOL
+            rate = settings.DOMAIN_RATE_LIMITS.get(domain, settings.DOMAIN_RATE)
+            bucket = self._buckets[domain] = TokenBucket(rate, settings.DOMAIN_BURST)
+        return bucket
+
+
+    async def wait_for_domain(self, domain: str):
+        bucket = self.bucket(domain)
+        delay = bucket.reserve()
+        if delay > 0:
+            tool_logger.info(f"[RATE LIMIT] Waiting {delay:.1f}s for {domain}")
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                bucket.refund()
+                raise
+        STAGE_SECONDS.labels(stage="domain_wait").observe(delay)
+
+
+    async def wait_for_url(self, url: str):
+        await self.wait_for_domain(page_domain(url))
+
+
+    @asynccontextmanager
+    async def browser_page(self, url: str) -> AsyncIterator[None]:
+        # a browser page for `url`: the domain's rate limit, then a slot of the page budget
+        await self.wait_for_url(url)
+        queued = time.perf_counter()
+        async with self.browser_pages.slot(get_trace_id()):
+            STAGE_SECONDS.labels(stage="crawl_queue_wait").observe(time.perf_counter() - queued)
+            yield
+
+
+    @asynccontextmanager
+    async def search(self, engine: str) -> AsyncIterator[None]:
+        queued = time.perf_counter()
+        async with self.searches.slot(get_trace_id()):
+            await self.wait_for_domain(ENGINE_DOMAINS.get(engine, engine))
+            STAGE_SECONDS.labels(stage="search_queue_wait").observe(time.perf_counter() - queued)
+            yield
+
+
+# shared by every WebSearchTool in the process
+crawl_scheduler = CrawlScheduler()
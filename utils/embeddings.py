@@ -0,0 +1,45 @@
+# utils/embeddings.py
+from typing import List
+
+import httpx
+import numpy as np
+
+from utils.logger import agent_logger
+
+
+class EmbeddingClient:
+    """
+    Embeds text through Ollama's /api/embed endpoint. Returned vectors are float32 and
+    L2-normalized, so cosine similarity is a plain dot product.
+    """
+
+    def __init__(self, host: str, model: str, batch_size: int = 32, timeout: float = 60.0):
+        self.model = model
+        self.batch_size = batch_size
+        self.client = httpx.AsyncClient(base_url=f"http://{host}", timeout=timeout)
+
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            response = await self.client.post("/api/embed", json={"model": self.model, "input": batch})
+            response.raise_for_status()
+            vectors.extend(response.json()["embeddings"])
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.size == 0:
+            return matrix.reshape(0, 0)
+
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        agent_logger.info(f"[EMBED] Embedded {len(texts)} texts with {self.model}")
+        return matrix / norms
+
+
+    async def embed_one(self, text: str) -> np.ndarray:
+        return (await self.embed([text]))[0]
+
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,170 @@
+# utils/http_fetcher.py
+import re
+import time
+import asyncio
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+if TYPE_CHECKING:
+    from crawl4ai import CrawlerRunConfig
+
+from utils.logger import tool_logger
+
+BROWSER_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+SCRIPT_PATTERN = re.compile(r"<script\b[^>]*>.*?</script\s*>", re.IGNORECASE | re.DOTALL)
+STYLE_PATTERN = re.compile(r"<style\b[^>]*>.*?</style\s*>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+# "please enable JavaScript" shells and client-side app mount points
+JS_REQUIRED_PATTERN = re.compile(
+    r"(?:enable|turn on) javascript|javascript is (?:required|disabled)|"
+    r"<div id=\"(?:root|app|__next)\">\s*</div>",
+    re.IGNORECASE
+)
+
+# pages past this are not worth parsing twice, the browser's result is kept
+MAX_HTML_BYTES = 5 * 1024 * 1024
+
+
+def page_domain(url: str) -> str:
+    netloc = urlsplit(url).netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class HttpFetcher:
+    """
+    Fast path in front of the headless browser: fetches a page with a pooled (keep-alive)
+    HTTP client and runs crawl4ai's own scraping + markdown generation on it, so the markdown
+    matches what the browser path produces with the same CrawlerRunConfig.
+    - fetch() returns None when the page looks like it needs JavaScript (empty body, a
+      script-only shell, very low text density) or the request fails, the caller then
+      falls back to the browser
+    - the tier that worked is remembered per domain for `tier_ttl` seconds, so domains that
+      need the browser skip the HTTP attempt
+    """
+
+    def __init__(
+        self,
+        timeout: float,
+        max_connections: int,
+        min_text_chars: int,
+        min_text_ratio: float,
+        tier_ttl: float
+    ):
+        self.min_text_chars = min_text_chars
+        self.min_text_ratio = min_text_ratio
+        self.tier_ttl = tier_ttl
+        # domain -> (tier, remembered at)
+        self._tiers: Dict[str, Tuple[str, float]] = {}
+
+        self.client = httpx.AsyncClient(
+            headers=BROWSER_HEADERS,
+            timeout=timeout,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+
+
+    def tier(self, url: str) -> Optional[str]:
+        # "http", "browser" or None when the domain has not been seen (or was forgotten)
+        remembered = self._tiers.get(page_domain(url))
+        if remembered is None:
+            return None
+        tier, since = remembered
+        if time.time() - since > self.tier_ttl:
+            self._tiers.pop(page_domain(url), None)
+            return None
+        return tier
+
+
+    def remember(self, url: str, tier: str):
+        domain = page_domain(url)
+        if self._tiers.get(domain, (None,))[0] != tier:
+            tool_logger.info(f"[HTTP FETCH] {domain} -> {tier} tier")
+        self._tiers[domain] = (tier, time.time())
+
+
+    def needs_browser(self, html: str) -> Optional[str]:
+        # reason the raw html can't be used as is, or None if it looks like a static page
+        if not html.strip():
+            return "empty body"
+        if JS_REQUIRED_PATTERN.search(html):
+            return "javascript required"
+
+        text = TAG_PATTERN.sub(" ", STYLE_PATTERN.sub(" ", SCRIPT_PATTERN.sub(" ", html)))
+        text_chars = len(" ".join(text.split()))
+        if text_chars < self.min_text_chars:
+            return f"script-only shell ({text_chars} text chars)"
+        if text_chars / len(html) < self.min_text_ratio:
+            return f"low text density ({text_chars / len(html):.1%})"
+        return None
+
+
+    def extract_markdown(self, url: str, html: str, config: "CrawlerRunConfig") -> str:
+        # same steps as AsyncWebCrawler.aprocess_html: scraping strategy -> cleaned html ->
+        # markdown generator (PruningContentFilter) -> fit markdown
+        # CPU bound, run it in a thread
+        params = config.__dict__.copy()
+        params.pop("url", None)
+        scraped = config.scraping_strategy.scrap(url, html, **params)
+        if scraped is None or not scraped.cleaned_html:
+            return ""
+        markdown = config.markdown_generator.generate_markdown(input_html=scraped.cleaned_html, base_url=url)
+        return markdown.fit_markdown or ""
+
+
+    def classify_and_extract(self, response: httpx.Response, config: "CrawlerRunConfig") -> Tuple[Optional[str], Optional[str]]:
+        # decoding, the static page checks and the extraction are all CPU bound on up to
+        # MAX_HTML_BYTES of html, run in a thread
+        # returns (markdown, None) or (None, reason the page needs the browser)
+        html = response.text
+        reason = self.needs_browser(html)
+        if reason is not None:
+            return None, reason
+        markdown = self.extract_markdown(str(response.url), html, config)
+        if not markdown.strip():
+            return None, "no content after filtering"
+        return markdown, None
+
+
+    async def fetch(self, url: str, config: "CrawlerRunConfig") -> Optional[str]:
+        try:
+            response = await self.client.get(url)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            tool_logger.info(f"[HTTP FETCH] {url} failed ({e.__class__.__name__}), using the browser")
+            return None
+
+        content_type = response.headers.get("content-type", "")
+        if "html" not in content_type:
+            tool_logger.info(f"[HTTP FETCH] {url} is {content_type or 'untyped'}, using the browser")
+            return None
+
+        if len(response.content) > MAX_HTML_BYTES:
+            reason = f"page too large ({len(response.content) // 1024} KB)"
+        else:
+            markdown, reason = await asyncio.to_thread(self.classify_and_extract, response, config)
+            if markdown is not None:
+                self.remember(url, "http")
+                return markdown
+
+        tool_logger.info(f"[HTTP FETCH] {url} needs the browser: {reason}")
+        self.remember(url, "browser")
+        return None
+
+
+    async def close(self):
+        await self.client.aclose()
@@ -0,0 +1,208 @@
+# utils/job_queue.py
+import time
+import uuid
+import asyncio
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from models.JobModels import JobInfo
+from models.QueryModels import UserQuery
+from models.ReportModel import Report
+from utils.logger import logger
+from utils.shared_store import SharedStore
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, query: UserQuery, on_update: Optional[Callable[["Job"], None]] = None):
+        self.query = query
+        self.on_update = on_update
+        self.info = JobInfo(
+            job_id=uuid.uuid4().hex,
+            prompt=query.prompt,
+            status="queued",
+            created_at=time.time()
+        )
+        self._updated = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.info.status in ("done", "failed")
+
+    def update(self, **changes):
+        for field, value in changes.items():
+            setattr(self.info, field, value)
+        # wake up anyone streaming this job, then re-arm for the next change
+        self._updated.set()
+        self._updated = asyncio.Event()
+        if self.on_update:
+            self.on_update(self)
+
+    def next_update(self) -> asyncio.Event:
+        # set on the next change to the job
+        return self._updated
+
+
+class JobQueue:
+    """
+    Bounded queue of report jobs processed by a fixed pool of background workers.
+    Handlers get a callback for partial reports, which are streamed to clients as they arrive.
+    Finished jobs are kept for `job_ttl` seconds so clients can poll or stream their result.
+    With a shared store, every change to a job is mirrored there, so the other worker
+    processes can serve its status (polling the store every `poll_interval` seconds to stream it).
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[UserQuery, Callable[[dict], None]], Awaitable[Report]],
+        num_workers: int,
+        max_queue_size: int,
+        job_ttl: float,
+        store: Optional[SharedStore] = None,
+        poll_interval: float = 0.5
+    ):
+        self.handler = handler
+        self.num_workers = num_workers
+        self.job_ttl = job_ttl
+        self.store = store
+        self.poll_interval = poll_interval
+
+        self.queue: asyncio.Queue[Job] = asyncio.Queue(maxsize=max_queue_size)
+        self.jobs: Dict[str, Job] = {}
+        self._workers: List[asyncio.Task] = []
+        # a single thread, so a job's changes reach the store in order
+        self._publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-publish") if store else None
+
+
+    def start(self):
+        self._workers = [
+            asyncio.create_task(self._worker(i), name=f"report-worker-{i}")
+            for i in range(self.num_workers)
+        ]
+        logger.info(f"[JOBS] Started {self.num_workers} report workers")
+
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers.clear()
+        if self._publisher:
+            # lets the last changes (jobs failed by the shutdown) reach the store
+            await asyncio.to_thread(self._publisher.shutdown)
+
+
+    def submit(self, query: UserQuery) -> Job:
+        self._purge_expired()
+
+        job = Job(query, on_update=self._publish if self.store else None)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError(f"Report queue is full ({self.queue.maxsize} jobs waiting)")
+
+        self.jobs[job.info.job_id] = job
+        if self.store:
+            self._publish(job)
+        logger.info(f"[JOBS] Queued job {job.info.job_id} (queue depth: {self.queue.qsize()})")
+        return job
+
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+
+    async def get_info(self, job_id: str) -> Optional[JobInfo]:
+        # the job's state, also for jobs submitted to another worker process
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.info
+        if self.store is None:
+            return None
+        data = await asyncio.to_thread(self.store.get, "job", job_id)
+        return JobInfo.model_validate_json(data) if data is not None else None
+
+
+    async def stream(self, job_id: str) -> AsyncIterator[JobInfo]:
+        # yields the job's state now and after every change until it finishes
+        job = self.jobs.get(job_id)
+        if job is None:
+            async for info in self._stream_shared(job_id):
+                yield info
+            return
+
+        while True:
+            updated = job.next_update()
+            yield job.info
+            if job.finished:
+                return
+            await updated.wait()
+
+
+    async def _stream_shared(self, job_id: str) -> AsyncIterator[JobInfo]:
+        # a job running in another worker process, polled from the shared store
+        if self.store is None:
+            return
+        last = None
+        while True:
+            data = await asyncio.to_thread(self.store.get, "job", job_id)
+            if data is None:
+                return
+            if data != last:
+                last = data
+                info = JobInfo.model_validate_json(data)
+                yield info
+                if info.status in ("done", "failed"):
+                    return
+            await asyncio.sleep(self.poll_interval)
+
+
+    def _publish(self, job: Job):
+        # finished jobs stay in the store as long as they are kept here (job_ttl)
+        data = job.info.model_dump_json()
+        future = self._publisher.submit(self.store.put, "job", job.info.job_id, data, self.job_ttl)
+        future.add_done_callback(self._log_publish_error)
+
+
+    @staticmethod
+    def _log_publish_error(future: Future):
+        if future.exception() is not None:
+            logger.warning(f"[JOBS] Could not publish a job to the shared store: {future.exception()}")
+
+
+    def _purge_expired(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self.jobs.items()
+            if job.finished and now - job.info.finished_at > self.job_ttl
+        ]
+        for job_id in expired:
+            del self.jobs[job_id]
+
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job = await self.queue.get()
+            job_id = job.info.job_id
+            try:
+                logger.info(f"[JOBS] Worker {worker_id} picked up job {job_id}")
+                job.update(status="running", started_at=time.time())
+
+                report = await self.handler(
+                    job.query,
+                    lambda partial: job.update(partial_report=partial)
+                )
+
+                job.update(status="done", result=report, partial_report=None, finished_at=time.time())
+                logger.info(f"[JOBS] Job {job_id} done")
+            except asyncio.CancelledError:
+                job.update(status="failed", error="Server shutting down", finished_at=time.time())
+                raise
+            except Exception as e:
+                logger.error(f"[JOBS] Job {job_id} failed: {e}")
+                job.update(status="failed", error=str(e), finished_at=time.time())
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,51 @@
+# utils/lazy_crawler.py
+import time
+import asyncio
+import importlib
+from typing import TYPE_CHECKING, Optional
+
+from utils.logger import logger
+
+if TYPE_CHECKING:
+    from crawl4ai import AsyncWebCrawler
+
+
+class LazyCrawler:
+    """
+    The app's one headless browser (crawl4ai's AsyncWebCrawler), shared by every crawl.
+    crawl4ai is only imported, and Chromium only launched, by start(): on the first crawl,
+    or earlier by the startup warm-up (STARTUP__PREWARM_BROWSER).
+    """
+
+    def __init__(self):
+        self._crawler: Optional["AsyncWebCrawler"] = None
+        self._lock = asyncio.Lock()
+
+
+    @property
+    def started(self) -> bool:
+        return self._crawler is not None
+
+
+    async def start(self) -> "AsyncWebCrawler":
+        async with self._lock:
+            if self._crawler is None:
+                start = time.perf_counter()
+                # the import alone takes most of a second, keep it off the event loop
+                crawl4ai = await asyncio.to_thread(importlib.import_module, "crawl4ai")
+                crawler = crawl4ai.AsyncWebCrawler()
+                await crawler.start()
+                self._crawler = crawler
+                logger.info(f"Crawler started in {time.perf_counter() - start:.2f}s")
+        return self._crawler
+
+
+    async def arun(self, *args, **kwargs):
+        crawler = self._crawler or await self.start()
+        return await crawler.arun(*args, **kwargs)
+
+
+    async def close(self):
+        if self._crawler is not None:
+            await self._crawler.close()
+            self._crawler = None
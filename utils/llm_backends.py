@@ -0,0 +1,314 @@
+# utils/llm_backends.py
+import json
+import functools
+import time
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Dict, List, Optional, Set
+
+import httpx
+from pydantic_ai.providers.openai import OpenAIProvider
+
+from config.config import Settings, app_settings
+from utils.logger import agent_logger
+from utils.metrics import STAGE_SECONDS
+
+# placeholder host of the pooled provider, the transport swaps it for a real backend
+POOL_BASE_URL = "http://ollama-pool/v1"
+
+# backend picked by the scheduler for the current LLM request
+current_backend: ContextVar[Optional["OllamaBackend"]] = ContextVar("current_backend", default=None)
+
+FAILOVER_ERRORS = (httpx.TimeoutException, httpx.ConnectError, httpx.RemoteProtocolError)
+
+
+class OllamaBackend:
+    """
+    One Ollama host: a pooled (keep-alive, HTTP/2 capable) connection pool, the number of
+    requests in flight per model, passive health (marked down for a cooldown after a timeout
+    or connection error) and the model swap check against /api/ps.
+    """
+
+    def __init__(self, host: str, models: Optional[List[str]], max_loaded_models: int):
+        settings = app_settings.LLM_SCHEDULER
+        self.host = host
+        self.models: Optional[Set[str]] = set(models) if models else None  # None: serves every model
+        self.max_loaded_models = max_loaded_models
+
+        self.transport = httpx.AsyncHTTPTransport(
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=settings.MAX_CONNECTIONS_PER_BACKEND,
+                max_keepalive_connections=settings.MAX_CONNECTIONS_PER_BACKEND
+            )
+        )
+        self.client = httpx.AsyncClient(base_url=f"http://{host}", transport=self.transport, timeout=settings.LOAD_TIMEOUT)
+
+        self.in_flight: Dict[str, int] = defaultdict(int)
+        self.down_until = 0.0
+
+        self._idle = asyncio.Condition()
+        self._swap_lock = asyncio.Lock()
+        # models a pending swap is waiting to push out
+        self._evicting: Set[str] = set()
+        self._loaded: Set[str] = set()
+        self._loaded_at = 0.0
+        self._ps_supported = True
+
+
+    def __repr__(self) -> str:
+        return f"OllamaBackend({self.host})"
+
+
+    def serves(self, model: str) -> bool:
+        return self.models is None or model in self.models
+
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+
+    @property
+    def load(self) -> int:
+        return sum(self.in_flight.values())
+
+
+    def mark_down(self, error: Exception):
+        self.down_until = time.monotonic() + app_settings.LLM_SCHEDULER.BACKEND_COOLDOWN
+        agent_logger.warning(
+            f"[LLM BACKENDS] {self.host} failed ({type(error).__name__}: {error}), "
+            f"skipping it for {app_settings.LLM_SCHEDULER.BACKEND_COOLDOWN}s"
+        )
+
+
+    async def loaded_models(self) -> Optional[Set[str]]:
+        # models currently resident on this host, None if the backend can't tell us
+        if not self._ps_supported:
+            return None
+        if time.monotonic() - self._loaded_at < app_settings.LLM_SCHEDULER.PS_CACHE_SECONDS:
+            return self._loaded
+
+        try:
+            response = await self.client.get("/api/ps")
+            response.raise_for_status()
+            models = response.json().get("models", [])
+        except FAILOVER_ERRORS as e:
+            self.mark_down(e)
+            return None
+        except (httpx.HTTPError, ValueError) as e:
+            agent_logger.warning(f"[LLM BACKENDS] Can't read loaded models from {self.host}/api/ps ({e}), swap checks disabled")
+            self._ps_supported = False
+            return None
+
+        self._loaded = {model.get("model") or model.get("name") for model in models}
+        self._loaded_at = time.monotonic()
+        return self._loaded
+
+
+    async def ensure_loaded(self, model: str):
+        # requests for a resident model don't queue behind a swap to another model,
+        # unless that swap is about to push this one out
+        loaded = await self.loaded_models()
+        if loaded is None or (model in loaded and model not in self._evicting):
+            return
+
+        async with self._swap_lock:
+            # re-checked, the swap we waited behind may have loaded it
+            loaded = await self.loaded_models()
+            if loaded is None or model in loaded:
+                return
+
+            # until the swap is done, requests for the models it pushes out wait behind it
+            others = loaded - {model}
+            self._evicting = others if len(others) >= self.max_loaded_models else set()
+            try:
+                await self._swap(model)
+            finally:
+                self._evicting = set()
+
+
+    async def _swap(self, model: str):
+        # loading this model would push others out: let their in-flight requests finish first
+        if self._evicting:
+            others = self._evicting
+            wait_start = time.perf_counter()
+            async with self._idle:
+                await self._idle.wait_for(lambda: all(self.in_flight[other] == 0 for other in others))
+            waited = time.perf_counter() - wait_start
+            STAGE_SECONDS.labels(stage="llm_swap_wait").observe(waited)
+            if waited > 0.01:
+                agent_logger.info(f"[LLM BACKENDS] {self.host}: waited {waited:.2f}s for {sorted(others)} to go idle before loading {model}")
+
+        load_start = time.perf_counter()
+        try:
+            response = await self.client.post(
+                "/api/generate",
+                json={"model": model, "keep_alive": app_settings.LLM_SCHEDULER.KEEP_ALIVE}
+            )
+            response.raise_for_status()
+        except FAILOVER_ERRORS as e:
+            # the request itself will fail over to another host
+            self.mark_down(e)
+            return
+        STAGE_SECONDS.labels(stage="llm_model_load").observe(time.perf_counter() - load_start)
+        agent_logger.info(f"[LLM BACKENDS] {self.host}: loaded {model} in {time.perf_counter() - load_start:.2f}s")
+        self._loaded_at = 0.0  # re-check on the next request
+
+
+    async def release(self, model: str):
+        # every in-flight decrement goes through here, a swap may be waiting for the model to go idle
+        self.in_flight[model] -= 1
+        async with self._idle:
+            self._idle.notify_all()
+
+
+    @asynccontextmanager
+    async def track(self, model: str) -> AsyncIterator[None]:
+        self.in_flight[model] += 1
+        try:
+            yield
+        finally:
+            await self.release(model)
+
+
+    async def close(self):
+        await self.client.aclose()
+
+
+class BackendPool:
+    def __init__(self, backends: List[OllamaBackend]):
+        self.backends = backends
+
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "BackendPool":
+        # LLM_BACKENDS if configured, otherwise OLLAMA_HOST serving every model
+        default_max_loaded = settings.LLM_SCHEDULER.MAX_LOADED_MODELS
+        if settings.LLM_BACKENDS:
+            backends = [
+                OllamaBackend(backend.HOST, backend.MODELS, backend.MAX_LOADED_MODELS or default_max_loaded)
+                for backend in settings.LLM_BACKENDS
+            ]
+        else:
+            backends = [OllamaBackend(settings.OLLAMA_HOST, None, default_max_loaded)]
+        return cls(backends)
+
+
+    def candidates(self, model: str) -> List[OllamaBackend]:
+        # backends serving the model, healthy and least loaded first
+        serving = [backend for backend in self.backends if backend.serves(model)]
+        if not serving:
+            raise RuntimeError(f"No LLM backend is configured to serve {model}")
+        return sorted(serving, key=lambda backend: (not backend.healthy, backend.load))
+
+
+    def pick(self, model: str) -> OllamaBackend:
+        return self.candidates(model)[0]
+
+
+    def serving_count(self, model: str) -> int:
+        return sum(1 for backend in self.backends if backend.serves(model))
+
+
+    async def warm_up(self, models: List[str]):
+        # loads the models on every backend serving them, in order (with room for one model
+        # on a backend, the last one stays loaded), backends are warmed up in parallel
+        async def warm_up_backend(backend: OllamaBackend):
+            for model in models:
+                if backend.serves(model):
+                    await backend.ensure_loaded(model)
+
+        await asyncio.gather(*(warm_up_backend(backend) for backend in self.backends))
+
+
+    async def close(self):
+        for backend in self.backends:
+            await backend.close()
+
+
+class ClosingStream(httpx.AsyncByteStream):
+    # wraps a response stream to await a callback once it is closed (request really finished)
+    def __init__(self, stream: httpx.AsyncByteStream, on_close):
+        self.stream = stream
+        self.on_close = on_close
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            await self.on_close()
+
+
+class BalancedTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport behind the pooled OpenAIProvider. Sends each request to the backend the
+    scheduler picked (or the least loaded one serving the model) and fails over to the next
+    backend when a host times out or refuses the connection.
+    """
+
+    def __init__(self, pool: BackendPool):
+        self.pool = pool
+
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        try:
+            model = json.loads(request.content).get("model")
+        except (ValueError, AttributeError, httpx.RequestNotRead):
+            model = None
+
+        candidates = self.pool.candidates(model) if model else list(self.pool.backends)
+        chosen = current_backend.get()
+        if chosen in candidates:
+            candidates.remove(chosen)
+            candidates.insert(0, chosen)
+
+        last_error: Optional[Exception] = None
+        for backend in candidates:
+            if last_error is not None and not backend.healthy:
+                continue
+
+            host, _, port = backend.host.partition(":")
+            request.url = request.url.copy_with(scheme="http", host=host, port=int(port) if port else None)
+            request.headers["Host"] = backend.host
+
+            # requests that weren't routed by the scheduler (or failed over) still count towards load
+            tracked = backend is not chosen or last_error is not None
+            if tracked:
+                backend.in_flight[model] += 1
+
+            try:
+                response = await backend.transport.handle_async_request(request)
+            except FAILOVER_ERRORS as e:
+                if tracked:
+                    await backend.release(model)
+                backend.mark_down(e)
+                last_error = e
+                continue
+
+            if tracked:
+                response.stream = ClosingStream(response.stream, functools.partial(backend.release, model))
+            if last_error is not None:
+                agent_logger.info(f"[LLM BACKENDS] Failed over {model} request to {backend.host}")
+            return response
+
+        raise last_error or httpx.ConnectError("No LLM backend available")
+
+
+def pooled_provider(pool: BackendPool) -> OpenAIProvider:
+    # OpenAI-compatible provider whose requests are load balanced across the pool
+    http_client = httpx.AsyncClient(
+        transport=BalancedTransport(pool),
+        timeout=httpx.Timeout(app_settings.LLM_SCHEDULER.REQUEST_TIMEOUT, connect=5.0)
+    )
+    return OpenAIProvider(base_url=POOL_BASE_URL, http_client=http_client)
+
+
+# shared by every agent in the process
+backend_pool = BackendPool.from_settings(app_settings)
@@ -0,0 +1,72 @@
+# utils/llm_scheduler.py
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict
+
+from pydantic_ai.models import Model
+from pydantic_ai.models.wrapper import WrapperModel
+
+from config.config import app_settings
+from utils.fair_limiter import FairLimiter
+from utils.llm_backends import BackendPool, backend_pool, current_backend
+from utils.metrics import STAGE_SECONDS
+from utils.trace import get_trace_id
+
+
+class LLMScheduler:
+    """
+    Shared gate in front of the LLM backends for every agent.
+    - limits concurrent requests per model (per backend serving it), handing out slots
+      round-robin across reports
+    - routes each request to the least loaded healthy backend serving the model
+    - on that backend, only waits when serving the request would swap out a model that still
+      has requests in flight (see OllamaBackend.ensure_loaded)
+    """
+
+    def __init__(self, pool: BackendPool):
+        self.pool = pool
+        self._limiters: Dict[str, FairLimiter] = {}
+
+
+    def limiter(self, model: str) -> FairLimiter:
+        if model not in self._limiters:
+            limit = app_settings.LLM_SCHEDULER.MAX_CONCURRENT_PER_MODEL * self.pool.serving_count(model)
+            self._limiters[model] = FairLimiter(limit)
+        return self._limiters[model]
+
+
+    @asynccontextmanager
+    async def slot(self, model: str) -> AsyncIterator[None]:
+        queued = time.perf_counter()
+        async with self.limiter(model).slot(get_trace_id()):
+            backend = self.pool.pick(model)
+            await backend.ensure_loaded(model)
+            STAGE_SECONDS.labels(stage="llm_queue_wait").observe(time.perf_counter() - queued)
+
+            async with backend.track(model):
+                token = current_backend.set(backend)
+                try:
+                    yield
+                finally:
+                    current_backend.reset(token)
+
+
+class ScheduledModel(WrapperModel):
+    # runs every request of the wrapped model through the scheduler
+    def __init__(self, wrapped: Model, scheduler: LLMScheduler):
+        super().__init__(wrapped)
+        self.scheduler = scheduler
+
+    async def request(self, *args, **kwargs):
+        async with self.scheduler.slot(self.model_name):
+            return await self.wrapped.request(*args, **kwargs)
+
+    @asynccontextmanager
+    async def request_stream(self, *args, **kwargs):
+        async with self.scheduler.slot(self.model_name):
+            async with self.wrapped.request_stream(*args, **kwargs) as response_stream:
+                yield response_stream
+
+
+# shared by every agent in the process
+llm_scheduler = LLMScheduler(backend_pool)
@@ -1,15 +1,73 @@
 # utils/logger.py
+import os
+import json
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from utils.trace import TraceIdFilter
+from config.config import app_settings
+
+TEXT_FORMAT = "[%(levelname)s] %(name)s [%(trace_id)s]: %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    # one json object per line
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def log_file_path() -> str:
+    # with several worker processes each one writes (and rotates) its own file, app.<pid>.log
+    if app_settings.SERVER.WORKERS > 1:
+        root, ext = os.path.splitext(app_settings.LOGGING.FILE)
+        return f"{root}.{os.getpid()}{ext}"
+    return app_settings.LOGGING.FILE
+
+
+def build_listener(log_queue: queue.SimpleQueue) -> QueueListener:
+    # the handlers doing the actual (blocking) writes, run on the listener's thread
+    file_handler = RotatingFileHandler(
+        log_file_path(),
+        maxBytes=app_settings.LOGGING.MAX_MB * 1024 * 1024,
+        backupCount=app_settings.LOGGING.BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    file_handler.setFormatter(
+        JsonFormatter() if app_settings.LOGGING.FILE_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+    return QueueListener(log_queue, file_handler, stream_handler, respect_handler_level=True)
+
+
+# callers only put records on the queue, the trace id is read in the caller's context
+log_queue: queue.SimpleQueue = queue.SimpleQueue()
+queue_handler = QueueHandler(log_queue)
+# the record's message is rendered before it is queued, the listener's handlers format the rest
+queue_handler.setFormatter(logging.Formatter("%(message)s"))
+queue_handler.addFilter(TraceIdFilter())
 
 logging.basicConfig(
-    level=logging.INFO,
-    format="[%(levelname)s] %(name)s: %(message)s",
-    handlers=[
-        logging.FileHandler("app.log"),
-        logging.StreamHandler()
-    ]
+    level=app_settings.LOGGING.LEVEL.upper(),
+    handlers=[queue_handler]
 )
 
+listener = build_listener(log_queue)
+listener.start()
+# flushes what is still queued on exit
+atexit.register(listener.stop)
+
 logger = logging.getLogger("[APP]")
 tool_logger = logging.getLogger("[TOOL]")
 agent_logger = logging.getLogger("[AGENT]")
@@ -0,0 +1,76 @@
+# utils/metrics.py
+# Prometheus metrics for the report pipeline, exposed at /metrics
+import time
+from contextlib import asynccontextmanager
+
+from prometheus_client import Counter, Histogram
+
+from utils.logger import logger
+
+# Stage latencies span from ~ms (cache hits) to many minutes (synthesis)
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600, 1200)
+
+STAGE_SECONDS = Histogram(
+    "report_stage_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_ERRORS = Counter(
+    "report_stage_errors_total",
+    "Pipeline stages that raised",
+    ["stage"]
+)
+
+# outcome: cache_hit, ok, ok_http (no browser needed), empty, timeout, error, shared (url already crawled
+# for the report), near_duplicate, cancelled (straggler crawl no sub-question needs anymore),
+# late (still crawling at its sub-question's hedging deadline)
+CRAWLS = Counter(
+    "crawl_pages_total",
+    "Crawled pages by outcome",
+    ["outcome"]
+)
+
+LLM_TOKENS = Counter(
+    "llm_tokens_total",
+    "LLM tokens used, from the pydantic-ai usage objects",
+    ["agent", "kind"]  # kind: input, output
+)
+
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "LLM requests made by each agent",
+    ["agent"]
+)
+
+REPORTS = Counter(
+    "reports_total",
+    "Finished report requests by outcome",
+    ["outcome"]  # done, failed, cache_hit, deduplicated (served by an identical in-flight request)
+)
+
+
+@asynccontextmanager
+async def stage_timer(stage: str, **details):
+    # times a pipeline stage into report_stage_seconds and logs one structured line for it
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        STAGE_ERRORS.labels(stage=stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        extra = "".join(f" {key}={value!r}" for key, value in details.items())
+        logger.info(f"[TIMING] stage={stage} seconds={elapsed:.3f} failed={failed}{extra}")
+
+
+def record_usage(agent: str, usage):
+    # usage is the RunUsage returned by result.usage()
+    LLM_REQUESTS.labels(agent=agent).inc(usage.requests or 0)
+    LLM_TOKENS.labels(agent=agent, kind="input").inc(usage.input_tokens or 0)
+    LLM_TOKENS.labels(agent=agent, kind="output").inc(usage.output_tokens or 0)
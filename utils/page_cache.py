@@ -0,0 +1,162 @@
+# utils/page_cache.py
+import time
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from utils.logger import tool_logger
+
+
+def normalize_url(url: str) -> str:
+    # same page -> same key: lowercase scheme/host, drop fragment, default ports,
+    # trailing slash and sort the query params
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if (scheme == "http" and netloc.endswith(":80")) or (scheme == "https" and netloc.endswith(":443")):
+        netloc = netloc.rsplit(":", 1)[0]
+    path = parts.path.rstrip("/") or "/"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, netloc, path, query, ""))
+
+
+# query params that only track where a click came from, dropped by canonical_url
+TRACKING_PARAMS = {
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "ref", "ref_src", "ref_url", "referrer", "cmpid", "amp", "outputtype",
+}
+TRACKING_PARAM_PREFIXES = ("utm_", "_hs", "pk_", "at_")
+HOST_PREFIXES = ("www.", "m.", "mobile.", "amp.")
+
+
+def canonical_url(url: str) -> str:
+    # same page under different urls -> same key: normalize_url, then ignore the scheme, drop
+    # www./m./amp. host prefixes, tracking params and AMP path variants (/amp, /amp/, .amp)
+    scheme, netloc, path, query, _ = urlsplit(normalize_url(url))
+    for prefix in HOST_PREFIXES:
+        if netloc.startswith(prefix) and netloc.count(".") > 1:
+            netloc = netloc[len(prefix):]
+            break
+
+    if path.endswith("/amp"):
+        path = path[:-len("/amp")] or "/"
+    elif path.endswith(".amp"):
+        path = path[:-len(".amp")] or "/"
+
+    params = [
+        (key, value) for key, value in parse_qsl(query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PARAM_PREFIXES)
+    ]
+    return urlunsplit(("https", netloc, path, urlencode(params), ""))
+
+
+class PageCache:
+    """
+    On-disk cache of cleaned page markdown (post PruningContentFilter, links stripped).
+    Entries are keyed by the sha256 of the canonical URL, expire after `ttl` seconds
+    and the least recently used entries are evicted once the store grows past `max_bytes`.
+    """
+
+    def __init__(self, path: str, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                content TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access)")
+        self._conn.commit()
+
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        return hashlib.sha256(canonical_url(url).encode("utf-8")).hexdigest()
+
+
+    def _get(self, url: str) -> Optional[str]:
+        key = self.make_key(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content, created_at FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            content, created_at = row
+            if now - created_at > self.ttl:
+                self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute("UPDATE pages SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return content
+
+
+    def _put(self, url: str, content: str):
+        key = self.make_key(url)
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, url, content, size, created_at, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, content, size, now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+
+    def _evict(self):
+        # drop expired entries first, then least recently used until under the size cap
+        self._conn.execute("DELETE FROM pages WHERE created_at < ?", (time.time() - self.ttl,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM pages ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        tool_logger.info(f"[PAGE CACHE] Evicted {evicted} entries to stay under {self.max_bytes} bytes")
+
+
+    async def get(self, url: str) -> Optional[str]:
+        content = await asyncio.to_thread(self._get, url)
+        if content is None:
+            self.misses += 1
+            tool_logger.info(f"[PAGE CACHE] MISS {url} (hits={self.hits}, misses={self.misses})")
+        else:
+            self.hits += 1
+            tool_logger.info(f"[PAGE CACHE] HIT {url} (hits={self.hits}, misses={self.misses})")
+        return content
+
+
+    async def put(self, url: str, content: str):
+        await asyncio.to_thread(self._put, url, content)
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
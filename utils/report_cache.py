@@ -0,0 +1,235 @@
+# utils/report_cache.py
+import time
+import sqlite3
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from models.ReportModel import Report
+from utils.embeddings import EmbeddingClient
+from utils.logger import logger
+
+
+@dataclass
+class CachedReport:
+    id: int
+    prompt: str
+    report: Report
+    created_at: float
+    similarity: float
+
+
+class ReportCache:
+    """
+    On-disk cache of finished reports, looked up by the embedding of the user prompt, so
+    near-identical prompts ("impact of AI on jobs" / "AI impact on employment") share a report.
+    - a prompt hits when its cosine similarity to a cached prompt is >= `threshold` and the
+      entry is younger than `ttl` seconds
+    - hits older than `refresh_after` seconds can be regenerated in the background (refresh())
+    - the least recently used entries are evicted past `max_entries`
+    Prompt vectors are kept in memory for the similarity search (entries are few and small).
+    Several worker processes can share the database: each lookup first loads the entries the
+    others added, and entries they deleted are dropped when they are looked up.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        embedder: EmbeddingClient,
+        threshold: float,
+        ttl: float,
+        max_entries: int,
+        refresh_after: Optional[float] = None
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.refresh_after = refresh_after
+        self.hits = 0
+        self.misses = 0
+
+        self._refreshing: Dict[int, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        # waits for another worker's write lock instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reports (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                prompt TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                report TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+        # id -> prompt vector, for every entry on disk
+        self._vectors: Dict[int, np.ndarray] = {}
+        self._last_id = 0
+        with self._lock:
+            self._load_new()
+
+
+    def _load_new(self):
+        # entries added since the last load (by this process or another worker)
+        for row_id, vector in self._conn.execute(
+            "SELECT id, vector FROM reports WHERE id > ? ORDER BY id", (self._last_id,)
+        ):
+            self._vectors[row_id] = np.frombuffer(vector, dtype=np.float32)
+            self._last_id = row_id
+
+
+    def _match(self, vector: np.ndarray) -> Optional[Tuple[int, float]]:
+        # most similar cached prompt at or above the threshold
+        with self._lock:
+            self._load_new()
+            ids = [row_id for row_id, cached in self._vectors.items() if cached.shape == vector.shape]
+            if not ids:
+                return None
+            similarities = np.stack([self._vectors[row_id] for row_id in ids]) @ vector
+
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return ids[best], float(similarities[best])
+
+
+    def _get(self, row_id: int, similarity: float) -> Optional[CachedReport]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT prompt, report, created_at FROM reports WHERE id = ?", (row_id,)
+            ).fetchone()
+            if row is None:
+                # deleted by another worker
+                self._vectors.pop(row_id, None)
+                return None
+
+            prompt, report, created_at = row
+            if now - created_at > self.ttl:
+                self._delete(row_id)
+                self._conn.commit()
+                return None
+
+            self._conn.execute("UPDATE reports SET last_access = ? WHERE id = ?", (now, row_id))
+            self._conn.commit()
+
+        return CachedReport(
+            id=row_id,
+            prompt=prompt,
+            report=Report.model_validate_json(report),
+            created_at=created_at,
+            similarity=similarity
+        )
+
+
+    def _put(self, prompt: str, vector: np.ndarray, report: Report, replaces: Optional[int]):
+        now = time.time()
+        # the app's trace id belongs to the request that generated it, not to later hits
+        report_json = report.model_dump_json(exclude={"trace_id"})
+        with self._lock:
+            if replaces is not None:
+                self._delete(replaces)
+            cursor = self._conn.execute(
+                "INSERT INTO reports (prompt, vector, report, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (prompt, vector.astype(np.float32).tobytes(), report_json, now, now)
+            )
+            self._vectors[cursor.lastrowid] = vector.astype(np.float32)
+            self._last_id = max(self._last_id, cursor.lastrowid)
+            self._evict()
+            self._conn.commit()
+
+
+    def _delete(self, row_id: int):
+        self._conn.execute("DELETE FROM reports WHERE id = ?", (row_id,))
+        self._vectors.pop(row_id, None)
+
+
+    def _evict(self):
+        # drop expired entries first, then least recently used past the entry cap
+        expired = [row[0] for row in self._conn.execute(
+            "SELECT id FROM reports WHERE created_at < ?", (time.time() - self.ttl,)
+        )]
+        over = len(self._vectors) - len(expired) - self.max_entries
+        lru = []
+        if over > 0:
+            lru = [row[0] for row in self._conn.execute(
+                "SELECT id FROM reports WHERE created_at >= ? ORDER BY last_access ASC LIMIT ?",
+                (time.time() - self.ttl, over)
+            )]
+        for row_id in expired + lru:
+            self._delete(row_id)
+        if lru:
+            logger.info(f"[REPORT CACHE] Evicted {len(lru)} entries to stay under {self.max_entries} reports")
+
+
+    async def get(self, prompt: str) -> Tuple[Optional[CachedReport], np.ndarray]:
+        # returns the cached report (or None) and the prompt's embedding, to pass on to put()
+        vector = await self.embedder.embed_one(prompt)
+        match = await asyncio.to_thread(self._match, vector)
+        cached = await asyncio.to_thread(self._get, *match) if match else None
+
+        if cached is None:
+            self.misses += 1
+            logger.info(f"[REPORT CACHE] MISS '{prompt}' (hit rate {self.hit_rate:.0%}, hits={self.hits}, misses={self.misses})")
+        else:
+            self.hits += 1
+            logger.info(
+                f"[REPORT CACHE] HIT '{prompt}' -> '{cached.prompt}' (similarity {cached.similarity:.3f}, "
+                f"hit rate {self.hit_rate:.0%}, hits={self.hits}, misses={self.misses})"
+            )
+        return cached, vector
+
+
+    async def put(self, prompt: str, vector: np.ndarray, report: Report, replaces: Optional[int] = None):
+        await asyncio.to_thread(self._put, prompt, vector, report, replaces)
+
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+    def needs_refresh(self, cached: CachedReport) -> bool:
+        return (
+            self.refresh_after is not None
+            and time.time() - cached.created_at > self.refresh_after
+            and cached.id not in self._refreshing
+        )
+
+
+    def refresh(self, cached: CachedReport, generate: Callable[[], Awaitable[Report]]):
+        # regenerates a stale entry in the background, the old report is served until it is replaced
+        vector = self._vectors.get(cached.id)
+        if vector is None:
+            return
+
+        async def run():
+            try:
+                report = await generate()
+                await self.put(cached.prompt, vector, report, replaces=cached.id)
+                logger.info(f"[REPORT CACHE] Refreshed '{cached.prompt}'")
+            except Exception as e:
+                logger.error(f"[REPORT CACHE] Background refresh of '{cached.prompt}' failed: {e}")
+            finally:
+                self._refreshing.pop(cached.id, None)
+
+        logger.info(f"[REPORT CACHE] Refreshing '{cached.prompt}' in the background")
+        self._refreshing[cached.id] = asyncio.create_task(run())
+
+
+    async def close(self):
+        for task in list(self._refreshing.values()):
+            task.cancel()
+        await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,152 @@
+# utils/search_cache.py
+import re
+import json
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pydantic import TypeAdapter
+
+from utils.logger import tool_logger
+from utils.shared_store import SharedStore
+from models.ResearchModel import NormalizedSearchResult
+
+SearchKey = Tuple[str, str, int]
+
+RESULTS_ADAPTER = TypeAdapter(List[NormalizedSearchResult])
+
+NON_WORD_PATTERN = re.compile(r"[^\w\s]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_sub_prompt(sub_prompt: str) -> str:
+    # "What is X?" and "what is  x" should hit the same entry
+    text = NON_WORD_PATTERN.sub(" ", sub_prompt.lower())
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+
+class SearchCache:
+    """
+    In-memory cache of search results keyed on (normalized sub-prompt, engine, num results).
+    Concurrent lookups for the same key are coalesced so only one upstream search runs
+    and the other callers wait for its result.
+    With a shared store, misses are looked up there before searching and results are written
+    through to it, so worker processes reuse each other's searches.
+    """
+
+    def __init__(self, ttl: float, max_entries: int, store: Optional[SharedStore] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.store = store
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._entries: "OrderedDict[SearchKey, Tuple[float, List[NormalizedSearchResult]]]" = OrderedDict()
+        self._in_flight: Dict[SearchKey, asyncio.Future] = {}
+
+
+    @staticmethod
+    def make_key(sub_prompt: str, engine: str, num_results: int) -> SearchKey:
+        return (normalize_sub_prompt(sub_prompt), engine, num_results)
+
+
+    def _get(self, key: SearchKey) -> Optional[List[NormalizedSearchResult]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, results = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return results
+
+
+    def _put(self, key: SearchKey, results: List[NormalizedSearchResult]):
+        self._entries[key] = (time.monotonic(), results)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+    async def _get_shared(self, key: SearchKey) -> Optional[List[NormalizedSearchResult]]:
+        if self.store is None:
+            return None
+        try:
+            data = await asyncio.to_thread(self.store.get, "search", json.dumps(key))
+        except Exception as e:
+            tool_logger.warning(f"[SEARCH CACHE] Shared store lookup failed: {e}")
+            return None
+        return RESULTS_ADAPTER.validate_json(data) if data is not None else None
+
+
+    async def _put_shared(self, key: SearchKey, results: List[NormalizedSearchResult]):
+        if self.store is None:
+            return
+        try:
+            data = RESULTS_ADAPTER.dump_json(results).decode()
+            await asyncio.to_thread(self.store.put, "search", json.dumps(key), data, self.ttl)
+        except Exception as e:
+            tool_logger.warning(f"[SEARCH CACHE] Shared store write failed: {e}")
+
+
+    async def get_or_fetch(
+        self,
+        key: SearchKey,
+        fetch: Callable[[], Awaitable[List[NormalizedSearchResult]]]
+    ) -> List[NormalizedSearchResult]:
+        while True:
+            cached = self._get(key)
+            if cached is not None:
+                self.hits += 1
+                tool_logger.info(f"[SEARCH CACHE] HIT '{key[0]}' (hits={self.hits}, misses={self.misses})")
+                return list(cached)
+
+            # someone is already searching this, wait for their result
+            in_flight = self._in_flight.get(key)
+            if in_flight is None:
+                break
+
+            self.coalesced += 1
+            tool_logger.info(f"[SEARCH CACHE] Coalesced '{key[0]}' onto in-flight search (coalesced={self.coalesced})")
+            try:
+                return list(await asyncio.shield(in_flight))
+            except asyncio.CancelledError:
+                # the leader was cancelled, not us: loop around and search ourselves
+                if not in_flight.cancelled():
+                    raise
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            results = await self._get_shared(key)
+            if results is not None:
+                self.shared_hits += 1
+                tool_logger.info(f"[SEARCH CACHE] SHARED HIT '{key[0]}' (shared hits={self.shared_hits})")
+            else:
+                self.misses += 1
+                tool_logger.info(f"[SEARCH CACHE] MISS '{key[0]}' (hits={self.hits}, misses={self.misses})")
+                results = await fetch()
+                if results:
+                    await self._put_shared(key, results)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # mark the exception as retrieved in case nobody was waiting
+            future.exception()
+            raise
+        else:
+            # empty results are not cached so the next caller can retry
+            if results:
+                self._put(key, results)
+            future.set_result(results)
+            return list(results)
+        finally:
+            self._in_flight.pop(key, None)
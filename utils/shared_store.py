@@ -0,0 +1,226 @@
+# utils/shared_store.py
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Optional, Tuple
+
+from utils.logger import logger
+from config.config import SharedStoreSettings
+
+# expired entries are deleted every this many puts
+PURGE_EVERY = 200
+
+
+class SharedStore(ABC):
+    """
+    Coordination store shared by every worker process of the app (SERVER__WORKERS > 1):
+    - namespaced string values with a ttl (search results, finished reports, job status)
+    - leases, so only one worker at a time works on a key (see run_once)
+    Methods are blocking, call them with asyncio.to_thread from async code.
+    """
+
+    @abstractmethod
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        ...
+
+
+    @abstractmethod
+    def put(self, namespace: str, key: str, value: str, ttl: float):
+        ...
+
+
+    @abstractmethod
+    def claim(self, key: str, owner: str, lease: float) -> bool:
+        # takes the lease on `key` if it is free (or expired), True if `owner` holds it now
+        ...
+
+
+    @abstractmethod
+    def renew(self, key: str, owner: str, lease: float) -> bool:
+        ...
+
+
+    @abstractmethod
+    def release(self, key: str, owner: str):
+        ...
+
+
+    def close(self):
+        pass
+
+
+class SqliteSharedStore(SharedStore):
+    # one SQLite database in WAL mode, opened by every worker
+
+    def __init__(self, path: str):
+        self._puts = 0
+        self._lock = threading.Lock()
+        # waits up to 30s for another process's write lock instead of failing
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS leases (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+
+
+    def get(self, namespace: str, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+
+    def put(self, namespace: str, key: str, value: str, ttl: float):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, value, now + ttl)
+            )
+            self._puts += 1
+            if self._puts % PURGE_EVERY == 0:
+                self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+                self._conn.execute("DELETE FROM leases WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+
+
+    def claim(self, key: str, owner: str, lease: float) -> bool:
+        now = time.time()
+        with self._lock:
+            # a single upsert, so two workers can't both take a free lease
+            self._conn.execute(
+                """
+                INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE leases.expires_at <= ?
+                """,
+                (key, owner, now + lease, now)
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT owner FROM leases WHERE key = ?", (key,)).fetchone()
+        return row is not None and row[0] == owner
+
+
+    def renew(self, key: str, owner: str, lease: float) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?",
+                (time.time() + lease, key, owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+
+    def release(self, key: str, owner: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, owner))
+            self._conn.commit()
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+async def run_once(
+    store: SharedStore,
+    namespace: str,
+    key: str,
+    produce: Callable[[], Awaitable[str]],
+    lease: float,
+    poll_interval: float,
+    result_ttl: float
+) -> Tuple[str, bool]:
+    # runs `produce` in only one worker at a time for the same key, the others wait for its
+    # stored result (for `result_ttl` seconds) instead of producing it again
+    # returns (value, shared), `shared` is True when the value came from another caller
+    # if the producing worker fails (or dies, once its lease expires) a waiting one takes over,
+    # and a worker that loses its lease stops producing and waits for the new holder's result
+    owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    lease_key = f"{namespace}:{key}"
+    waiting = False
+    while True:
+        value = await asyncio.to_thread(store.get, namespace, key)
+        if value is not None:
+            return value, True
+        if not await asyncio.to_thread(store.claim, lease_key, owner, lease):
+            if not waiting:
+                waiting = True
+                logger.info(f"[SHARED STORE] {namespace} '{key[:16]}' is in flight elsewhere, waiting for it")
+            await asyncio.sleep(poll_interval)
+            continue
+        # the previous holder may have stored its result and released the lease since the get
+        value = await asyncio.to_thread(store.get, namespace, key)
+        if value is not None:
+            await asyncio.to_thread(store.release, lease_key, owner)
+            return value, True
+
+        producing = asyncio.create_task(produce())
+        renewer = asyncio.create_task(keep_lease(store, lease_key, owner, lease, producing))
+        try:
+            value = await producing
+            await asyncio.to_thread(store.put, namespace, key, value, result_ttl)
+            return value, False
+        except asyncio.CancelledError:
+            # cancelled by keep_lease: another worker holds the lease now, wait for its result
+            if renewer.done() and not renewer.cancelled() and renewer.result() is False:
+                waiting = False
+                continue
+            raise
+        finally:
+            renewer.cancel()
+            producing.cancel()
+            await asyncio.gather(renewer, producing, return_exceptions=True)
+            await asyncio.to_thread(store.release, lease_key, owner)
+
+
+async def keep_lease(store: SharedStore, lease_key: str, owner: str, lease: float, producing: asyncio.Task) -> bool:
+    # renews the lease while `producing` runs, returns False (after cancelling it) once the
+    # lease is lost to another worker
+    while True:
+        await asyncio.sleep(lease / 3)
+        try:
+            if await asyncio.to_thread(store.renew, lease_key, owner, lease):
+                continue
+            # the lease was purged after expiring, take it again if it is still free
+            if await asyncio.to_thread(store.claim, lease_key, owner, lease):
+                logger.warning(f"[SHARED STORE] Lease on '{lease_key[:24]}' had lapsed, took it again")
+                continue
+        except Exception as e:
+            # retried on the next renewal, the lease outlives a few failures
+            logger.warning(f"[SHARED STORE] Could not renew the lease on '{lease_key[:24]}': {e}")
+            continue
+
+        logger.error(f"[SHARED STORE] Lost the lease on '{lease_key[:24]}' to another worker, stopping this run")
+        producing.cancel()
+        return False
+
+
+def create_shared_store(settings: SharedStoreSettings) -> Optional[SharedStore]:
+    if not settings.ON:
+        return None
+    return SqliteSharedStore(settings.PATH)
@@ -0,0 +1,68 @@
+# utils/simhash.py
+# 64-bit SimHash fingerprints over word 3-grams, to spot syndicated copies of the same article
+# (same text under a different url, with small edits) after crawling.
+import hashlib
+import re
+from typing import Generic, List, Optional, Tuple, TypeVar
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SHINGLE_SIZE = 3
+BITS = np.arange(64, dtype=np.uint64)
+
+T = TypeVar("T")
+
+
+def shingle_hash(shingle: str) -> int:
+    # not hash(), which is seeded per process: fingerprints have to match across runs and workers
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def simhash(text: str) -> Optional[int]:
+    # None for texts too short to fingerprint
+    terms = TOKEN_PATTERN.findall(text.lower())
+    if len(terms) < SHINGLE_SIZE:
+        return None
+
+    hashes = np.fromiter(
+        (shingle_hash(" ".join(terms[i:i + SHINGLE_SIZE])) for i in range(len(terms) - SHINGLE_SIZE + 1)),
+        dtype=np.uint64
+    )
+    # each bit of the fingerprint is the majority vote of that bit over all shingle hashes
+    votes = ((hashes[:, None] >> BITS) & np.uint64(1)).sum(axis=0)
+    fingerprint = 0
+    for bit in np.flatnonzero(votes * 2 > len(hashes)):
+        fingerprint |= 1 << int(bit)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class SimHashIndex(Generic[T]):
+    """
+    Fingerprints of the items seen so far (one report's pages), with a linear scan for matches.
+    Texts with fewer than `min_terms` words are never matched, their fingerprints are too noisy.
+    """
+
+    def __init__(self, max_distance: int, min_terms: int = 50):
+        self.max_distance = max_distance
+        self.min_terms = min_terms
+        self.entries: List[Tuple[int, T]] = []
+
+
+    def find_or_add(self, text: str, item: T) -> Optional[T]:
+        # returns the earlier item `text` is a near-duplicate of, or adds it and returns None
+        if len(TOKEN_PATTERN.findall(text, 0, self.min_terms * 20)) < self.min_terms:
+            return None
+        fingerprint = simhash(text)
+        if fingerprint is None:
+            return None
+
+        for other_fingerprint, other in self.entries:
+            if hamming_distance(fingerprint, other_fingerprint) <= self.max_distance:
+                return other
+        self.entries.append((fingerprint, item))
+        return None
@@ -0,0 +1,99 @@
+# utils/text_normalizer.py
+# Cleans crawled page markdown before it is cached and handed to the synthesizer:
+# links and images are reduced to their text, boilerplate lines (cookie banners, share/subscribe
+# prompts, copyright lines) are dropped, markdown tables and whitespace are compacted and the
+# page is capped to a max length. All patterns are compiled once at import.
+import re
+from typing import List
+
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+# [text](url) / [text](url "title") -> text, relative urls included
+LINK_PATTERN = re.compile(r"\[([^\]]*)\]\([^)\s]*(?:\s+\"[^\"]*\")?\)")
+# tabs, nbsp and zero-width spaces become plain spaces, then runs of spaces are collapsed
+SPACE_CHARS = ("\t", "\u00a0", "\u200b")
+BLANK_LINES_PATTERN = re.compile(r"\n{3,}")
+TABLE_SEPARATOR_PATTERN = re.compile(r"^\|?\s*:?-{2,}:?\s*(?:\|\s*:?-{2,}:?\s*)*\|?$")
+TABLE_CELL_SPLIT_PATTERN = re.compile(r"\s*\|\s*")
+# end of a sentence (with a closing quote or bracket) followed by whitespace
+SENTENCE_END_PATTERN = re.compile(r"[.!?][\"')\]]?(?=\s)")
+BOILERPLATE_PATTERN = re.compile(
+    r"^\W*(?:"
+    r"skip to (?:main )?content|back to top|advertisement|sponsored|read more|continue reading|"
+    r"share(?: this)?(?: (?:on|via) \w+)?|follow us(?: on \w+)?|print|email|"
+    r"(?:sign|log) ?(?:in|up|out)\b.*|subscribe\b.*|newsletter\b.*|"
+    r"(?:we use |this (?:web)?site uses |accept (?:all )?)cookies\b.*|.*\bcookie (?:policy|settings|preferences)\b.*|"
+    r"(?:©|copyright\b|all rights reserved\b).*|privacy policy|terms(?: of (?:use|service))?|"
+    r"related (?:articles|posts|stories|content)|you (?:may|might) also like"
+    r")\W*$",
+    re.IGNORECASE
+)
+
+# boilerplate lines are short, longer lines are kept even if they match
+MAX_BOILERPLATE_CHARS = 160
+
+
+def link_text(match: re.Match) -> str:
+    # a function replacement is cheaper than expanding r"\1" for every link
+    return match.group(1)
+
+
+def compact_table_row(line: str) -> str:
+    # "| a   |  b |" -> "a | b"
+    cells = TABLE_CELL_SPLIT_PATTERN.split(line.strip("|").strip())
+    return " | ".join(cell for cell in cells if cell)
+
+
+def cap_length(text: str, max_chars: int) -> str:
+    # cuts at the last line break before the cap (crawl4ai separates paragraphs with a single
+    # newline), else at the last sentence end or space, and at the cap if none is close by
+    if max_chars <= 0 or len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    cut = text.rfind("\n", 0, max_chars + 1)
+    if cut < half:
+        cut = -1
+        for match in SENTENCE_END_PATTERN.finditer(text, half, max_chars + 1):
+            cut = match.end()
+    if cut < half:
+        cut = text.rfind(" ", half, max_chars + 1)
+    if cut < half:
+        cut = max_chars
+    return text[:cut].rstrip()
+
+
+def normalize_page(markdown: str, max_chars: int = 0) -> str:
+    # works line by line, so a capped page stops being processed once it is long enough
+    lines: List[str] = []
+    length = 0
+    previous = None
+    for char in SPACE_CHARS:
+        if char in markdown:
+            markdown = markdown.replace(char, " ")
+
+    for line in markdown.splitlines():
+        if "](" in line:
+            line = LINK_PATTERN.sub(link_text, IMAGE_PATTERN.sub("", line))
+        while "  " in line:
+            line = line.replace("  ", " ")
+        line = line.strip()
+
+        if line:
+            if line[0] == "|":
+                if TABLE_SEPARATOR_PATTERN.match(line):
+                    continue
+                line = compact_table_row(line)
+            elif len(line) <= MAX_BOILERPLATE_CHARS and BOILERPLATE_PATTERN.match(line):
+                continue
+            # repeated lines (e.g. the same nav item twice) only add noise
+            if line == previous:
+                continue
+            previous = line
+        lines.append(line)
+
+        # the rest of the page would be cut anyway
+        length += len(line) + 1
+        if max_chars and length > max_chars:
+            break
+
+    text = BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+    return cap_length(text, max_chars)
@@ -0,0 +1,24 @@
+# utils/trace.py
+import uuid
+import logging
+from contextvars import ContextVar
+
+# id of the report request being handled, follows the request into its tasks/tool calls
+trace_id_var: ContextVar[str] = ContextVar("trace_id", default="-")
+
+
+def new_trace_id() -> str:
+    trace_id = uuid.uuid4().hex[:16]
+    trace_id_var.set(trace_id)
+    return trace_id
+
+
+def get_trace_id() -> str:
+    return trace_id_var.get()
+
+
+class TraceIdFilter(logging.Filter):
+    # puts the current trace id on every log record as %(trace_id)s
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = trace_id_var.get()
+        return True
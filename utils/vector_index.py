@@ -0,0 +1,172 @@
+# utils/vector_index.py
+import os
+import sqlite3
+import hashlib
+import asyncio
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from utils.logger import agent_logger
+
+INITIAL_CAPACITY = 1024
+
+
+@dataclass
+class IndexedChunk:
+    row: int
+    url: str
+    title: str
+    text: str
+    score: float = 0.0
+
+
+def chunk_hash(url: str, text: str) -> str:
+    return hashlib.sha256(f"{url}\n{text}".encode("utf-8")).hexdigest()
+
+
+class VectorIndex:
+    """
+    Persistent chunk index for the crawled sources. Embeddings live in a memory-mapped
+    float32 matrix (`<dir>/vectors.f32`, one row per chunk, grown by doubling) and the chunk
+    text/metadata in SQLite (`<dir>/chunks.sqlite3`), so the corpus is reused across reports.
+    Search is a single matrix-vector product over the (normalized) rows.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "chunks.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                row INTEGER PRIMARY KEY,
+                hash TEXT UNIQUE NOT NULL,
+                url TEXT NOT NULL,
+                title TEXT NOT NULL,
+                text TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_url ON chunks(url)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self.count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        dim = self._conn.execute("SELECT value FROM meta WHERE key = 'dim'").fetchone()
+        self.dim: Optional[int] = int(dim[0]) if dim else None
+
+        self._matrix: Optional[np.memmap] = None
+        # row -> url id, kept in memory so searches can be restricted to some urls without SQL
+        self._url_ids: Dict[str, int] = {}
+        self._row_url_ids: List[int] = [
+            self._url_id(url) for (url,) in self._conn.execute("SELECT url FROM chunks ORDER BY row")
+        ]
+        if self.dim is not None:
+            self._open_matrix(max(INITIAL_CAPACITY, self.count))
+
+        agent_logger.info(f"[INDEX] Loaded vector index with {self.count} chunks from {directory}")
+
+
+    def _url_id(self, url: str) -> int:
+        return self._url_ids.setdefault(url, len(self._url_ids))
+
+
+    def _open_matrix(self, capacity: int):
+        # grows the backing file if needed and (re)maps it
+        size = capacity * self.dim * np.dtype(np.float32).itemsize
+        if not os.path.exists(self.vectors_path) or os.path.getsize(self.vectors_path) < size:
+            with open(self.vectors_path, "ab") as f:
+                f.truncate(size)
+        if self._matrix is not None:
+            self._matrix.flush()
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+
+    def missing(self, items: Iterable[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        # (url, text) pairs that are not indexed yet, so they are only embedded once
+        with self._lock:
+            return [
+                (url, text) for url, text in items
+                if self._conn.execute(
+                    "SELECT 1 FROM chunks WHERE hash = ?", (chunk_hash(url, text),)
+                ).fetchone() is None
+            ]
+
+
+    def _add(self, items: List[Tuple[str, str, str]], vectors: np.ndarray):
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('dim', ?)", (str(self.dim),))
+                self._open_matrix(INITIAL_CAPACITY)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding size {vectors.shape[1]} does not match the index ({self.dim})")
+
+            added = 0
+            for (url, title, text), vector in zip(items, vectors):
+                cursor = self._conn.execute(
+                    "INSERT OR IGNORE INTO chunks (row, hash, url, title, text) VALUES (?, ?, ?, ?, ?)",
+                    (self.count, chunk_hash(url, text), url, title, text)
+                )
+                if cursor.rowcount == 0:
+                    continue
+                if self.count >= self._matrix.shape[0]:
+                    self._open_matrix(self._matrix.shape[0] * 2)
+                self._matrix[self.count] = vector
+                self._row_url_ids.append(self._url_id(url))
+                self.count += 1
+                added += 1
+
+            self._matrix.flush()
+            self._conn.commit()
+            return added
+
+
+    def _search(self, query: np.ndarray, k: int, urls: Optional[Iterable[str]]) -> List[IndexedChunk]:
+        with self._lock:
+            if not self.count:
+                return []
+
+            scores = self._matrix[:self.count] @ query.astype(np.float32)
+            if urls is not None:
+                allowed_ids = [self._url_ids[url] for url in urls if url in self._url_ids]
+                allowed = np.isin(np.asarray(self._row_url_ids, dtype=np.int32), allowed_ids)
+                scores = np.where(allowed, scores, -np.inf)
+
+            k = min(k, self.count)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            top = [int(row) for row in top if np.isfinite(scores[row])]
+
+            chunks = []
+            for row in top:
+                url, title, text = self._conn.execute(
+                    "SELECT url, title, text FROM chunks WHERE row = ?", (row,)
+                ).fetchone()
+                chunks.append(IndexedChunk(row=row, url=url, title=title, text=text, score=float(scores[row])))
+            return chunks
+
+
+    async def add(self, items: List[Tuple[str, str, str]], vectors: np.ndarray) -> int:
+        # items are (url, title, text), one per row of `vectors`
+        added = await asyncio.to_thread(self._add, items, vectors)
+        agent_logger.info(f"[INDEX] Added {added} chunks (total {self.count})")
+        return added
+
+
+    async def search(self, query: np.ndarray, k: int, urls: Optional[Iterable[str]] = None) -> List[IndexedChunk]:
+        # top-k chunks by cosine similarity, optionally only from the given source urls
+        return await asyncio.to_thread(self._search, query, k, urls)
+
+
+    def close(self):
+        with self._lock:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._conn.close()